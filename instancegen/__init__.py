@@ -4,6 +4,24 @@ The MIT License (MIT)
 @author: Stephen J. Maher
 """
 import os.path
+from .smps_profile import *
+from .smps_io import *
+from .smps_coeffs import *
+from .smps_sampling import *
+from .smps_stages import *
+from .smps_parser import *
+from .smps_parallel import *
+from .smps_sto import *
+from .smps_pipeline import *
+from .smps_cache import *
+from .smps_reduction import *
+from .smps_analysis import *
+from .smps_decompose import *
+from .smps_validate import *
+from .smps_resume import *
+from .smps_tree import *
+from .smps_extensive import *
+from .smps_batch import *
 from .smps_instance import *
 from .smps_instance_classes import *
 
@@ -12,8 +30,13 @@ instances = {
       "sslp" : SSLPInstance,
       "noswot" : NoswotInstance,
       "snip" : SnipInstance,
+      "auto" : AutoStageInstance,
       }
 
+# the profiler is enabled by setting GENSTOCH_PROFILE to 1, a JSON file name or a
+# cProfile (.prof) file name
+enableProfilingFromEnvironment()
+
 def validInputs(instanceclass, instancename, extensions = ["cor"],
       numscenarios = None, stochtype = None):
    '''
@@ -72,7 +95,8 @@ def validInstanceClass(instanceclass):
 def validInstanceFiles(instancename, extensions = ["cor"]):
    '''
    verifies whether the necessary files associated with the instancename exist.
-   The necessary files are given by the extensions.
+   The necessary files are given by the extensions. A file may also be
+   compressed, e.g. <instancename>.cor.gz.
 
    Parameters
    ----------
@@ -87,7 +111,7 @@ def validInstanceFiles(instancename, extensions = ["cor"]):
       True if the all necessary files exists, False otherwise
    '''
    for ext in extensions:
-      if not os.path.isfile("%s.%s"%(instancename, ext)):
+      if findFile("%s.%s"%(instancename, ext)) is None:
          print("   ERROR: <%s.%s> must exist. Please input a valid instance name."\
                %(instancename, ext))
          return False
@@ -0,0 +1,185 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import json
+import numpy as np
+from .smps_profile import profiler
+
+# the quantiles of the nonzeros per row and column in the report
+ANALYSIS_QUANTILES = [0.5, 0.9, 0.99]
+
+def summaryStatistics(values):
+   '''
+   returns the count, minimum, maximum, mean, standard deviation and number of
+   nonzeros of an array as a dictionary that can be written as JSON
+   '''
+   values = np.asarray(values, dtype = np.float64)
+   if len(values) == 0:
+      return {"count": 0}
+
+   return {"count": int(len(values)),
+         "min": float(values.min()),
+         "max": float(values.max()),
+         "mean": float(values.mean()),
+         "std": float(values.std()),
+         "nonzeros": int(np.count_nonzero(values))}
+
+def countStatistics(counts):
+   '''
+   returns the summary statistics and the quantiles of the nonzeros per row
+   or column
+   '''
+   statistics = summaryStatistics(counts)
+   if len(counts) > 0:
+      quantiles = np.quantile(counts, ANALYSIS_QUANTILES)
+      statistics["quantiles"] = {"%g"%quantile: float(value)
+            for quantile, value in zip(ANALYSIS_QUANTILES, quantiles)}
+      statistics["empty"] = int(len(counts) - np.count_nonzero(counts))
+
+   return statistics
+
+def analyseInstance(instance):
+   '''
+   computes the statistics of the core and TIM data of an instance. All
+   statistics are computed from the CSC arrays of the coefficient matrix, so
+   the analysis is a few vectorised passes over the nonzeros.
+
+   The report contains the size of each stage, the nonzeros per row and
+   column, the RHS statistics of each stage, the nonzeros of each block of
+   rows and columns of a pair of stages, and the linking of the first stage
+   columns to the rows of the later stages. The nonzeros of a row in a column
+   of a later stage break the staircase structure of the stages and are
+   reported as invalid.
+
+   Parameters
+   ----------
+   instance : Instance
+      the instance with the core file and, optionally, the TIM file read
+
+   Returns
+   -------
+   dict
+      the report, which can be written as JSON
+   '''
+   with profiler.phase("analyseInstance"):
+      matrix = instance.getCoefficientMatrix()
+      ncons = len(instance.constraints)
+      nvars = len(instance.variables)
+
+      # the stage of each constraint and variable. Without a TIM file all
+      # rows and columns are in a single stage
+      if len(instance.periods) > 0:
+         stagenames = instance.stages.names
+         rowstages = instance.stages.rowstages
+         colstages = instance.stages.colstages
+      else:
+         stagenames = ["CORE"]
+         rowstages = np.zeros(ncons, dtype = np.int64)
+         colstages = np.zeros(nvars, dtype = np.int64)
+      nstages = len(stagenames)
+
+      # mapping the matrix rows and columns to the stages. The objective and
+      # the other free rows are not constraints and have the index and stage
+      # -1, which selects the appended -1 of the stage arrays
+      consindex = {cons: i for i, cons in enumerate(instance.constraints)}
+      matrixrows = np.array([consindex.get(cons, -1) for cons in matrix.rownames],
+            dtype = np.int64)
+      matrixrowstages = np.append(rowstages, -1)[matrixrows]
+      varindex = {var: i for i, var in enumerate(instance.variables)}
+      matrixcols = np.array([varindex.get(var, -1) for var in matrix.colnames],
+            dtype = np.int64)
+      matrixcolstages = np.append(colstages, -1)[matrixcols]
+
+      colptr = matrix.colptr
+      rowind = matrix.rowind
+      cols = np.repeat(np.arange(len(matrix.colnames)), np.diff(colptr))
+      nzrowstages = matrixrowstages[rowind]
+      nzcolstages = matrixcolstages[cols]
+      known = nzcolstages >= 0
+      objective = known & (nzrowstages < 0)
+      constraint = known & (nzrowstages >= 0)
+
+      # the nonzeros per constraint and variable, without the objective
+      rowcounts = np.bincount(matrixrows[rowind[constraint]], minlength = ncons)
+      colcounts = np.bincount(matrixcols[cols[constraint]], minlength = nvars)
+
+      # the nonzeros of each block of row and column stages
+      blocks = np.bincount(nzrowstages[constraint]*nstages +
+            nzcolstages[constraint], minlength = nstages*nstages)\
+                  .reshape(nstages, nstages)
+
+      rhs = np.array([instance.rhs.get(cons, 0.0) for cons in instance.constraints],
+            dtype = np.float64)
+
+      stages = []
+      for stage, name in enumerate(stagenames):
+         stagerows = rowstages == stage
+         stagecols = colstages == stage
+         stages.append({"name": name,
+            "constraints": int(np.count_nonzero(stagerows)),
+            "variables": int(np.count_nonzero(stagecols)),
+            "nonzeros": int(blocks[stage, stage]),
+            "objectivenonzeros": int(np.count_nonzero(objective &
+               (nzcolstages == stage))),
+            "rhs": summaryStatistics(rhs[stagerows]),
+            "rownonzeros": countStatistics(rowcounts[stagerows]),
+            "colnonzeros": countStatistics(colcounts[stagecols])})
+
+      # the linking of the first stage columns to the later stage rows
+      linking = constraint & (nzcolstages == 0) & (nzrowstages > 0)
+      invalid = constraint & (nzcolstages > nzrowstages)
+      report = {"corfile": instance.corfile,
+            "timfile": instance.timfile,
+            "constraints": ncons,
+            "variables": nvars,
+            "nonzeros": int(np.count_nonzero(constraint)),
+            "objectivenonzeros": int(np.count_nonzero(objective)),
+            "density": float(np.count_nonzero(constraint))/max(ncons*nvars, 1),
+            "rownonzeros": countStatistics(rowcounts),
+            "colnonzeros": countStatistics(colcounts),
+            "stages": stages,
+            "blocks": blocks.tolist(),
+            "linking": {"nonzeros": int(np.count_nonzero(linking)),
+               "columns": int(len(np.unique(cols[linking]))),
+               "rows": int(len(np.unique(rowind[linking]))),
+               "linked": bool(np.any(linking))},
+            "invalid": {"nonzeros": int(np.count_nonzero(invalid)),
+               "rows": [matrix.rownames[row]
+                  for row in np.unique(rowind[invalid])[:10].tolist()]}}
+
+   return report
+
+def writeAnalysisReport(report, filename = None):
+   '''
+   prints the summary of an analysis and, optionally, writes the report as
+   JSON
+   '''
+   print("%d constraints, %d variables, %d nonzeros (density %.2e)"\
+         %(report["constraints"], report["variables"], report["nonzeros"],
+            report["density"]))
+   print("%-15s %12s %12s %12s %12s %12s"%("stage", "constraints",
+      "variables", "nonzeros", "rhs mean", "rhs std"))
+   for stage in report["stages"]:
+      rhs = stage["rhs"]
+      print("%-15s %12d %12d %12d %12.4g %12.4g"%(stage["name"],
+         stage["constraints"], stage["variables"], stage["nonzeros"],
+         rhs.get("mean", 0.0), rhs.get("std", 0.0)))
+
+   linking = report["linking"]
+   if linking["linked"]:
+      print("The first stage is linked to the later stages by %d nonzeros in "\
+            "%d columns and %d rows"%(linking["nonzeros"], linking["columns"],
+               linking["rows"]))
+   else:
+      print("The first stage is not linked to the later stages")
+
+   if report["invalid"]["nonzeros"] > 0:
+      print("   WARNING: %d nonzeros are in columns of a later stage than their "\
+            "row, e.g. in the rows %s"%(report["invalid"]["nonzeros"],
+               ", ".join(report["invalid"]["rows"])))
+
+   if filename is not None:
+      with open(filename, "w") as outfile:
+         json.dump(report, outfile, indent = 2)
@@ -0,0 +1,196 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import os
+import json
+import time
+import multiprocessing
+from .smps_io import smpsFileName, findFile
+
+# the parsed instances of a batch, keyed by (instanceclass, instancename). The
+# instances are set before the worker processes are forked, so the workers
+# share the parsed cores copy-on-write.
+_batchinstances = {}
+
+def readManifest(filename):
+   '''
+   reads a batch manifest. The manifest is a JSON list of objects with the
+   keys "class", "instance", "scenarios" and, optionally, "types", e.g.
+
+      [{"class": "sslp", "instance": "examples/sslp_5_25_50",
+        "scenarios": [50, 100], "types": ["rhs"]}]
+
+   Parameters
+   ----------
+   filename : string
+      the name of the manifest file
+
+   Returns
+   -------
+   list of tuples
+      the jobs as (instanceclass, instancename, numscenarios, stochtype)
+   '''
+   with open(filename, "r") as infile:
+      manifest = json.load(infile)
+
+   jobs = []
+   for item in manifest:
+      scenarios = item["scenarios"]
+      if not isinstance(scenarios, list):
+         scenarios = [scenarios]
+      types = item.get("types", ["rhs"])
+      if not isinstance(types, list):
+         types = [types]
+
+      for numscenarios in scenarios:
+         for stochtype in types:
+            jobs.append((item["class"], item["instance"], int(numscenarios),
+               stochtype))
+
+   return jobs
+
+def stoFileName(instancename, numscenarios, stochtype, outdir = None,
+      compress = None):
+   '''
+   returns the name of the STO file of a batch job. If compress is given, e.g.
+   ".gz", then it is appended to the name.
+   '''
+   stofile = "%s_%d_%s.sto%s"%(instancename, numscenarios, stochtype,
+         compress or "")
+   if outdir is not None:
+      stofile = os.path.join(outdir, os.path.basename(stofile))
+
+   return stofile
+
+def runJob(job, outdir = None, compress = None, delta = False):
+   '''
+   writes the STO and SMPS files of a batch job using the parsed instance
+
+   Returns
+   -------
+   dict
+      the summary of the job with the output files, time and bytes
+   '''
+   instanceclass, instancename, numscenarios, stochtype = job
+   instance = _batchinstances[instanceclass, instancename]
+   instance.stofile = stoFileName(instancename, numscenarios, stochtype, outdir,
+         compress)
+
+   start = time.perf_counter()
+   instance.writeStoFile(numscenarios, stochtype, delta = delta)
+   instance.writeSmpsFile()
+   elapsed = time.perf_counter() - start
+
+   smpsfile = smpsFileName(instance.stofile)
+   return {"class": instanceclass, "instance": instancename,
+         "scenarios": numscenarios, "type": stochtype,
+         "stofile": instance.stofile, "seconds": elapsed,
+         "bytes": os.path.getsize(instance.stofile) + os.path.getsize(smpsfile)}
+
+def _runWorkerJob(args):
+   '''
+   runs a batch job in a worker process
+   '''
+   index, job, outdir, compress, delta = args
+   return index, runJob(job, outdir, compress, delta)
+
+def _initWorker(instances):
+   '''
+   initialises a worker process with the parsed instances, if they were not
+   inherited by forking
+   '''
+   global _batchinstances
+   if instances is not None:
+      _batchinstances = instances
+
+def runBatch(jobs, instanceclasses, nworkers = 1, outdir = None, cache = False,
+      compress = None, delta = False):
+   '''
+   runs the jobs of a batch. Each core and TIM file is read once, and the jobs
+   are distributed over a pool of worker processes that share the parsed
+   instances.
+
+   Parameters
+   ----------
+   jobs : list of tuples
+      the jobs as (instanceclass, instancename, numscenarios, stochtype)
+   instanceclasses : dict
+      maps the instance class names to the Instance classes
+   nworkers : int. Default 1
+      the number of worker processes
+   outdir : string. Default None
+      the directory of the output files. If None, then the files are written
+      next to the core files
+   cache : bool. Default False
+      if True, then the core files are read from their binary cache
+   compress : string. Default None
+      the compression extension of the STO files, e.g. ".gz"
+   delta : bool. Default False
+      if True, then only the entries that differ from the core are written
+
+   Returns
+   -------
+   list of dicts
+      the summary of each job, in the order of the jobs
+   '''
+   global _batchinstances
+
+   # reading each instance once
+   parsestart = time.perf_counter()
+   _batchinstances = {}
+   for instanceclass, instancename, numscenarios, stochtype in jobs:
+      key = (instanceclass, instancename)
+      if key not in _batchinstances:
+         instance = instanceclasses[instanceclass](
+               findFile("%s.cor"%instancename), findFile("%s.tim"%instancename))
+         instance.readInstance(readCor = True, readTim = True, cache = cache)
+         _batchinstances[key] = instance
+   print("Read %d instances in %.2fs"%(len(_batchinstances),
+      time.perf_counter() - parsestart))
+
+   if outdir is not None and not os.path.isdir(outdir):
+      os.makedirs(outdir)
+
+   results = [None]*len(jobs)
+   args = [(index, job, outdir, compress, delta)
+         for index, job in enumerate(jobs)]
+   if nworkers <= 1:
+      for arg in args:
+         index, result = _runWorkerJob(arg)
+         results[index] = result
+      return results
+
+   # with fork, the workers inherit the parsed instances copy-on-write.
+   # Otherwise, the instances are sent to each worker once.
+   if "fork" in multiprocessing.get_all_start_methods():
+      context = multiprocessing.get_context("fork")
+      initargs = (None,)
+   else:
+      context = multiprocessing.get_context()
+      initargs = (_batchinstances,)
+
+   with context.Pool(nworkers, _initWorker, initargs) as pool:
+      for index, result in pool.imap_unordered(_runWorkerJob, args):
+         results[index] = result
+
+   return results
+
+def writeBatchReport(results, filename = None):
+   '''
+   prints the summary of a batch and, optionally, writes it as JSON
+   '''
+   print("%-40s %10s %6s %10s %14s"%("stofile", "scenarios", "type",
+      "seconds", "bytes"))
+   for result in results:
+      print("%-40s %10d %6s %10.3f %14d"%(result["stofile"],
+         result["scenarios"], result["type"], result["seconds"],
+         result["bytes"]))
+   print("Total: %d files, %.3fs, %d bytes"%(len(results),
+      sum(result["seconds"] for result in results),
+      sum(result["bytes"] for result in results)))
+
+   if filename is not None:
+      with open(filename, "w") as outfile:
+         json.dump(results, outfile, indent = 2)
@@ -0,0 +1,483 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import os
+import sys
+import json
+import time
+import platform
+import tempfile
+import multiprocessing
+import numpy as np
+from .smps_instance import Instance
+try:
+   import resource
+except ImportError:
+   resource = None
+
+def timeCall(func, repeat = 1):
+   '''
+   calls a function repeatedly and returns the shortest wall time
+
+   Parameters
+   ----------
+   func : function
+      the function that is called without arguments
+   repeat : int. Default 1
+      the number of calls
+
+   Returns
+   -------
+   float, object
+      the shortest wall time in seconds and the return value of the last call
+   '''
+   best = None
+   result = None
+   for i in range(repeat):
+      start = time.perf_counter()
+      result = func()
+      elapsed = time.perf_counter() - start
+      if best is None or elapsed < best:
+         best = elapsed
+
+   return best, result
+
+def scaledName(name, copy):
+   '''
+   returns the name of a row or column in a copy of the core. The first copy
+   keeps the original names.
+   '''
+   if copy == 0:
+      return name
+
+   return "%s_k%d"%(name, copy)
+
+def stageGroups(header, lines, periods):
+   '''
+   splits the lines of the ROWS or COLUMNS section of a core file into the
+   stages given by the periods of a TIM file. The integer markers are kept
+   with the columns that they enclose.
+
+   Parameters
+   ----------
+   header : string
+      the section header
+   lines : list of lists
+      the split lines of the section
+   periods : list of lists
+      the [stagename, var, cons] periods of a TIM file, or None
+
+   Returns
+   -------
+   list of lists
+      the lines of each stage
+   '''
+   if not periods or not (header.startswith("ROWS") or header.startswith("COLUMNS")):
+      return [lines]
+
+   if header.startswith("ROWS"):
+      starts = [period[2] for period in periods]
+      field = 1
+   else:
+      starts = [period[1] for period in periods]
+      field = 0
+
+   groups = [[] for period in periods]
+   stage = 0
+   markers = []
+   for linelist in lines:
+      if "'MARKER'" in linelist:
+         # the start of an integer block belongs to the stage of its first
+         # column, the end of the block to the stage of its last column
+         if "'INTEND'" in linelist:
+            groups[stage].append(linelist)
+         else:
+            markers.append(linelist)
+         continue
+
+      if stage + 1 < len(starts) and linelist[field] == starts[stage + 1]:
+         stage += 1
+      groups[stage].extend(markers)
+      groups[stage].append(linelist)
+      markers = []
+
+   groups[stage].extend(markers)
+
+   return groups
+
+def writeScaledCorFile(corfile, scaledfile, factor, periods = None):
+   '''
+   writes a synthetic core file that contains factor copies of the rows,
+   columns and nonzeros of a core file. The copies share the objective rows,
+   so the scaled core is block diagonal with a single objective.
+
+   If the periods of a TIM file are given, then the rows and columns are
+   ordered by stage, i.e. the copies of the first stage precede the copies of
+   the second stage. The first copy keeps the original names, so the TIM file
+   of the core file is also a valid TIM file for the scaled core.
+
+   Parameters
+   ----------
+   corfile : string
+      the name of the core file that is scaled
+   scaledfile : string
+      the name of the scaled core file
+   factor : int
+      the number of copies
+   periods : list of lists. Default None
+      the [stagename, var, cons] periods of the TIM file of the core file
+   '''
+   sections = []
+   objrows = set()
+   with open(corfile, "r") as infile:
+      for line in infile:
+         if not line.strip():
+            continue
+
+         if not line.startswith(" "):
+            sections.append((line, []))
+         elif sections:
+            linelist = line.split()
+            sections[-1][1].append(linelist)
+            if sections[-1][0].startswith("ROWS") and linelist[0] == 'N':
+               objrows.add(linelist[1])
+
+   def rename(name, copy):
+      if name in objrows:
+         return name
+      return scaledName(name, copy)
+
+   with open(scaledfile, "w") as outfile:
+      for header, sectionlines in sections:
+         outfile.write(header)
+         for lines in stageGroups(header, sectionlines, periods):
+            for copy in range(factor):
+               for linelist in lines:
+                  if header.startswith("ROWS"):
+                     if linelist[0] == 'N' and copy > 0:
+                        continue
+                     outfile.write(" %s  %s\n"%(linelist[0], rename(linelist[1], copy)))
+                  elif header.startswith("COLUMNS"):
+                     if "'MARKER'" in linelist:
+                        outfile.write("    %s  %s  %s\n"%(scaledName(linelist[0], copy),
+                           linelist[1], linelist[2]))
+                        continue
+                     fields = [scaledName(linelist[0], copy)]
+                     for i in range(1, len(linelist), 2):
+                        fields.append(rename(linelist[i], copy))
+                        fields.append(linelist[i + 1])
+                     outfile.write("    %s\n"%("  ".join(fields)))
+                  elif header.startswith("RHS") or header.startswith("RANGES"):
+                     fields = [linelist[0]]
+                     for i in range(1, len(linelist), 2):
+                        fields.append(rename(linelist[i], copy))
+                        fields.append(linelist[i + 1])
+                     outfile.write("    %s\n"%("  ".join(fields)))
+                  elif header.startswith("BOUNDS"):
+                     fields = linelist[:2] + [scaledName(linelist[2], copy)] + linelist[3:]
+                     outfile.write(" %s\n"%("  ".join(fields)))
+                  elif copy == 0:
+                     outfile.write(" %s\n"%("  ".join(linelist)))
+
+def resetPeakMemory():
+   '''
+   resets the peak resident set size of the process. This is only supported
+   on Linux, elsewhere the peak is measured from the start of the process.
+   '''
+   try:
+      with open("/proc/self/clear_refs", "w") as outfile:
+         outfile.write("5")
+   except OSError:
+      pass
+
+def peakMemory():
+   '''
+   returns the peak resident set size of the process in bytes, or None if it
+   can not be measured
+   '''
+   try:
+      with open("/proc/self/status", "r") as infile:
+         for line in infile:
+            if line.startswith("VmHWM:"):
+               return int(line.split()[1])*1024
+   except OSError:
+      pass
+
+   if resource is None:
+      return None
+
+   # ru_maxrss is given in bytes on macOS and in kilobytes elsewhere
+   peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+   if sys.platform == "darwin":
+      return peak
+   return peak*1024
+
+def timePhase(phase, func, count = None, unit = None, repeat = 1):
+   '''
+   times a phase of the benchmark
+
+   Parameters
+   ----------
+   phase : string
+      the name of the phase
+   func : function
+      the function that is called without arguments
+   count : function. Default None
+      a function that is called with the return value of func and returns
+      the number of processed items, e.g. nonzeros or scenario entries
+   unit : string. Default None
+      the name of the processed items
+   repeat : int. Default 1
+      the number of calls, the shortest wall time is reported
+
+   Returns
+   -------
+   dict, object
+      the result of the phase and the return value of the last call
+   '''
+   resetPeakMemory()
+   seconds, value = timeCall(func, repeat)
+   result = {"phase": phase, "seconds": seconds, "peakrss": peakMemory()}
+   if count is not None:
+      items = count(value)
+      result["count"] = items
+      result["unit"] = unit
+      result["rate"] = items/seconds if seconds > 0 else None
+
+   return result, value
+
+def countStoEntries(stofile):
+   '''
+   returns the number of scenario entries of a STO file
+   '''
+   entries = 0
+   with open(stofile, "rb") as infile:
+      for line in infile:
+         if line.startswith(b"    "):
+            entries += 1
+
+   return entries
+
+def benchmarkInstance(instanceclass, corfile, timfile, scale = 1,
+      nscenarios = 100, stochtypes = (), repeat = 1, tmpdir = None):
+   '''
+   benchmarks reading the core and TIM files of an instance and writing its
+   TIM and STO files. If the scale is larger than 1, then a synthetic core with
+   scale copies of the core is benchmarked, see writeScaledCorFile.
+
+   Parameters
+   ----------
+   instanceclass : class
+      the Instance class
+   corfile : string
+      the name of the core file, or None if only the TIM file is read
+   timfile : string
+      the name of the TIM file, or None if the TIM file is written from the
+      core file
+   scale : int. Default 1
+      the number of copies of the core
+   nscenarios : int. Default 100
+      the number of scenarios of the STO files
+   stochtypes : list of strings
+      the types of stochasticity. The types without stochastic entries are
+      skipped
+   repeat : int. Default 1
+      the number of calls of each phase
+   tmpdir : string. Default None
+      the directory of the written files
+
+   Returns
+   -------
+   list of dicts
+      the result of each phase
+   '''
+   if tmpdir is None:
+      tmpdir = tempfile.gettempdir()
+   results = []
+
+   # reading the TIM file without a core file
+   if corfile is None:
+      def readTimOnly():
+         instance = instanceclass(timfile = timfile)
+         instance.readTimFile()
+         return instance
+
+      result, instance = timePhase("readTimFile", readTimOnly,
+            lambda instance: len(instance.periods), "periods", repeat)
+      results.append(result)
+      return results
+
+   # writing the TIM file of the core file, this is also needed for scaling
+   instance = instanceclass(corfile, timfile)
+   instance.readCorFile()
+   if timfile is None:
+      timfile = os.path.join(tmpdir, "benchmark.tim")
+      instance.timfile = timfile
+      instance.writeTimFile()
+   instance.periods = []
+   instance.readTimFile()
+
+   if scale > 1:
+      scaledfile = os.path.join(tmpdir, "benchmark_scaled.cor")
+      writeScaledCorFile(corfile, scaledfile, scale, instance.periods)
+      corfile = scaledfile
+
+   def readCor():
+      instance = instanceclass(corfile, timfile)
+      instance.readCorFile()
+      return instance
+
+   result, instance = timePhase("readCorFile", readCor,
+         lambda instance: len(instance.coeffs), "nonzeros", repeat)
+   results.append(result)
+
+   def readTim():
+      instance.periods = []
+      instance.readTimFile()
+      return instance
+
+   result, instance = timePhase("readTimFile", readTim,
+         lambda instance: len(instance.periods), "periods", repeat)
+   results.append(result)
+
+   # the TIM file is written from the core file by the derived classes
+   if instanceclass.writeStageFile is not Instance.writeStageFile:
+      instance.timfile = os.path.join(tmpdir, "benchmark_written.tim")
+      result, value = timePhase("writeTimFile", instance.writeTimFile,
+            repeat = repeat)
+      results.append(result)
+      instance.timfile = timfile
+
+   for stochtype in stochtypes:
+      if instance.getStochasticEntries(stochtype) is None:
+         continue
+
+      instance.stofile = os.path.join(tmpdir, "benchmark.sto")
+      result, value = timePhase("writeStoFile-%s"%stochtype,
+            lambda: instance.writeStoFile(nscenarios, stochtype),
+            lambda value: countStoEntries(instance.stofile), "entries", repeat)
+      result["scenarios"] = nscenarios
+      result["bytes"] = os.path.getsize(instance.stofile)
+      results.append(result)
+
+   return results
+
+def _runIsolated(args):
+   '''
+   runs benchmarkInstance in a worker process
+   '''
+   return benchmarkInstance(*args)
+
+def runBenchmarks(cases, scales = (1, 10, 100, 1000), nscenarios = 100,
+      stochtypes = (), repeat = 1, isolate = True):
+   '''
+   runs the benchmark for each case and scale
+
+   Parameters
+   ----------
+   cases : list of tuples
+      the (classname, instanceclass, corfile, timfile) of each benchmarked
+      instance. The corfile or timfile can be None
+   scales : list of ints
+      the number of copies of each core
+   nscenarios : int. Default 100
+      the number of scenarios of the STO files
+   stochtypes : list of strings
+      the types of stochasticity
+   repeat : int. Default 1
+      the number of calls of each phase
+   isolate : bool. Default True
+      if True, then each case runs in a fresh process, so the peak memory is
+      not affected by the previous cases
+
+   Returns
+   -------
+   list of dicts
+      the result of each phase
+   '''
+   results = []
+   with tempfile.TemporaryDirectory() as tmpdir:
+      for classname, instanceclass, corfile, timfile in cases:
+         # a TIM file alone is not scaled
+         for scale in (scales if corfile is not None else [1]):
+            args = (instanceclass, corfile, timfile, scale, nscenarios,
+                  stochtypes, repeat, tmpdir)
+            if isolate and "fork" in multiprocessing.get_all_start_methods():
+               context = multiprocessing.get_context("fork")
+               with context.Pool(1) as pool:
+                  phases = pool.apply(_runIsolated, (args,))
+            else:
+               phases = benchmarkInstance(*args)
+
+            for result in phases:
+               result["class"] = classname
+               result["instance"] = os.path.basename(corfile or timfile)
+               result["scale"] = scale
+               results.append(result)
+               printBenchmarkResult(result)
+
+   return results
+
+def printBenchmarkResult(result):
+   '''
+   prints the result of a benchmark phase
+   '''
+   rate = ""
+   if result.get("rate") is not None:
+      rate = "%.0f %s/s"%(result["rate"], result["unit"])
+   peakrss = "-"
+   if result["peakrss"] is not None:
+      peakrss = "%.1f"%(result["peakrss"]/(1 << 20))
+   print("%-30s %6d %-20s %10.4f %10s %s"%(result["instance"], result["scale"],
+      result["phase"], result["seconds"], peakrss, rate))
+
+def benchmarkEnvironment():
+   '''
+   returns a description of the environment of a benchmark run
+   '''
+   return {"python": platform.python_version(), "numpy": np.__version__,
+         "platform": platform.platform(), "processor": platform.processor(),
+         "time": time.strftime("%Y-%m-%dT%H:%M:%S")}
+
+def writeBenchmarkReport(results, filename, label = None):
+   '''
+   writes the results of a benchmark run as JSON
+   '''
+   report = {"label": label, "environment": benchmarkEnvironment(),
+         "results": results}
+   with open(filename, "w") as outfile:
+      json.dump(report, outfile, indent = 2)
+
+def compareBenchmarkReport(results, filename, tolerance = 0.1):
+   '''
+   compares the results of a benchmark run with a previous report and prints
+   the phases that are slower by more than the tolerance
+
+   Returns
+   -------
+   int
+      the number of slower phases
+   '''
+   with open(filename, "r") as infile:
+      previous = json.load(infile)["results"]
+
+   key = lambda result: (result["class"], result["instance"], result["scale"],
+         result["phase"])
+   previoustimes = {key(result): result["seconds"] for result in previous}
+
+   nslower = 0
+   for result in results:
+      seconds = previoustimes.get(key(result))
+      if seconds is None or seconds == 0:
+         continue
+
+      ratio = result["seconds"]/seconds
+      if ratio > 1 + tolerance:
+         nslower += 1
+         print("   WARNING: %s %s scale %d is %.2fx slower (%.4fs vs %.4fs)"%(
+            result["instance"], result["phase"], result["scale"], ratio,
+            result["seconds"], seconds))
+
+   return nslower
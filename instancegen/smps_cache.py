@@ -0,0 +1,183 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import os
+import json
+import hashlib
+import numpy as np
+from .smps_coeffs import CoefficientMatrix
+
+# the version of the cache format. Caches of a different version are rebuilt.
+CACHE_VERSION = 2
+
+# the extension that is appended to the core file name for the cache
+CACHE_EXTENSION = ".cache.npz"
+
+# the number of bytes that are hashed at once
+HASH_BLOCK = 1 << 24
+
+def cacheFileName(corfile):
+   '''
+   returns the name of the cache file of a core file
+   '''
+   return corfile + CACHE_EXTENSION
+
+def fileHash(filename):
+   '''
+   returns the SHA-1 hash of the content of a file
+   '''
+   digest = hashlib.sha1()
+   with open(filename, "rb") as infile:
+      while True:
+         block = infile.read(HASH_BLOCK)
+         if not block:
+            break
+         digest.update(block)
+
+   return digest.hexdigest()
+
+def fileKey(filename, hashcontent = True):
+   '''
+   returns the key of a file, which is its size, modification time and,
+   optionally, the hash of its content
+   '''
+   stat = os.stat(filename)
+   key = {"size": stat.st_size, "mtime": stat.st_mtime_ns}
+   if hashcontent:
+      key["sha1"] = fileHash(filename)
+
+   return key
+
+def encodeNames(names):
+   '''
+   encodes a list of names as an array of bytes separated by newlines
+   '''
+   return np.frombuffer("\n".join(names).encode(), dtype = np.uint8)
+
+def decodeNames(array):
+   '''
+   decodes an array of bytes separated by newlines into a list of names
+   '''
+   if len(array) == 0:
+      return []
+
+   return array.tobytes().decode().split("\n")
+
+def isCacheValid(corfile, meta):
+   '''
+   returns whether the cache meta data matches the core file. If the size and
+   modification time match, then the cache is valid. Otherwise, the content
+   hash of the core file is compared, so that a copied or touched core file
+   does not need to be parsed again.
+   '''
+   if meta.get("version") != CACHE_VERSION:
+      return False
+
+   key = fileKey(corfile, False)
+   if key["size"] != meta["size"]:
+      return False
+   if key["mtime"] == meta["mtime"]:
+      return True
+
+   return fileHash(corfile) == meta["sha1"]
+
+def writeCoreCache(instance):
+   '''
+   writes the constraints, variables, rhs, coefficients, row types, integer
+   variables, bounds and ranges of an instance to the cache file of its core
+   file. The cache is written to a temporary file
+   that replaces the cache file, so a partially written cache is never read.
+   If the cache can not be written, e.g. the directory is read only or the
+   disk is full, then a warning is printed and the instance is unchanged.
+   '''
+   corfile = instance.corfile
+   matrix = instance.getCoefficientMatrix()
+   meta = fileKey(corfile)
+   meta["version"] = CACHE_VERSION
+   meta["objsense"] = instance.objsense
+
+   cachefile = cacheFileName(corfile)
+   tmpfile = "%s.%d.tmp"%(cachefile, os.getpid())
+   try:
+      with open(tmpfile, "wb") as outfile:
+         np.savez(outfile,
+               meta = encodeNames([json.dumps(meta)]),
+               constraints = encodeNames(instance.constraints),
+               variables = encodeNames(instance.variables),
+               rhsnames = encodeNames(list(instance.rhs.keys())),
+               rhsvalues = np.fromiter(instance.rhs.values(),
+                  dtype = np.float64, count = len(instance.rhs)),
+               colnames = encodeNames(matrix.colnames),
+               rownames = encodeNames(matrix.rownames),
+               colptr = matrix.colptr,
+               rowind = matrix.rowind,
+               colval = matrix.colval,
+               rowtypenames = encodeNames(list(instance.rowtypes.keys())),
+               rowtypes = encodeNames(list(instance.rowtypes.values())),
+               integers = encodeNames(instance.integers),
+               boundtypes = encodeNames([bound[0]
+                  for bound in instance.bounds]),
+               boundvars = encodeNames([bound[1] for bound in instance.bounds]),
+               boundvalues = np.array([np.nan if bound[2] is None else bound[2]
+                  for bound in instance.bounds], dtype = np.float64),
+               rangenames = encodeNames(list(instance.ranges.keys())),
+               rangevalues = np.fromiter(instance.ranges.values(),
+                  dtype = np.float64, count = len(instance.ranges)))
+      os.replace(tmpfile, cachefile)
+   except OSError as error:
+      print("   WARNING: the cache %s could not be written: %s"%(cachefile,
+         error))
+      if os.path.exists(tmpfile):
+         os.remove(tmpfile)
+
+def readCoreCache(instance):
+   '''
+   reads the constraints, variables, rhs, coefficients, row types, integer
+   variables, bounds and ranges of an instance from the cache file of its core
+   file
+
+   Returns
+   -------
+   bool
+      True if the cache was read, False if the cache does not exist or is
+      stale
+   '''
+   corfile = instance.corfile
+   cachefile = cacheFileName(corfile)
+   if not os.path.isfile(cachefile):
+      return False
+
+   try:
+      with np.load(cachefile) as cache:
+         meta = json.loads(decodeNames(cache["meta"])[0])
+         if not isCacheValid(corfile, meta):
+            return False
+
+         instance.constraints = decodeNames(cache["constraints"])
+         instance.variables = decodeNames(cache["variables"])
+         instance.rhs = dict(zip(decodeNames(cache["rhsnames"]),
+            cache["rhsvalues"].tolist()))
+         matrix = CoefficientMatrix.fromCSC(decodeNames(cache["colnames"]),
+               decodeNames(cache["rownames"]), cache["colptr"], cache["rowind"],
+               cache["colval"])
+         instance.rowtypes = dict(zip(decodeNames(cache["rowtypenames"]),
+            decodeNames(cache["rowtypes"])))
+         instance.integers = decodeNames(cache["integers"])
+         instance.bounds = [(boundtype, var, None if np.isnan(value) else value)
+               for boundtype, var, value in zip(decodeNames(cache["boundtypes"]),
+                  decodeNames(cache["boundvars"]), cache["boundvalues"].tolist())]
+         instance.ranges = dict(zip(decodeNames(cache["rangenames"]),
+            cache["rangevalues"].tolist()))
+         instance.objsense = meta.get("objsense")
+   except (OSError, ValueError, KeyError):
+      # a cache that can not be read is treated as stale
+      return False
+
+   if instance.compact:
+      instance.coeffs = matrix
+   else:
+      instance.coeffs = matrix.toDict()
+
+   return True
@@ -0,0 +1,433 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+from array import array
+import numpy as np
+
+class CoefficientMatrix:
+   '''
+   a compact sparse store for the coefficients of a core file.
+
+   The nonzeros are held in compressed sparse column (CSC) arrays, with the
+   compressed sparse row (CSR) arrays built on demand. The row and column
+   names are mapped to integer indices, so only a 4-byte row index and an
+   8-byte value is stored for each nonzero.
+
+   The matrix can be used in place of the coefficient dictionary, i.e. a
+   coefficient is accessed by `coeffs[<varname>, <consname>]`.
+
+   Attributes
+   ----------
+   colnames : list of strings
+      the column (variable) names, indexed by the column index
+   rownames : list of strings
+      the row names, indexed by the row index. This includes the objective row
+   colindex : dict
+      maps a column name to its index
+   rowindex : dict
+      maps a row name to its index
+   '''
+
+   def __init__(self):
+      self.colnames = []
+      self.rownames = []
+      self.colindex = {}
+      self.rowindex = {}
+
+      # the triplets that have been added, but not compressed. The added
+      # values are also kept by (column, row), so that a lookup does not
+      # compress the matrix
+      self._pendingcols = array('i')
+      self._pendingrows = array('i')
+      self._pendingvals = array('d')
+      self._pending = {}
+
+      # the CSC arrays
+      self._colptr = np.zeros(1, dtype = np.int64)
+      self._rowind = np.zeros(0, dtype = np.int32)
+      self._colval = np.zeros(0, dtype = np.float64)
+
+      # the CSR arrays, these are only built when a row is requested
+      self._rowptr = None
+      self._colind = None
+      self._rowval = None
+
+   @classmethod
+   def fromDict(cls, coeffs, variables = None):
+      '''
+      creates a coefficient matrix from a dictionary keyed by (var, cons)
+
+      Parameters
+      ----------
+      coeffs : dict
+         the coefficients keyed by the variable and constraint name
+      variables : list of strings. Default None
+         the variables in the order of the columns. If None, then the columns
+         are ordered by the first appearance in coeffs
+      '''
+      matrix = cls()
+      if variables is not None:
+         for var in variables:
+            matrix.addColumn(var)
+
+      matrix._pendingcols = array('i', [matrix.addColumn(var) for var, _ in coeffs])
+      matrix._pendingrows = array('i', [matrix.addRow(cons) for _, cons in coeffs])
+      matrix._pendingvals = array('d', coeffs.values())
+      matrix.finalize()
+
+      return matrix
+
+   @classmethod
+   def fromArrays(cls, colnames, rownames, cols, rows, values, colindex = None,
+         rowindex = None):
+      '''
+      creates a coefficient matrix from triplet arrays of column indices, row
+      indices and values. The names must be unique. If a (column, row) pair
+      appears more than once, then the last value is stored.
+
+      The index dictionaries of the names are used by the matrix if they are
+      given, otherwise they are built from the names.
+      '''
+      matrix = cls()
+      matrix.colnames = colnames
+      matrix.rownames = rownames
+      if colindex is None:
+         colindex = dict(zip(colnames, range(len(colnames))))
+      if rowindex is None:
+         rowindex = dict(zip(rownames, range(len(rownames))))
+      matrix.colindex = colindex
+      matrix.rowindex = rowindex
+
+      matrix._pendingcols = np.asarray(cols, dtype = np.int32)
+      matrix._pendingrows = np.asarray(rows, dtype = np.int32)
+      matrix._pendingvals = np.asarray(values, dtype = np.float64)
+      matrix.finalize()
+
+      return matrix
+
+   @classmethod
+   def fromCSC(cls, colnames, rownames, colptr, rowind, colval):
+      '''
+      creates a coefficient matrix from CSC arrays. The names must be unique
+      and the row indices of each column must be sorted and unique.
+      '''
+      matrix = cls()
+      matrix.colnames = list(colnames)
+      matrix.rownames = list(rownames)
+      matrix.colindex = {var: i for i, var in enumerate(matrix.colnames)}
+      matrix.rowindex = {cons: i for i, cons in enumerate(matrix.rownames)}
+
+      matrix._colptr = colptr
+      matrix._rowind = rowind
+      matrix._colval = colval
+
+      return matrix
+
+   def addColumn(self, var):
+      '''
+      adds a column name to the matrix and returns the column index
+      '''
+      index = self.colindex.get(var)
+      if index is None:
+         index = len(self.colnames)
+         self.colindex[var] = index
+         self.colnames.append(var)
+
+      return index
+
+   def addRow(self, cons):
+      '''
+      adds a row name to the matrix and returns the row index
+      '''
+      index = self.rowindex.get(cons)
+      if index is None:
+         index = len(self.rownames)
+         self.rowindex[cons] = index
+         self.rownames.append(cons)
+
+      return index
+
+   def add(self, var, cons, value):
+      '''
+      adds a coefficient to the matrix. The coefficient can be looked up
+      directly, the matrix is compressed when the CSC or CSR arrays are next
+      accessed.
+      '''
+      if not isinstance(self._pendingcols, array):
+         self._pendingcols = array('i', self._pendingcols)
+         self._pendingrows = array('i', self._pendingrows)
+         self._pendingvals = array('d', self._pendingvals)
+
+      col = self.addColumn(var)
+      row = self.addRow(cons)
+      self._pendingcols.append(col)
+      self._pendingrows.append(row)
+      self._pendingvals.append(value)
+      self._pending[col, row] = value
+
+   def finalize(self):
+      '''
+      compresses all added coefficients into the CSC arrays
+      '''
+      ncols = len(self.colnames)
+      if len(self._pendingvals) == 0:
+         # the columns that were added by addColumn have no nonzeros
+         if len(self._colptr) < ncols + 1:
+            self._colptr = np.concatenate((self._colptr,
+               np.full(ncols + 1 - len(self._colptr), self._colptr[-1],
+                  dtype = np.int64)))
+            self._rowptr = None
+            self._colind = None
+            self._rowval = None
+         return
+
+      cols, rows, vals = self._pendingArrays()
+      nrows = max(len(self.rownames), 1)
+
+      # only the pending nonzeros are sorted by column and then row. The sort
+      # is stable, so the most recently added value is kept for duplicates.
+      keys = cols.astype(np.int64)*nrows + rows
+      order = np.argsort(keys, kind = "stable")
+      keys = keys[order]
+      last = np.ones(len(keys), dtype = bool)
+      last[:-1] = keys[1:] != keys[:-1]
+      order = order[last]
+      keys = keys[last]
+      cols = cols[order]
+      rows = rows[order]
+      vals = vals[order]
+
+      # the sorted pending nonzeros are merged into the CSC arrays. A pending
+      # value replaces the stored value of the same entry, the other pending
+      # nonzeros are inserted at their position in the column.
+      counts = np.zeros(ncols, dtype = np.int64)
+      counts[:len(self._colptr) - 1] = np.diff(self._colptr)
+      storedcols = np.repeat(np.arange(len(self._colptr) - 1, dtype = np.int64),
+            np.diff(self._colptr))
+      storedkeys = storedcols*nrows + self._rowind
+      positions = np.searchsorted(storedkeys, keys)
+      stored = positions < len(storedkeys)
+      stored[stored] = storedkeys[positions[stored]] == keys[stored]
+
+      colval = self._colval
+      if stored.any():
+         colval = colval.copy()
+         colval[positions[stored]] = vals[stored]
+      inserted = ~stored
+      counts += np.bincount(cols[inserted], minlength = ncols)
+
+      colptr = np.zeros(ncols + 1, dtype = np.int64)
+      np.cumsum(counts, out = colptr[1:])
+
+      self._colptr = colptr
+      self._rowind = np.insert(self._rowind, positions[inserted],
+            rows[inserted]).astype(np.int32, copy = False)
+      self._colval = np.insert(colval, positions[inserted],
+            vals[inserted]).astype(np.float64, copy = False)
+
+      self._pendingcols = array('i')
+      self._pendingrows = array('i')
+      self._pendingvals = array('d')
+      self._pending = {}
+      self._rowptr = None
+      self._colind = None
+      self._rowval = None
+
+   def _pendingArrays(self):
+      '''
+      returns the pending column indices, row indices and values as arrays
+      '''
+      if isinstance(self._pendingcols, array):
+         return np.frombuffer(self._pendingcols, dtype = np.int32),\
+               np.frombuffer(self._pendingrows, dtype = np.int32),\
+               np.frombuffer(self._pendingvals, dtype = np.float64)
+
+      return self._pendingcols, self._pendingrows, self._pendingvals
+
+   @property
+   def colptr(self):
+      '''the CSC column pointers'''
+      self.finalize()
+      return self._colptr
+
+   @property
+   def rowind(self):
+      '''the CSC row indices'''
+      self.finalize()
+      return self._rowind
+
+   @property
+   def colval(self):
+      '''the CSC values'''
+      self.finalize()
+      return self._colval
+
+   @property
+   def rowptr(self):
+      '''the CSR row pointers'''
+      self._buildRows()
+      return self._rowptr
+
+   @property
+   def colind(self):
+      '''the CSR column indices'''
+      self._buildRows()
+      return self._colind
+
+   @property
+   def rowval(self):
+      '''the CSR values'''
+      self._buildRows()
+      return self._rowval
+
+   def _buildRows(self):
+      '''
+      builds the CSR arrays from the CSC arrays
+      '''
+      self.finalize()
+      nrows = len(self.rownames)
+      if self._rowptr is not None and len(self._rowptr) == nrows + 1:
+         return
+      cols = np.repeat(np.arange(len(self.colnames), dtype = np.int32),
+            np.diff(self._colptr))
+
+      # a stable sort keeps the columns of each row in ascending order
+      order = np.argsort(self._rowind, kind = "stable")
+      rowptr = np.zeros(nrows + 1, dtype = np.int64)
+      np.cumsum(np.bincount(self._rowind, minlength = nrows), out = rowptr[1:])
+
+      self._rowptr = rowptr
+      self._colind = cols[order]
+      self._rowval = self._colval[order]
+
+   def _lookup(self, key):
+      '''
+      returns the coefficient of the (var, cons) key, or None if the key is
+      not stored. The added coefficients are looked up before the CSC arrays,
+      so the matrix is not compressed.
+      '''
+      var, cons = key
+      col = self.colindex.get(var)
+      row = self.rowindex.get(cons)
+      if col is None or row is None:
+         return None
+
+      value = self._pending.get((col, row))
+      if value is not None:
+         return float(value)
+
+      # the columns that were added after the last compression are empty
+      if col + 1 >= len(self._colptr):
+         return None
+
+      start = self._colptr[col]
+      end = self._colptr[col + 1]
+      pos = start + np.searchsorted(self._rowind[start:end], row)
+      if pos < end and self._rowind[pos] == row:
+         return float(self._colval[pos])
+
+      return None
+
+   def __getitem__(self, key):
+      value = self._lookup(key)
+      if value is None:
+         raise KeyError(key)
+
+      return value
+
+   def __setitem__(self, key, value):
+      self.add(key[0], key[1], value)
+
+   def __contains__(self, key):
+      return self._lookup(key) is not None
+
+   def __len__(self):
+      self.finalize()
+      return len(self._colval)
+
+   def __iter__(self):
+      return iter(self.keys())
+
+   def get(self, key, default = None):
+      '''
+      returns the coefficient for the (var, cons) key, or default if the key
+      is not stored
+      '''
+      value = self._lookup(key)
+      if value is None:
+         return default
+
+      return value
+
+   def keys(self):
+      '''
+      returns a generator over the (var, cons) keys in column order
+      '''
+      colptr = self.colptr
+      rowind = self.rowind
+      for col, var in enumerate(self.colnames):
+         for pos in range(colptr[col], colptr[col + 1]):
+            yield var, self.rownames[rowind[pos]]
+
+   def values(self):
+      '''
+      returns a generator over the coefficients in column order
+      '''
+      for value in self.colval:
+         yield float(value)
+
+   def items(self):
+      '''
+      returns a generator over the ((var, cons), coefficient) pairs in column
+      order
+      '''
+      colval = self.colval
+      for pos, key in enumerate(self.keys()):
+         yield key, float(colval[pos])
+
+   def toDict(self):
+      '''
+      returns the coefficients as a dictionary keyed by (var, cons)
+      '''
+      colptr = self.colptr
+      colnames = self.colnames
+      rownames = self.rownames
+      cols = np.repeat(np.arange(len(colnames)), np.diff(colptr)).tolist()
+      keys = zip([colnames[col] for col in cols],
+            [rownames[row] for row in self._rowind.tolist()])
+
+      return dict(zip(keys, self._colval.tolist()))
+
+   def getColumn(self, var):
+      '''
+      returns a list of (consname, coefficient) pairs for the nonzeros of a
+      column
+      '''
+      col = self.colindex.get(var)
+      if col is None:
+         return []
+
+      colptr = self.colptr
+      start = colptr[col]
+      end = colptr[col + 1]
+      rownames = self.rownames
+      return [(rownames[row], value) for row, value in
+            zip(self._rowind[start:end].tolist(), self._colval[start:end].tolist())]
+
+   def getRow(self, cons):
+      '''
+      returns a list of (varname, coefficient) pairs for the nonzeros of a
+      row. The pairs are given in the column order
+      '''
+      row = self.rowindex.get(cons)
+      if row is None:
+         return []
+
+      rowptr = self.rowptr
+      start = rowptr[row]
+      end = rowptr[row + 1]
+      colnames = self.colnames
+      return [(colnames[col], value) for col, value in
+            zip(self._colind[start:end].tolist(), self._rowval[start:end].tolist())]
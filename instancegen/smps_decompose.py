@@ -0,0 +1,310 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import json
+import numpy as np
+from .smps_profile import profiler
+
+# the maximum number of column degree thresholds that are tried
+DECOMPOSE_CANDIDATES = 32
+
+# the maximum fraction of the columns in the first stage
+DECOMPOSE_MAX_LINKING = 0.2
+
+# the maximum fraction of the second stage constraints in the largest block.
+# A decomposition with a larger block has little block structure
+DECOMPOSE_MAX_BLOCK = 0.5
+
+def connectedComponents(nnodes, heads, tails):
+   '''
+   returns the connected component of each node of a graph given by its edges.
+   The components are found by hooking the root of the larger label onto the
+   smaller label of each edge and pointer jumping, so each round is a few
+   vectorised passes over the edges and the number of rounds is logarithmic
+   in practice.
+
+   Parameters
+   ----------
+   nnodes : int
+      the number of nodes
+   heads, tails : numpy.ndarray
+      the nodes of each edge
+
+   Returns
+   -------
+   numpy.ndarray
+      the label of the component of each node, which is the smallest node of
+      the component
+   '''
+   labels = np.arange(nnodes, dtype = np.int64)
+   while True:
+      headlabels = labels[heads]
+      taillabels = labels[tails]
+      differ = headlabels != taillabels
+      if not np.any(differ):
+         break
+
+      # the labels are roots after the pointer jumping, so hooking a larger
+      # root onto a smaller label never creates a cycle
+      low = np.minimum(headlabels[differ], taillabels[differ])
+      high = np.maximum(headlabels[differ], taillabels[differ])
+      np.minimum.at(labels, high, low)
+      while True:
+         jumped = labels[labels]
+         if np.array_equal(jumped, labels):
+            break
+         labels = jumped
+
+   return labels
+
+def blockComponents(nrows, ncols, rows, cols, linking):
+   '''
+   returns the block of each row and column after the linking columns are
+   removed, -1 for the linking columns and for the rows that only have
+   nonzeros in linking columns. The blocks are numbered from 0 in the order of
+   their first row.
+   '''
+   kept = ~linking[cols]
+   labels = connectedComponents(nrows + ncols, rows[kept], nrows + cols[kept])
+
+   # the rows without a kept nonzero and the linking columns are isolated
+   rowlabels = labels[:nrows].copy()
+   rowlabels[np.bincount(rows[kept], minlength = nrows) == 0] = -1
+   collabels = labels[nrows:].copy()
+   collabels[linking] = -1
+
+   # numbering the blocks in the order of their first row. The blocks of
+   # columns without nonzeros in the constraints come last
+   labels = np.concatenate((rowlabels, collabels))
+   inblock = labels >= 0
+   blocklabels, first, inverse = np.unique(labels[inblock], return_index = True,
+         return_inverse = True)
+   rank = np.empty(len(blocklabels), dtype = np.int64)
+   rank[np.argsort(first)] = np.arange(len(blocklabels))
+   blocks = np.full(nrows + ncols, -1, dtype = np.int64)
+   blocks[inblock] = rank[inverse]
+   rowblocks = blocks[:nrows]
+   colblocks = blocks[nrows:]
+
+   return rowblocks, colblocks
+
+class StageDecomposition:
+   '''
+   a two-stage decomposition of a core file. The first stage columns link
+   blocks of rows and columns that are otherwise independent, the second
+   stage blocks. The first stage rows only have nonzeros in first stage
+   columns.
+
+   Attributes
+   ----------
+   constraints, variables : list of strings
+      the constraint and variable names in the order of the core file
+   rowblocks, colblocks : numpy.ndarray
+      the second stage block of each constraint and variable, -1 for the first
+      stage
+   threshold : int
+      the smallest number of nonzeros of a first stage column
+   nblocks : int
+      the number of second stage blocks with constraints
+   maxblock : float
+      the maximum fraction of the second stage constraints in the largest
+      block of a decomposition that is found
+   '''
+
+   def __init__(self, constraints, variables, rowblocks, colblocks, threshold,
+         maxblock = DECOMPOSE_MAX_BLOCK):
+      self.constraints = constraints
+      self.variables = variables
+      self.rowblocks = rowblocks
+      self.colblocks = colblocks
+      self.threshold = threshold
+      self.maxblock = maxblock
+      self.nblocks = int(rowblocks.max(initial = -1)) + 1
+
+   def largestBlock(self):
+      '''
+      returns the number of constraints of the largest second stage block
+      '''
+      return int(np.bincount(self.rowblocks[self.rowblocks >= 0],
+         minlength = 1).max())
+
+   @property
+   def found(self):
+      '''
+      whether the first stage has columns and splits the second stage into
+      more than one block, with at most maxblock of the second stage
+      constraints in the largest block. A split that leaves most of the second
+      stage in one block is not a decomposition.
+      '''
+      secondstage = int(np.count_nonzero(self.rowblocks >= 0))
+      return self.nblocks > 1 and bool(np.any(self.colblocks < 0)) and \
+            self.largestBlock() <= self.maxblock*secondstage
+
+   def rowOrder(self):
+      '''
+      returns the constraints ordered by stage and block. The order within a
+      block is the order of the core file.
+      '''
+      order = np.argsort(self.rowblocks, kind = "stable")
+      return [self.constraints[row] for row in order.tolist()]
+
+   def colOrder(self):
+      '''
+      returns the variables ordered by stage and block. The order within a
+      block is the order of the core file.
+      '''
+      order = np.argsort(self.colblocks, kind = "stable")
+      return [self.variables[col] for col in order.tolist()]
+
+   def isOrdered(self):
+      '''
+      returns whether the first stage constraints and variables come first in
+      the core file, so that the stages can be written to a TIM file without
+      reordering the core file
+      '''
+      firstrows = self.rowblocks < 0
+      firstcols = self.colblocks < 0
+      return bool(np.all(firstrows[:np.count_nonzero(firstrows)]) and
+            np.all(firstcols[:np.count_nonzero(firstcols)]))
+
+   def periods(self, names = ["STAGE-1", "STAGE-2"]):
+      '''
+      returns the periods of the TIM file, [varname, consname, stagename], for
+      the core file in the order of rowOrder and colOrder
+      '''
+      rows = self.rowOrder()
+      cols = self.colOrder()
+      nfirstrows = int(np.count_nonzero(self.rowblocks < 0))
+      nfirstcols = int(np.count_nonzero(self.colblocks < 0))
+      assert nfirstcols < len(cols), "the decomposition has no second stage"
+
+      # a first stage without constraints starts the second stage at the
+      # first constraint, which gives an empty range for the first stage
+      return [[cols[0], rows[0], names[0]],
+            [cols[nfirstcols], rows[min(nfirstrows, len(rows) - 1)], names[1]]]
+
+   def report(self):
+      '''
+      returns the summary of the decomposition as a dictionary that can be
+      written as JSON
+      '''
+      rowsizes = np.bincount(self.rowblocks[self.rowblocks >= 0],
+            minlength = self.nblocks)
+      colsizes = np.bincount(self.colblocks[self.colblocks >= 0],
+            minlength = self.nblocks)[:self.nblocks]
+      return {"threshold": self.threshold,
+            "blocks": self.nblocks,
+            "firststageconstraints": int(np.count_nonzero(self.rowblocks < 0)),
+            "firststagevariables": int(np.count_nonzero(self.colblocks < 0)),
+            "largestblock": {"constraints": int(rowsizes.max(initial = 0)),
+               "variables": int(colsizes.max(initial = 0))},
+            "ordered": self.isOrdered()}
+
+   def writeOrder(self, filename):
+      '''
+      writes the proposed constraint and variable orders as JSON
+      '''
+      with open(filename, "w") as outfile:
+         json.dump({"constraints": self.rowOrder(),
+            "variables": self.colOrder()}, outfile)
+
+def detectStages(instance, maxlinking = DECOMPOSE_MAX_LINKING,
+      ncandidates = DECOMPOSE_CANDIDATES, maxblock = DECOMPOSE_MAX_BLOCK):
+   '''
+   detects a two-stage decomposition of the core file of an instance from the
+   structure of its coefficient matrix. The first stage is a set of linking
+   columns, i.e. the columns with at least a threshold number of nonzeros,
+   and the rows that only have nonzeros in linking columns. For each candidate
+   threshold, the blocks of the row-column incidence graph without the
+   linking columns are its connected components. The threshold that minimises
+   the size of the first stage plus the size of the largest block is
+   selected among the decompositions that are found, so that the first stage
+   is small and the second stage splits into many small blocks.
+
+   Parameters
+   ----------
+   instance : Instance
+      the instance with the core file read
+   maxlinking : float. Default DECOMPOSE_MAX_LINKING
+      the maximum fraction of the columns in the first stage
+   ncandidates : int. Default DECOMPOSE_CANDIDATES
+      the maximum number of thresholds that are tried. The thresholds are
+      spread over the distinct column degrees
+   maxblock : float. Default DECOMPOSE_MAX_BLOCK
+      the maximum fraction of the second stage constraints in the largest
+      block, see StageDecomposition.found
+
+   Returns
+   -------
+   StageDecomposition
+      the decomposition with the smallest first stage and largest block. It
+      is not found if no threshold splits the second stage, see
+      StageDecomposition.found
+   '''
+   with profiler.phase("detectStages"):
+      matrix = instance.getCoefficientMatrix()
+      nrows = len(instance.constraints)
+      ncols = len(instance.variables)
+
+      # the nonzeros of the constraints, indexed by the order of the core file.
+      # The objective and the other free rows are not constraints
+      consindex = {cons: i for i, cons in enumerate(instance.constraints)}
+      matrixrows = np.array([consindex.get(row, -1) for row in matrix.rownames],
+            dtype = np.int64)
+      varindex = {var: i for i, var in enumerate(instance.variables)}
+      matrixcols = np.array([varindex.get(col, -1) for col in matrix.colnames],
+            dtype = np.int64)
+      rows = matrixrows[matrix.rowind]
+      cols = matrixcols[np.repeat(np.arange(len(matrix.colnames)),
+         np.diff(matrix.colptr))]
+      known = (rows >= 0) & (cols >= 0)
+      rows = rows[known]
+      cols = cols[known]
+
+      # the thresholds are the distinct degrees that leave at most maxlinking
+      # of the columns in the first stage, highest first
+      degrees = np.bincount(cols, minlength = ncols)
+      distinct = np.unique(degrees[degrees > 0])[::-1]
+      nlinking = np.searchsorted(-np.sort(degrees), -distinct, side = "right")
+      distinct = distinct[nlinking <= max(maxlinking*ncols, 1)]
+      if len(distinct) > ncandidates:
+         distinct = distinct[np.unique(np.linspace(0, len(distinct) - 1,
+            ncandidates).round().astype(np.int64))]
+
+      best = None
+      bestscore = None
+      for threshold in distinct.tolist() + [degrees.max(initial = 0) + 1]:
+         linking = degrees >= threshold
+         rowblocks, colblocks = blockComponents(nrows, ncols, rows, cols, linking)
+         decomposition = StageDecomposition(instance.constraints,
+               instance.variables, rowblocks, colblocks, int(threshold),
+               maxblock)
+         sizes = np.bincount(np.concatenate((rowblocks[rowblocks >= 0],
+            colblocks[colblocks >= 0])))
+         score = (not decomposition.found, int(np.count_nonzero(linking)) +
+               int(np.count_nonzero(rowblocks < 0)) + int(sizes.max(initial = 0)))
+         if bestscore is None or score < bestscore:
+            best = decomposition
+            bestscore = score
+
+   return best
+
+def writeDecompositionReport(decomposition):
+   '''
+   prints the summary of a decomposition
+   '''
+   report = decomposition.report()
+   if not decomposition.found:
+      print("   WARNING: no first stage columns split the second stage into "\
+            "independent blocks with at most %g of the second stage "\
+            "constraints in the largest block"%decomposition.maxblock)
+      return
+
+   print("%d first stage constraints and %d first stage variables (at least %d "\
+         "nonzeros) link %d second stage blocks, the largest with %d "\
+         "constraints and %d variables"%(report["firststageconstraints"],
+            report["firststagevariables"], report["threshold"],
+            report["blocks"], report["largestblock"]["constraints"],
+            report["largestblock"]["variables"]))
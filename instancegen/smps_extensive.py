@@ -0,0 +1,488 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import os
+import shutil
+import tempfile
+import numpy as np
+from .smps_io import openFile, stripCompression
+from .smps_sto import readStoFile, iterateScenarios, VALIDATION_RHS_NAMES,\
+      PROBABILITY_TOLERANCE
+
+# the placeholder of the scenario suffix in the text templates of the second
+# stage. It is replaced by "_<scenario name>" for each scenario, so the text
+# of a scenario is formatted once for all scenarios
+SUFFIX = "\x00"
+
+# the format of the values in the MPS file
+MPS_VALUE = "%.15g"
+
+# the names of the RHS, RANGES and BOUNDS sets of the MPS file
+MPS_RHS    = "RHS"
+MPS_RANGES = "RNG"
+MPS_BOUNDS = "BND"
+
+# the record of an entry of a scenario in a first stage column and a second
+# stage row, which is spooled to a temporary file until the first stage
+# columns are written. The column and row are indices into the first stage
+# columns and the constraints
+LINK_RECORD = np.dtype([("col", np.int32), ("scenario", np.int64),
+   ("row", np.int32), ("value", np.float64)])
+
+# the markers of the integer columns
+MARKER_START = "    MARKER    'MARKER'    'INTORG'\n"
+MARKER_END   = "    MARKER    'MARKER'    'INTEND'\n"
+
+class ExtensiveFormWriter:
+   '''
+   a writer of the extensive form, i.e. the deterministic equivalent, of a
+   two-stage instance as a free MPS file. The first stage rows and columns are
+   written once and the second stage rows and columns are copied for each
+   scenario with the suffix _<scenario name>. The objective coefficients of
+   the second stage are scaled by the probability of the scenario.
+
+   The text of the second stage is formatted once as a template, which is
+   copied for each scenario with the entries of the scenario replaced. The
+   scenarios are streamed from the STO file, so the memory is proportional to
+   the core and a single scenario. The rows of all scenarios are written from
+   the scenario names before the columns, the RHS of the scenarios are
+   spooled to a temporary file, and the first stage columns, which link to
+   the rows of all scenarios, are written as contiguous columns after the
+   scenarios. The entries of the scenarios in the first stage columns are
+   spooled to a second temporary file as LINK_RECORD records.
+
+   Parameters
+   ----------
+   instance : Instance
+      the two-stage instance. The core file must be read by readCorFile, so
+      that the row types, integer variables and bounds are known
+   rhsnames : list of strings. Default VALIDATION_RHS_NAMES
+      the names of the right hand side column of the STO file. The entries of
+      the other columns that are not in the core file are ignored
+   '''
+
+   def __init__(self, instance, rhsnames = VALIDATION_RHS_NAMES):
+      assert len(instance.rowtypes) > 0, "the row types are not known, the "\
+            "core file must be read by readCorFile"
+      stages = instance.stages
+      assert stages.nstages == 2, "the extensive form is written for two-stage "\
+            "instances, the TIM file has %d stages"%stages.nstages
+
+      self.period = stages.names[1]
+      self.objsense = instance.objsense
+      self.objective = next((row for row, rowtype in instance.rowtypes.items()
+         if rowtype == "N"), None)
+
+      # the stage of each constraint and variable. The objective has the stage
+      # -1, the other free rows are not written
+      rowstages = stages.rowstages.tolist()
+      self.rowstage = dict(zip(instance.constraints, rowstages))
+      self.constraints = instance.constraints
+      self.rowindex = {cons: i for i, cons in enumerate(instance.constraints)}
+      self.colstage = dict(zip(instance.variables, stages.colstages.tolist()))
+      if self.objective is not None:
+         self.rowstage[self.objective] = -1
+
+      self.rhsnames = set(rhsnames)
+      self.ignored = 0
+      self.buildRows(instance)
+      self.buildColumns(instance)
+      self.buildRhs(instance)
+      self.buildRangesAndBounds(instance)
+
+   def buildRows(self, instance):
+      '''
+      formats the rows of the first stage and the template of the second stage
+      rows
+      '''
+      firstrows = []
+      if self.objective is not None:
+         firstrows.append(" N  %s\n"%self.objective)
+      secondrows = []
+      for cons in instance.constraints:
+         line = " %s  %s"%(instance.rowtypes[cons], cons)
+         if self.rowstage[cons] == 0:
+            firstrows.append(line + "\n")
+         else:
+            secondrows.append(line + SUFFIX + "\n")
+
+      self.firstrows = "".join(firstrows)
+      self.rowtemplate = "".join(secondrows)
+
+   def buildColumns(self, instance):
+      '''
+      formats the template of the second stage columns and the first stage
+      columns without their entries in the second stage rows
+      '''
+      matrix = instance.getCoefficientMatrix()
+      colptr = matrix.colptr.tolist()
+      rowind = matrix.rowind.tolist()
+      colval = matrix.colval.tolist()
+      rownames = matrix.rownames
+      integers = set(instance.integers)
+
+      # the lines of the second stage template. The prefix of a line is the
+      # text before the value, which is used to replace the value
+      self.collines = []
+      self.colprefixes = []
+      self.colpositions = {}
+      self.lastline = {}
+      self.objlines = []
+      objvalues = []
+
+      # the first stage columns are held as the lines in the first stage rows,
+      # the objective coefficient, and the template of the lines in the second
+      # stage rows
+      self.firstcols = []
+      self.firstindex = {}
+      self.coreobj = {}
+      self.firstlines = {}
+      self.linktemplates = {}
+      self.linkpositions = {}
+
+      integer = False
+      for j, var in enumerate(matrix.colnames):
+         stage = self.colstage.get(var)
+         if stage is None:
+            continue
+
+         entries = [(rownames[rowind[k]], colval[k])
+               for k in range(colptr[j], colptr[j + 1])]
+         entries = [(row, value) for row, value in entries
+               if self.rowstage.get(row) is not None]
+
+         if stage == 0:
+            self.firstindex[var] = len(self.firstcols)
+            self.firstcols.append(var)
+            self.coreobj[var] = 0.0
+            self.firstlines[var] = []
+            linklines = []
+            for row, value in entries:
+               if row == self.objective:
+                  self.coreobj[var] = value
+               elif self.rowstage[row] == 0:
+                  self.firstlines[var].append("    %s    %s    %s\n"%(var, row,
+                     MPS_VALUE%value))
+               else:
+                  self.linkpositions[var, row] = len(linklines)
+                  linklines.append("    %s    %s%s    %s\n"%(var, row, SUFFIX,
+                     MPS_VALUE%value))
+            self.linktemplates[var] = linklines
+            continue
+
+         if (var in integers) != integer:
+            integer = not integer
+            self.collines.append(MARKER_START if integer else MARKER_END)
+            self.colprefixes.append(None)
+
+         # a column without entries is written with a zero objective, so
+         # that it is part of the model
+         if not entries and self.objective is not None:
+            entries = [(self.objective, 0.0)]
+         for row, value in entries:
+            rowsuffix = SUFFIX if self.rowstage[row] > 0 else ""
+            prefix = "    %s%s    %s%s    "%(var, SUFFIX, row, rowsuffix)
+            self.colpositions[var, row] = len(self.collines)
+            if row == self.objective:
+               self.objlines.append(len(self.collines))
+               objvalues.append(value)
+            self.colprefixes.append(prefix)
+            self.collines.append(prefix + MPS_VALUE%value + "\n")
+         self.lastline[var] = len(self.collines) - 1
+
+      if integer:
+         self.collines.append(MARKER_END)
+         self.colprefixes.append(None)
+
+      self.objvalues = np.array(objvalues, dtype = np.float64)
+      self.objindex = {line: i for i, line in enumerate(self.objlines)}
+      self.integers = integers
+
+   def buildRhs(self, instance):
+      '''
+      formats the RHS of the first stage and the template of the second stage
+      RHS
+      '''
+      firstrhs = []
+      self.rhslines = []
+      self.rhspositions = {}
+      for cons, value in instance.rhs.items():
+         stage = self.rowstage.get(cons)
+         if stage is None:
+            continue
+         elif stage <= 0:
+            firstrhs.append("    %s    %s    %s\n"%(MPS_RHS, cons,
+               MPS_VALUE%value))
+         else:
+            self.rhspositions[cons] = len(self.rhslines)
+            self.rhslines.append(self.rhsLine(cons, value))
+
+      self.firstrhs = "".join(firstrhs)
+
+   def rhsLine(self, cons, value):
+      '''
+      returns the RHS line of a second stage constraint
+      '''
+      return "    %s    %s%s    %s\n"%(MPS_RHS, cons, SUFFIX, MPS_VALUE%value)
+
+   def buildRangesAndBounds(self, instance):
+      '''
+      formats the ranges and bounds of the first stage and the templates of
+      the second stage ranges and bounds
+      '''
+      firstranges = []
+      secondranges = []
+      for cons, value in instance.ranges.items():
+         stage = self.rowstage.get(cons)
+         if stage is None or stage < 0:
+            continue
+
+         line = "    %s    %s%s    %s\n"%(MPS_RANGES, cons,
+               SUFFIX if stage > 0 else "", MPS_VALUE%value)
+         (secondranges if stage > 0 else firstranges).append(line)
+
+      firstbounds = []
+      secondbounds = []
+      for boundtype, var, value in instance.bounds:
+         stage = self.colstage.get(var)
+         if stage is None:
+            continue
+
+         line = " %s %s %s%s"%(boundtype, MPS_BOUNDS, var,
+               SUFFIX if stage > 0 else "")
+         if value is not None:
+            line += " %s"%(MPS_VALUE%value)
+         (secondbounds if stage > 0 else firstbounds).append(line + "\n")
+
+      self.firstranges = "".join(firstranges)
+      self.rangetemplate = "".join(secondranges)
+      self.firstbounds = "".join(firstbounds)
+      self.boundtemplate = "".join(secondbounds)
+
+   def scenarioText(self, index, probability, overrides):
+      '''
+      returns the text of the second stage columns and RHS of a scenario, with
+      the suffix placeholder, and spools the entries of the scenario in the
+      first stage columns to the link spool
+
+      Parameters
+      ----------
+      index : int
+         the index of the scenario
+      probability : float
+         the probability of the scenario
+      overrides : dict
+         the values of the scenario keyed by (column, row)
+      '''
+      collines = self.collines[:]
+      objvalues = self.objvalues.copy()
+      rhslines = self.rhslines[:]
+      links = []
+      for (col, row), value in overrides.items():
+         colstage = self.colstage.get(col)
+         rowstage = self.rowstage.get(row)
+         if rowstage is None or rowstage == 0:
+            # the first stage rows are the same in all scenarios
+            self.ignored += 1
+         elif colstage is None:
+            # an entry of the RHS set. The other columns are not in the core
+            if rowstage < 0 or col not in self.rhsnames:
+               self.ignored += 1
+            elif row in self.rhspositions:
+               rhslines[self.rhspositions[row]] = self.rhsLine(row, value)
+            else:
+               rhslines.append(self.rhsLine(row, value))
+         elif colstage == 0 and rowstage < 0:
+            # the objective of the first stage is the expected objective
+            self.firstobj[col] += probability*(value - self.coreobj[col])
+         elif colstage == 0:
+            links.append((self.firstindex[col], index, self.rowindex[row],
+               value))
+         else:
+            position = self.colpositions.get((col, row))
+            if position is None:
+               # a nonzero that is not in the core is added to the column
+               if rowstage < 0:
+                  value *= probability
+               collines[self.lastline[col]] += "    %s%s    %s%s    %s\n"%(col,
+                     SUFFIX, row, SUFFIX if rowstage > 0 else "", MPS_VALUE%value)
+            elif position in self.objindex:
+               objvalues[self.objindex[position]] = value
+            else:
+               collines[position] = self.colprefixes[position] + MPS_VALUE%value + "\n"
+
+      if links:
+         self.linkspool.write(np.array(links, dtype = LINK_RECORD).tobytes())
+
+      objvalues *= probability
+      prefixes = self.colprefixes
+      for position, value in zip(self.objlines, objvalues.tolist()):
+         collines[position] = prefixes[position] + MPS_VALUE%value + "\n"
+
+      return "".join(collines), "".join(rhslines)
+
+   def firstColumns(self, suffixes):
+      '''
+      a generator of the text of the first stage columns. Each column holds
+      its entries in the second stage rows of all scenarios. The spooled
+      entries of the scenarios are mapped and ordered by column, so only the
+      order and the entries of a single column are held in memory.
+      '''
+      self.linkspool.flush()
+      nlinks = self.linkspool.tell()//LINK_RECORD.itemsize
+      if nlinks > 0:
+         links = np.memmap(self.linkspool, dtype = LINK_RECORD, mode = "r",
+               shape = (nlinks,))
+         order = np.argsort(links["col"], kind = "stable")
+      else:
+         links = np.empty(0, dtype = LINK_RECORD)
+         order = np.empty(0, dtype = np.int64)
+      ends = np.cumsum(np.bincount(links["col"],
+         minlength = len(self.firstcols))).tolist()
+
+      integer = False
+      start = 0
+      for j, var in enumerate(self.firstcols):
+         if (var in self.integers) != integer:
+            integer = not integer
+            yield MARKER_START if integer else MARKER_END
+
+         lines = self.firstlines[var]
+         if self.firstobj[var] != 0.0 or not lines:
+            lines = ["    %s    %s    %s\n"%(var, self.objective,
+               MPS_VALUE%self.firstobj[var])] + lines
+         yield "".join(lines)
+
+         # the entries of the column in the order of the scenarios
+         records = links[order[start:ends[j]]]
+         start = ends[j]
+         scenarios = records["scenario"].tolist()
+         rows = records["row"].tolist()
+         values = records["value"].tolist()
+
+         template = "".join(self.linktemplates[var])
+         k = 0
+         for index, suffix in enumerate(suffixes):
+            if k == len(scenarios) or scenarios[k] != index:
+               yield template.replace(SUFFIX, suffix)
+               continue
+
+            linklines = self.linktemplates[var][:]
+            while k < len(scenarios) and scenarios[k] == index:
+               row = self.constraints[rows[k]]
+               line = "    %s    %s%s    %s\n"%(var, row, SUFFIX,
+                     MPS_VALUE%values[k])
+               position = self.linkpositions.get((var, row))
+               if position is None:
+                  linklines.append(line)
+               else:
+                  linklines[position] = line
+               k += 1
+            yield "".join(linklines).replace(SUFFIX, suffix)
+
+      if integer:
+         yield MARKER_END
+
+   def write(self, mpsfile, stofile):
+      '''
+      writes the extensive form for the scenarios of an STO file
+
+      Parameters
+      ----------
+      mpsfile : string
+         the name of the MPS file, which may have a compression extension
+      stofile : string
+         the name of the STO file
+
+      Returns
+      -------
+      int
+         the number of scenarios
+      '''
+      # the scenario names and parents are read first, so that the rows of
+      # all scenarios are written before the columns. A scenario inherits the
+      # values of its parent, which is held until its last child is written.
+      store = readStoFile(stofile, loadentries = False)
+      nscenarios = len(store)
+      assert all(store.periodnames[period] == self.period
+            for period in set(store.periods.tolist())), \
+            "the scenarios must branch in the second stage %s"%self.period
+      suffixes = ["_" + name for name in store.names]
+
+      # the probabilities are written with six significant digits, so only a
+      # sum within the tolerance is rescaled to one
+      total = store.probabilities.sum()
+      assert abs(total - 1.0) <= PROBABILITY_TOLERANCE, \
+            "the scenario probabilities sum to %g instead of 1"%total
+      probabilities = store.probabilities/total
+      parents = store.parents.tolist()
+      nchildren = np.bincount(store.parents[store.parents >= 0],
+            minlength = nscenarios).tolist()
+      inherited = {}
+
+      self.firstobj = dict(self.coreobj)
+      self.ignored = 0
+
+      name = os.path.splitext(os.path.basename(stripCompression(mpsfile)))[0]
+      spooldir = os.path.dirname(os.path.abspath(mpsfile))
+      with openFile(mpsfile, "w") as outfile, \
+            tempfile.TemporaryFile("w+", dir = spooldir) as rhsspool, \
+            tempfile.TemporaryFile("w+b", dir = spooldir) as linkspool:
+         self.linkspool = linkspool
+         outfile.write("NAME          %s\n"%name)
+         if self.objsense is not None:
+            outfile.write("OBJSENSE\n    %s\n"%self.objsense)
+
+         outfile.write("ROWS\n")
+         outfile.write(self.firstrows)
+         for suffix in suffixes:
+            outfile.write(self.rowtemplate.replace(SUFFIX, suffix))
+
+         outfile.write("COLUMNS\n")
+         for index, scenario in enumerate(iterateScenarios(stofile)):
+            assert scenario[0] == store.names[index]
+            parent = parents[index]
+            overrides = dict(inherited[parent]) if parent >= 0 else {}
+            overrides.update(zip(zip(scenario[4], scenario[5]), scenario[6]))
+            if nchildren[index] > 0:
+               inherited[index] = overrides
+            if parent >= 0:
+               nchildren[parent] -= 1
+               if nchildren[parent] == 0:
+                  del inherited[parent]
+
+            columns, rhs = self.scenarioText(index, probabilities[index],
+                  overrides)
+            outfile.write(columns.replace(SUFFIX, suffixes[index]))
+            rhsspool.write(rhs.replace(SUFFIX, suffixes[index]))
+
+         for text in self.firstColumns(suffixes):
+            outfile.write(text)
+
+         outfile.write("RHS\n")
+         outfile.write(self.firstrhs)
+         rhsspool.seek(0)
+         shutil.copyfileobj(rhsspool, outfile)
+
+         if self.firstranges or self.rangetemplate:
+            outfile.write("RANGES\n")
+            outfile.write(self.firstranges)
+            for suffix in suffixes:
+               outfile.write(self.rangetemplate.replace(SUFFIX, suffix))
+
+         if self.firstbounds or self.boundtemplate:
+            outfile.write("BOUNDS\n")
+            outfile.write(self.firstbounds)
+            for suffix in suffixes:
+               outfile.write(self.boundtemplate.replace(SUFFIX, suffix))
+
+         outfile.write("ENDATA\n")
+
+      if self.ignored > 0:
+         print("   WARNING: %d scenario entries of the first stage rows or of "\
+               "rows or columns that are not in the core file were ignored"\
+               %self.ignored)
+
+      return nscenarios
@@ -3,48 +3,158 @@ The MIT License (MIT)
 
 @author: Stephen J. Maher
 """
+import os
+import contextlib
 import numpy as np
+from .smps_coeffs import CoefficientMatrix
+from .smps_parser import parseCorFile, CorParser
+from .smps_cache import readCoreCache, writeCoreCache
+from .smps_sampling import sampleScenarios, makeSampler, SAMPLING_MC, \
+      SAMPLING_LHS
+from .smps_stages import StageIndex
+from .smps_parallel import writeParallelScenarios
+from .smps_sto import StoWriter, SCENARIO_HEADER, readStoFile, MappedStoFile, \
+      copyScenarios, mergeDuplicateScenarios, fixedProbabilityHeader, \
+      reopenStoFile
+from .smps_pipeline import ScenarioBlock, applyTransforms, writeScenarioBlocks, \
+      Delta
+from .smps_profile import profiler
+from .smps_io import openFile, smpsFileName, compression
+from .smps_reduction import reduceScenarios, coreValues, REDUCTION_FORWARD
+from .smps_extensive import ExtensiveFormWriter
+from .smps_tree import ScenarioTree, entryStages, treeScenarioBlocks, \
+      CoreFill
+from .smps_resume import getRandomState, setRandomState, writeResumeState, \
+      readResumeState
 
 STOCH_RHS   = "rhs"
 STOCH_COEF  = "coef"
 STOCH_OBJ   = "obj"
 STOCH_TYPES = [STOCH_RHS, STOCH_COEF, STOCH_OBJ]
 
+# the function that writes the scenarios of each stochasticity type if the
+# stochastic entries are not declared
+STOCH_WRITE_FUNCTIONS = {STOCH_RHS: "writeRhsStochasticFile",
+      STOCH_COEF: "writeCoefStochasticFile",
+      STOCH_OBJ: "writeObjStochasticFile"}
+
 RHS     = "RHS"
 ROWS    = "ROWS"
 COLUMNS = "COLUMNS"
 PERIODS = "PERIODS"
 
 class Instance:
-   def __init__(self, corfile = None, timfile = None, stofile = None):
+   # the format of the scenario header line. The arguments are the scenario
+   # name, the parent scenario, the probability and the period
+   scenarioheader = SCENARIO_HEADER
+
+   def __init__(self, corfile = None, timfile = None, stofile = None,
+         compact = False):
       self.corfile = corfile
       self.timfile = timfile
       self.stofile = stofile;
+      self.compact = compact
       self.constraints = []
       self.variables = []
-      self.coeffs = {}
+      self.coeffs = CoefficientMatrix() if compact else {}
       self.rhs = {}
       self.periods = []
 
-   def readInstance(self, readCor = False, readTim = False, readSto = False):
+      # the row types, integer variables, bounds, ranges and objective sense
+      # of the core file. These are only stored by readCorFile
+      self.rowtypes = {}
+      self.integers = []
+      self.bounds = []
+      self.ranges = {}
+      self.objsense = None
+
+      # the ScenarioStore of the STO file
+      self.scenarios = None
+
+      # the sparse matrix built from the coefficient dictionary, and whether
+      # the dictionary has been written since the matrix was built
+      self._coefmatrix = None
+      self._coefdirty = False
+
+      # the partition of the constraints and variables into stages
+      self._stages = None
+
+   def readInstance(self, readCor = False, readTim = False, readSto = False,
+         cache = False):
       '''
-      reads the specified files for the instance in SMPS format
+      reads the specified files for the instance in SMPS format. If cache is
+      True, then the core file is read from its binary cache.
       '''
-      if readCor:
-         self.readCorFile()
+      with profiler.phase("readInstance"):
+         if readCor:
+            self.readCorFile(cache)
 
-      if readTim:
-         self.readTimFile()
+         if readTim:
+            self.readTimFile()
 
-      if readSto:
-         self.readStoFile()
+         if readSto:
+            self.readStoFile()
+
+   def readCorFile(self, cache = False):
+      '''
+      reads a COR file for an SMPS instance. The file is read in large blocks
+      by the CorParser.
+
+      If cache is True, then the parsed core is loaded from the binary cache
+      file next to the core file. If the cache does not exist or is stale,
+      then the core file is parsed and the cache is written.
+
+      If a derived class overrides storeConstraints, storeVariables or
+      storeConsRhs, then the file is read by readCorFileByLine, so that the
+      overridden functions are called for each line, and the cache is not used.
+      '''
+      assert self.corfile is not None
+      self._coefmatrix = None
+      self._stages = None
+      with profiler.phase("readCorFile"):
+         if self.overridesStoreFunctions():
+            if cache:
+               print("The store functions are overridden, so the core file is "\
+                     "read line by line without the cache")
+            self.readCorFileByLine()
+         elif cache and readCoreCache(self):
+            profiler.count("corcachehits")
+         else:
+            parser = CorParser(self.compact)
+            self.constraints, self.variables, self.rhs, self.coeffs = \
+                  parseCorFile(self.corfile, self.compact, parser)
+            self.rowtypes = parser.rowtypes
+            self.integers = parser.integers
+            self.bounds = parser.bounds
+            self.ranges = parser.ranges
+            self.objsense = parser.objsense
+
+            if cache:
+               writeCoreCache(self)
+
+      if profiler.enabled:
+         profiler.count("constraints", len(self.constraints))
+         profiler.count("variables", len(self.variables))
+         profiler.count("nonzeros", len(self.coeffs))
+
+   def overridesStoreFunctions(self):
+      '''
+      returns whether a derived class overrides a function that stores the
+      lines of the core file
+      '''
+      return any(getattr(type(self), name) is not getattr(Instance, name)
+            for name in ["storeConstraints", "storeVariables", "storeConsRhs"])
 
-   def readCorFile(self):
+   def readCorFileByLine(self):
       '''
-      reads a COR file for an SMPS instance
+      reads a COR file for an SMPS instance line by line. Each line is stored
+      by storeConstraints, storeVariables or storeConsRhs, which can be
+      overridden by derived classes.
       '''
       assert self.corfile is not None
-      with open(self.corfile, "r") as infile:
+      self._coefmatrix = None
+      self._stages = None
+      with openFile(self.corfile, "r") as infile:
          while True:
             line = infile.readline()
             if not line: break
@@ -75,7 +185,8 @@ class Instance:
       reads a TIM file for an SMPS instance
       '''
       assert self.timfile is not None
-      with open(self.timfile, "r") as infile:
+      self._stages = None
+      with profiler.phase("readTimFile"), openFile(self.timfile, "r") as infile:
          while True:
             line = infile.readline()
             if not line: break
@@ -93,18 +204,53 @@ class Instance:
                if section == PERIODS:
                   self.storePeriods(line)
 
-   def readStoFile(self):
+      profiler.count("periods", len(self.periods))
+
+   def readStoFile(self, loadentries = True):
       '''
-      reads a STO file for an SMPS instance
+      reads a STO file for an SMPS instance into a ScenarioStore. If loadentries
+      is False, then only the scenario headers and the byte offset of each
+      scenario are stored, and the scenarios are read from the file on demand.
       '''
-      pass
+      assert self.stofile is not None
+      with profiler.phase("readStoFile"):
+         self.scenarios = readStoFile(self.stofile, loadentries)
+
+   def reduceScenarios(self, nscenarios, method = REDUCTION_FORWARD, **options):
+      '''
+      returns a ScenarioStore with nscenarios representative scenarios of the
+      scenarios that were read by readStoFile. If the core file was read, then
+      an entry that is missing from a scenario takes its core value.
+
+      Parameters
+      ----------
+      nscenarios : int
+         the number of representative scenarios
+      method : string. Default REDUCTION_FORWARD
+         the reduction method, REDUCTION_FORWARD or REDUCTION_KMEANS
+      options : dict
+         the options of the reduction method, see reduceScenarios
+      '''
+      assert self.scenarios is not None
+      defaults = coreValues(self) if len(self.variables) > 0 else None
+
+      return reduceScenarios(self.scenarios, nscenarios, method, defaults,
+            **options)
+
+   def mapStoFile(self):
+      '''
+      returns a MappedStoFile for the STO file. The scenarios are parsed from
+      the memory-mapped file only when they are accessed.
+      '''
+      assert self.stofile is not None
+      return MappedStoFile(self.stofile)
 
    def writeTimFile(self):
       '''
       writes the TIM file of the SMPS format
       '''
       assert self.timfile is not None
-      with open(self.timfile, 'w') as outfile:
+      with profiler.phase("writeTimFile"), openFile(self.timfile, 'w') as outfile:
          outfile.write("TIME\n")
          outfile.write("PERIODS   LP\n")
 
@@ -112,20 +258,118 @@ class Instance:
 
          outfile.write("ENDATA")
 
-   def writeStoFile(self, nscenarios, stochtype = STOCH_RHS):
+      # the bytes on disk, i.e. after the compression
+      if profiler.enabled:
+         profiler.count("timbytes", os.path.getsize(self.timfile))
+
+   def writeStoFile(self, nscenarios, stochtype = STOCH_RHS, nworkers = None,
+         transforms = None, delta = False, scheme = SAMPLING_MC, seed = 0,
+         resumable = False, overlapped = False, dedup = False):
       '''
-      writes an STO file
+      writes an STO file. If the stochastic entries are declared, then the
+      scenarios are streamed block by block from the sampler through the
+      transforms to the writer, so the memory does not depend on the number
+      of scenarios. If a derived class overrides the write function of the
+      stochasticity type, e.g. writeRhsStochasticFile, then the scenarios are
+      written by that function, even if the entries are declared.
+
+      Parameters
+      ----------
+      nscenarios : int
+         the number of scenarios
+      stochtype : string. Default STOCH_RHS
+         the stochasticity type
+      nworkers : int. Default None
+         if None, then the scenarios are generated serially from the global
+         random number generator. Otherwise, the scenarios are generated in
+         blocks over nworkers processes, each block with its own generator
+         spawned from SeedSequence(nscenarios). The output is then identical
+         for any number of workers.
+      transforms : list of functions. Default None
+         the transform stages, e.g. Scale, Clip or Round, that are applied to
+         each ScenarioBlock before it is written
+      delta : bool. Default False
+         if True, then only the entries that differ from their value in the
+         core file are written and the compression ratio is printed
+      scheme : string. Default SAMPLING_MC
+         the sampling scheme. SAMPLING_MC draws the values from the random
+         number generators described for nworkers. The other schemes, i.e.
+         SAMPLING_CRN, SAMPLING_ANTITHETIC, SAMPLING_LHS and SAMPLING_SOBOL,
+         transform uniform values by the inverse distribution functions. Their
+         values only depend on the seed and the scenario index, so the output
+         does not depend on nworkers.
+      seed : int. Default 0
+         the seed of the sampling schemes other than SAMPLING_MC. A fixed
+         seed makes the smaller scenario sets of SAMPLING_CRN, SAMPLING_ANTITHETIC
+         and SAMPLING_SOBOL the first scenarios of the larger sets.
+      resumable : bool. Default False
+         if True, then the state of the random number generators is written
+         to a resume file next to the STO file, so that the file can be
+         extended by appendStoFile
+      overlapped : bool. Default False
+         if True, then the scenarios are written, compressed and synced to the
+         disk by a writer thread while the next scenarios are generated, see
+         OverlappedFile
+      dedup : bool. Default False
+         if True, then the identical scenarios are merged after the file is
+         written, see mergeDuplicateScenarios. A merged file can not be
+         appended, so dedup and resumable are exclusive
       '''
       assert self.stofile is not None
       assert stochtype in STOCH_TYPES
-
+      assert not (dedup and resumable), "an STO file with merged scenarios "\
+            "can not be appended"
+
+      # a derived class that overrides the write function of the type writes
+      # the scenarios itself, so the declared entries are not sampled
+      if self.overridesStoWriteFunction(stochtype):
+         print("The scenarios are written by the overridden %s, so the "\
+               "workers, transforms, sampling scheme, delta encoding and resume "\
+               "file are not used"%STOCH_WRITE_FUNCTIONS[stochtype])
+         entries = None
+         nworkers = None
+         transforms = None
+         delta = False
+         scheme = SAMPLING_MC
+         resumable = False
+      else:
+         with profiler.phase("getStochasticEntries"):
+            entries = self.getStochasticEntries(stochtype)
+      if entries is None and (nworkers is not None or transforms):
+         print("The stochastic entries are not declared, so the scenarios are "\
+               "generated serially without transforms")
+
+      sampler = None
+      if scheme != SAMPLING_MC and entries is not None:
+         sampler = makeSampler(scheme, entries, nscenarios, seed)
+      elif scheme != SAMPLING_MC:
+         print("The stochastic entries are not declared, so the scenarios are "\
+               "sampled from np.random")
+
+      transforms, deltastage = self.addDeltaTransform(entries, transforms,
+            delta)
+
+      # the probabilities of a resumable file are written in fixed width
+      # fields, so that appendStoFile replaces them in place
+      fixedprobability = resumable and entries is not None and \
+            fixedProbabilityHeader(self.scenarioheader) is not None
+
+      nblocks = 0
       np.random.seed(nscenarios)
-      with open(self.stofile, 'w') as outfile:
+      with profiler.phase("writeStoFile"), \
+            self.fixedProbabilities(fixedprobability), \
+            openFile(self.stofile, 'w', overlapped = overlapped) as outfile:
          # writing the header of the STO file
          outfile.write("STOCH\n")
          outfile.write("SCENARIOS     DISCRETE\n")
 
-         if stochtype == STOCH_RHS:
+         if entries is not None and nworkers is not None:
+            nblocks = writeParallelScenarios(self, outfile, nscenarios,
+                  stochtype, nworkers, nscenarios, transforms, sampler)
+         elif entries is not None:
+            self.writeSampledScenarios(outfile, nscenarios, entries,
+                  transforms = transforms, sampler = sampler)
+         elif stochtype == STOCH_RHS:
             self.writeRhsStochasticFile(outfile, nscenarios)
          elif stochtype == STOCH_COEF:
             self.writeCoefStochasticFile(outfile, nscenarios)
@@ -134,16 +378,376 @@ class Instance:
 
          outfile.write("ENDATA")
 
+      if profiler.enabled:
+         profiler.count("stobytes", os.path.getsize(self.stofile))
+
+      if deltastage is not None:
+         print("Delta encoding wrote %d of %d entries (compression ratio %.2f)"\
+               %(deltastage.nwritten, deltastage.nvalues, deltastage.ratio))
+
+      if dedup:
+         self.mergeDuplicateScenarios()
+
+      if resumable and entries is None:
+         print("The stochastic entries are not declared, so the STO file can "\
+               "not be appended")
+      elif resumable:
+         # the serial Monte Carlo scenarios continue from the global generator,
+         # the parallel scenarios with the generators of the following blocks.
+         # The other schemes only depend on the seed and the scenario index.
+         parallel = scheme == SAMPLING_MC and nworkers is not None
+         writeResumeState(self.stofile, {"stochtype": stochtype,
+            "scheme": scheme, "seed": seed, "delta": delta,
+            "nscenarios": nscenarios,
+            "randomstate": getRandomState() if scheme == SAMPLING_MC and
+               not parallel else None,
+            "blockseed": nscenarios if parallel else None,
+            "nextblock": nblocks, "fixedprobability": fixedprobability})
+
+   @contextlib.contextmanager
+   def fixedProbabilities(self, fixed = True):
+      '''
+      a context in which the scenario header lines are written with the
+      probability in a fixed width field, see fixedProbabilityHeader. The
+      header is that of the instance again when the context is left.
+
+      Parameters
+      ----------
+      fixed : bool. Default True
+         if False, then the header is not changed
+      '''
+      scenarioheader = self.scenarioheader
+      if fixed:
+         self.scenarioheader = fixedProbabilityHeader(scenarioheader)
+      try:
+         yield
+      finally:
+         if fixed:
+            self.scenarioheader = scenarioheader
+
+   def overridesStoWriteFunction(self, stochtype):
+      '''
+      returns whether a derived class overrides the function that writes the
+      scenarios of the stochasticity type, e.g. writeRhsStochasticFile
+      '''
+      name = STOCH_WRITE_FUNCTIONS[stochtype]
+      return getattr(type(self), name) is not getattr(Instance, name)
+
+   def appendStoFile(self, nscenarios, stofile = None, nworkers = None,
+         transforms = None, overlapped = False):
+      '''
+      extends an STO file that was written with resumable=True to nscenarios
+      scenarios. Only the probability of the header lines of the existing
+      scenarios is replaced, so their entries are unchanged. Only the new
+      scenarios are generated, continuing from the state in the resume file.
+      The STO file and its resume file are then written to the stofile of the
+      instance.
+
+      An uncompressed file that is appended in place has its probabilities in
+      fixed width fields, so they are replaced in the file and the new
+      scenarios are appended, see reopenStoFile. A compressed file, a file
+      that is written to another stofile or a file without fixed width
+      probabilities is copied with the probabilities replaced.
+
+      The stochasticity type, the sampling scheme, the seed and the delta
+      encoding are taken from the resume file. The transforms are not stored,
+      so the transforms of the original file must be given again.
+
+      Parameters
+      ----------
+      nscenarios : int
+         the total number of scenarios after appending
+      stofile : string. Default None
+         the STO file that is appended. If None, then the stofile of the
+         instance is appended in place
+      nworkers : int. Default None
+         the number of worker processes for the scenarios that were generated
+         in parallel or by a scheme other than SAMPLING_MC. The serial Monte
+         Carlo scenarios are always continued serially.
+      transforms : list of functions. Default None
+         the transform stages that were applied to the original file
+      overlapped : bool. Default False
+         if True, then the scenarios are written, compressed and synced to the
+         disk by a writer thread while the next scenarios are generated, see
+         OverlappedFile
+      '''
+      assert self.stofile is not None
+      if stofile is None:
+         stofile = self.stofile
+
+      state = readResumeState(stofile)
+      first = state["nscenarios"]
+      stochtype = state["stochtype"]
+      scheme = state["scheme"]
+      assert nscenarios > first, "the STO file %s already has %d scenarios"\
+            %(stofile, first)
+      assert scheme != SAMPLING_LHS, "the Latin hypercube strata depend on the "\
+            "number of scenarios, so the STO file %s can not be appended"%stofile
+
+      with profiler.phase("getStochasticEntries"):
+         entries = self.getStochasticEntries(stochtype)
+      assert entries is not None
+
+      sampler = None
+      if scheme != SAMPLING_MC:
+         sampler = makeSampler(scheme, entries, nscenarios, state["seed"])
+
+      transforms, deltastage = self.addDeltaTransform(entries, transforms,
+            state["delta"])
+
+      # a file with fixed width probabilities is appended in place, only its
+      # probabilities are replaced. Otherwise, the file is copied next to the
+      # target and renamed, so that a file that is appended in place is not
+      # overwritten while it is copied
+      fixedprobability = state.get("fixedprobability", False)
+      inplace = fixedprobability and compression(stofile) is None and \
+            os.path.abspath(stofile) == os.path.abspath(self.stofile)
+      directory, filename = os.path.split(self.stofile)
+      tmpfile = os.path.join(directory, "~" + filename)
+      nblocks = 0
+      with profiler.phase("appendStoFile"), \
+            self.fixedProbabilities(fixedprobability):
+         if inplace:
+            copied = reopenStoFile(stofile, 1.0/float(nscenarios))
+            outfile = openFile(stofile, "a", overlapped = overlapped)
+         else:
+            outfile = openFile(tmpfile, "w", overlapped = overlapped)
+            with openFile(stofile, "r") as infile:
+               copied = copyScenarios(infile, outfile, 1.0/float(nscenarios),
+                     self.scenarioheader)
+         assert copied == first, "the STO file %s has %d scenarios, but "\
+               "its resume file has %d"%(stofile, copied, first)
+
+         with outfile:
+            if state["randomstate"] is not None:
+               if nworkers is not None:
+                  print("The scenarios were generated from the global random "\
+                        "number generator, so they are appended serially")
+               setRandomState(state["randomstate"])
+               self.writeSampledScenarios(outfile, nscenarios, entries,
+                     first = first, transforms = transforms)
+            elif state["blockseed"] is not None or nworkers is not None:
+               nblocks = writeParallelScenarios(self, outfile, nscenarios,
+                     stochtype, nworkers or 1, state["blockseed"] or 0,
+                     transforms, sampler, first, state["nextblock"])
+            else:
+               self.writeSampledScenarios(outfile, nscenarios, entries,
+                     first = first, transforms = transforms, sampler = sampler)
+
+            outfile.write("ENDATA")
+
+         if not inplace:
+            os.replace(tmpfile, self.stofile)
+
+      if profiler.enabled:
+         profiler.count("stobytes", os.path.getsize(self.stofile))
+
+      if deltastage is not None:
+         print("Delta encoding wrote %d of %d entries (compression ratio %.2f)"\
+               %(deltastage.nwritten, deltastage.nvalues, deltastage.ratio))
+
+      writeResumeState(self.stofile, dict(state, nscenarios = nscenarios,
+         randomstate = getRandomState() if state["randomstate"] is not None
+            else None,
+         nextblock = state["nextblock"] + nblocks))
+
+   def mergeDuplicateScenarios(self):
+      '''
+      merges the identical scenarios of the STO file into one scenario with
+      the sum of their probabilities and prints how much smaller the file is.
+      The merged file is written next to the STO file and renamed.
+
+      Returns
+      -------
+      int
+         the number of scenarios of the merged file, or None if the STO file
+         is a scenario tree and was not merged
+      '''
+      assert self.stofile is not None
+      directory, filename = os.path.split(self.stofile)
+      tmpfile = os.path.join(directory, "~" + filename)
+      stobytes = os.path.getsize(self.stofile)
+      with profiler.phase("mergeDuplicateScenarios"):
+         counts = mergeDuplicateScenarios(self.stofile, tmpfile,
+               self.scenarioheader)
+         if counts is None:
+            print("   WARNING: the STO file %s is a scenario tree, so its "\
+                  "scenarios are not merged"%self.stofile)
+            return None
+
+         nscenarios, nmerged = counts
+         if nmerged == nscenarios:
+            print("The STO file %s has no duplicate scenarios"%self.stofile)
+            return nmerged
+
+         os.replace(tmpfile, self.stofile)
+
+      mergedbytes = os.path.getsize(self.stofile)
+      print("Merged %d duplicate scenarios: %d of %d scenarios written, the "\
+            "file is %.1f%% smaller (%d of %d bytes)"%(nscenarios - nmerged,
+               nmerged, nscenarios, 100.0*(1.0 - mergedbytes/max(stobytes, 1)),
+               mergedbytes, stobytes))
+
+      return nmerged
+
+   def writeScenarioTree(self, branching, stochtype = STOCH_RHS,
+         transforms = None, delta = False, scheme = SAMPLING_MC, seed = 0,
+         overlapped = False):
+      '''
+      writes an STO file with a scenario tree over all stages of the TIM file.
+      Each scenario is a leaf of the tree. A scenario branches from the first
+      scenario that shares its path up to the stage before it branches, so
+      the entries of a tree node are only written with the first scenario
+      below the node. The entries are assigned to the stages of their rows
+      and columns, see entryStages. A scenario with a parent inherits the
+      entries that it does not list, so the entries that are not sampled or
+      removed by the transforms are written with their core value, see
+      CoreFill.
+
+      Parameters
+      ----------
+      branching : list of int or ScenarioTree
+         the number of children of each node of the stages before the last,
+         or the scenario tree
+      stochtype : string. Default STOCH_RHS
+         the stochasticity type
+      transforms : list of functions. Default None
+         the transform stages that are applied to each ScenarioBlock
+      delta : bool. Default False
+         if True, then only the entries that differ from their value in the
+         core file are written
+      scheme : string. Default SAMPLING_MC
+         the sampling scheme. SAMPLING_MC draws the values from np.random
+         seeded with the number of scenarios, the other schemes index their
+         samplers by the node of each stage
+      seed : int. Default 0
+         the seed of the sampling schemes other than SAMPLING_MC
+      overlapped : bool. Default False
+         if True, then the scenarios are written, compressed and synced to the
+         disk by a writer thread while the next scenarios are generated, see
+         OverlappedFile
+      '''
+      assert self.stofile is not None
+      assert stochtype in STOCH_TYPES
+
+      tree = branching
+      if not isinstance(tree, ScenarioTree):
+         tree = ScenarioTree.fromBranching(branching)
+      assert tree.nstages == self.stages.nstages, "the scenario tree has %d "\
+            "stages, but the TIM file has %d"%(tree.nstages, self.stages.nstages)
+
+      with profiler.phase("getStochasticEntries"):
+         entries = self.getStochasticEntries(stochtype)
+      assert entries is not None, "the stochastic entries are not declared"
+
+      transforms, deltastage = self.addDeltaTransform(entries, transforms,
+            delta)
+      entrystages = entryStages(entries, self.stages)
+      transforms = list(transforms or []) + [CoreFill(
+         coreValues(self)(entries.columns, entries.rows), entrystages,
+         self.stages.names)]
+
+      np.random.seed(tree.nleaves)
+      with profiler.phase("writeStoFile"), openFile(self.stofile, 'w',
+            overlapped = overlapped) as outfile:
+         writer = StoWriter(outfile, self.scenarioheader)
+         writer.writeHeader()
+         blocks = treeScenarioBlocks(tree, entries, entrystages,
+               self.stages.names, scheme = scheme, seed = seed)
+         writeScenarioBlocks(applyTransforms(blocks, transforms), writer)
+         writer.writeEnd()
+
+      profiler.count("scenarios", writer.nscenarios)
+      profiler.count("entries", writer.nentries)
+      if profiler.enabled:
+         profiler.count("stobytes", os.path.getsize(self.stofile))
+
+      # CoreFill runs after Delta and writes the core values of the entries
+      # that Delta removed from the scenarios that branch below the root, so
+      # the written entries are counted by the writer
+      if deltastage is not None:
+         print("Delta encoding wrote %d of %d entries (compression ratio %.2f)"\
+               %(writer.nentries, deltastage.nvalues,
+                  deltastage.nvalues/max(writer.nentries, 1)))
+
+   def writeExtensiveForm(self, mpsfile, stofile = None):
+      '''
+      writes the extensive form, i.e. the deterministic equivalent, of a
+      two-stage instance as a free MPS file. The second stage rows and columns
+      are copied for each scenario of the STO file with the suffix
+      _<scenario name> and the scenario values applied. The scenarios are
+      streamed from the STO file one at a time, see ExtensiveFormWriter.
+
+      Parameters
+      ----------
+      mpsfile : string
+         the name of the MPS file, which may have a compression extension
+      stofile : string. Default None
+         the STO file of the scenarios. If None, then the stofile of the
+         instance is used
+      '''
+      if stofile is None:
+         stofile = self.stofile
+      assert stofile is not None
+
+      with profiler.phase("writeExtensiveForm"):
+         nscenarios = ExtensiveFormWriter(self).write(mpsfile, stofile)
+
+      profiler.count("scenarios", nscenarios)
+
+   def addDeltaTransform(self, entries, transforms = None, delta = False):
+      '''
+      returns the transforms with the Delta stage appended and the Delta
+      stage, or the transforms and None if delta is False. The delta stage is
+      applied after all other transforms.
+      '''
+      if delta and entries is not None:
+         deltastage = Delta(coreValues(self)(entries.columns, entries.rows))
+         return list(transforms or []) + [deltastage], deltastage
+      elif delta:
+         print("The stochastic entries are not declared, so all entries are "\
+               "written")
+
+      return transforms, None
+
    def writeSmpsFile(self):
       '''
       writes the SMPS file for the generated problem
       '''
-      smpsfile = "%s.smps"%(self.stofile.split('.')[0])
-      with open(smpsfile, 'w') as outfile:
+      with open(smpsFileName(self.stofile), 'w') as outfile:
          outfile.write("%s\n"%self.corfile)
          outfile.write("%s\n"%self.timfile)
          outfile.write("%s\n"%self.stofile)
 
+   @property
+   def stages(self):
+      '''
+      the StageIndex of the instance. The index is built from the periods on
+      the first access after reading the core and TIM files.
+      '''
+      if self._stages is None:
+         with profiler.phase("stages"):
+            self._stages = StageIndex(self.constraints, self.variables,
+                  self.periods)
+
+      return self._stages
+
+   def getCoefficientMatrix(self):
+      '''
+      returns the coefficients as a CoefficientMatrix. If the coefficients are
+      stored in a dictionary, then the matrix is built on the first call and
+      rebuilt after the dictionary is written by storeVariables.
+      '''
+      if isinstance(self.coeffs, CoefficientMatrix):
+         return self.coeffs
+
+      if self._coefmatrix is None or self._coefdirty:
+         self._coefmatrix = CoefficientMatrix.fromDict(self.coeffs,
+               self.variables)
+         self._coefdirty = False
+
+      return self._coefmatrix
+
    def storeConstraints(self, line):
       '''
       stores the constraints of the problem
@@ -173,6 +777,8 @@ class Instance:
       if len(linelist) == 5:
          self.coeffs[linelist[0], linelist[3]] = float(linelist[4])
 
+      self._coefdirty = True
+
    def storeConsRhs(self, line):
       '''
       stores the RHS for constraints given by the line
@@ -197,19 +803,137 @@ class Instance:
       '''
       writes the scenarios with RHS stochasticity
       '''
-      print("The write RHS stochastic file has not been implemented")
+      entries = self.getRhsStochasticEntries()
+      if entries is None:
+         print("The write RHS stochastic file has not been implemented")
+         return
+
+      self.writeSampledScenarios(outfile, nscenarios, entries)
 
    def writeCoefStochasticFile(self, outfile, nscenarios):
       '''
       writes the scenarios with coefficient stochasticity
       '''
-      print("The write coefficient stochastic file has not been implemented")
+      entries = self.getCoefStochasticEntries()
+      if entries is None:
+         print("The write coefficient stochastic file has not been implemented")
+         return
+
+      self.writeSampledScenarios(outfile, nscenarios, entries)
 
    def writeObjStochasticFile(self, outfile, nscenarios):
       '''
       writes the scenarios with objective stochasticity
       '''
-      print("The write objective stochastic file has not been implemented")
+      entries = self.getObjStochasticEntries()
+      if entries is None:
+         print("The write objective stochastic file has not been implemented")
+         return
+
+      self.writeSampledScenarios(outfile, nscenarios, entries)
+
+   def getStochasticEntries(self, stochtype):
+      '''
+      returns the StochasticEntries for the stochasticity type, or None if the
+      stochasticity type is not implemented
+      '''
+      if stochtype == STOCH_RHS:
+         return self.getRhsStochasticEntries()
+      elif stochtype == STOCH_COEF:
+         return self.getCoefStochasticEntries()
+      elif stochtype == STOCH_OBJ:
+         return self.getObjStochasticEntries()
+
+      return None
+
+   def getRhsStochasticEntries(self):
+      '''
+      returns the StochasticEntries for RHS stochasticity, or None if RHS
+      stochasticity is not implemented
+      '''
+      return None
+
+   def getCoefStochasticEntries(self):
+      '''
+      returns the StochasticEntries for coefficient stochasticity, or None if
+      coefficient stochasticity is not implemented
+      '''
+      return None
+
+   def getObjStochasticEntries(self):
+      '''
+      returns the StochasticEntries for objective stochasticity, or None if
+      objective stochasticity is not implemented
+      '''
+      return None
+
+   def getScenarioBlocks(self, nscenarios, entries, rng = np.random, first = 0,
+         count = None, sampler = None):
+      '''
+      a generator that is the source of the scenario pipeline. The scenarios
+      are sampled and yielded one ScenarioBlock at a time.
+
+      Parameters
+      ----------
+      nscenarios : int
+         the total number of scenarios, used for the scenario probability
+      entries : StochasticEntries
+         the declaration of the random entries
+      rng : random number generator. Default np.random
+         the random number generator
+      first : int. Default 0
+         the index of the first scenario that is generated
+      count : int. Default None
+         the number of scenarios that are generated. If None, then all
+         scenarios from first are generated
+      sampler : sampler. Default None
+         the sampler of the uniform values, see makeSampler. If None, then
+         the values are drawn from rng
+      '''
+      if count is None:
+         count = nscenarios - first
+
+      weight = 1.0/float(nscenarios)
+      period = self.stages.names[1]
+      for start, values in sampleScenarios(entries, count, rng, sampler = sampler,
+            first = first):
+         names = ["SCEN%d"%(first + start + i + 1) for i in range(len(values))]
+         yield ScenarioBlock(names, "ROOT", weight, period, entries, values)
+
+   def writeSampledScenarios(self, outfile, nscenarios, entries, rng = np.random,
+         first = 0, count = None, transforms = None, sampler = None):
+      '''
+      writes the scenarios by sampling the stochastic entries in blocks. Each
+      block passes through the transforms before it is written. The entries
+      with a NaN value are not written.
+
+      Parameters
+      ----------
+      outfile : file object
+         the STO file
+      nscenarios : int
+         the total number of scenarios, used for the scenario probability
+      entries : StochasticEntries
+         the declaration of the random entries
+      rng : random number generator. Default np.random
+         the random number generator
+      first : int. Default 0
+         the index of the first scenario that is written
+      count : int. Default None
+         the number of scenarios that are written. If None, then all scenarios
+         from first are written
+      transforms : list of functions. Default None
+         the transform stages that are applied to each ScenarioBlock
+      sampler : sampler. Default None
+         the sampler of the uniform values, see makeSampler
+      '''
+      blocks = self.getScenarioBlocks(nscenarios, entries, rng, first, count,
+            sampler)
+      writer = StoWriter(outfile, self.scenarioheader)
+      writeScenarioBlocks(applyTransforms(blocks, transforms), writer)
+
+      profiler.count("scenarios", writer.nscenarios)
+      profiler.count("entries", writer.nentries)
 
    def writeStageFile(self, outfile):
       '''
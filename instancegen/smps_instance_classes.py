@@ -3,71 +3,54 @@ The MIT License (MIT)
 
 @author: Stephen J. Maher
 """
+import os
 import numpy as np
 from .smps_instance import Instance
+from .smps_io import stripCompression
+from .smps_decompose import detectStages, writeDecompositionReport
+from .smps_sampling import StochasticEntries, Uniform, Poisson, Constant, Sparse
 
 class RRTailAssignInstance(Instance):
    '''
    SMPS output functions for the recoverable robustness tail assignment problem
    '''
 
-   def writeCoefStochasticFile(self, outfile, nscenarios):
+   scenarioheader = " SC %s      %s         %g        %s        0.0\n"
+
+   def getCoefStochasticEntries(self):
       '''
-      writes the scenarios with coefficient stochasticity
+      returns the recovery coefficients that are removed with probability 0.01
       '''
-      # storing the first stage RHS to compute the standard deviationi
-      stage = 0
-      secondstagecons = []
-      for cons in self.constraints:
-         if cons == self.periods[1][2]:
-            stage += 1
-
-         if stage == 1:
-            secondstagecons.append(cons)
-
-      secondstagevars = []
-      stage = 0
-      for var in self.variables:
-         if var == self.periods[1][1]:
-            stage += 1
-
-         if stage == 1:
-            secondstagevars.append(var)
-
-      # writing the scenarios to the STO file
-      weight = 1.0/float(nscenarios)
-      for i in range(nscenarios):
-         outfile.write(" SC SCEN%d      ROOT         %g        %s        0.0\n"%(i + 1, weight, self.periods[1][0]))
-         for cons in secondstagecons:
-            if cons.startswith("RecoveryFlight"):
-               for var in secondstagevars:
-                  if var.startswith("Recovery") and (var, cons) in self.coeffs and self.coeffs[var, cons] == 1:
-                     randcoef = 1 - np.random.binomial(1, 0.01)
-                     if randcoef == 0:
-                        outfile.write("    %s      %s               %g\n"%(var, cons, randcoef))
-
-   def writeObjStochasticFile(self, outfile, nscenarios):
-      '''
-      writes the scenarios with objective stochasticity
-      '''
-      secondstagevars = []
-      stage = 0
-      for var in self.variables:
-         if var == self.periods[1][1]:
-            stage += 1
-
-         if stage == 1:
-            if var.startswith('Recovery'):
-               secondstagevars.append(var)
-
-      # writing the scenarios to the STO file
-      weight = 1.0/float(nscenarios)
-      for i in range(nscenarios):
-         outfile.write(" SC SCEN%d      ROOT         %g        %s        0.0\n"%(i + 1, weight, self.periods[1][0]))
-         for var in secondstagevars:
-            if np.random.binomial(1, 0.1) == 1:
-               randobj = (np.random.poisson() + 1)*100
-               outfile.write("    %s      obj               %g\n"%(var, randobj))
+      secondstagecons = self.stages.constraints(1)
+      secondstagevars = set(self.stages.variables(1))
+
+      # collecting the recovery coefficients by walking the nonzeros of each
+      # recovery flight row
+      matrix = self.getCoefficientMatrix()
+      stochvars = []
+      stochcons = []
+      for cons in secondstagecons:
+         if cons.startswith("RecoveryFlight"):
+            for var, coef in matrix.getRow(cons):
+               if var in secondstagevars and var.startswith("Recovery") and coef == 1:
+                  stochvars.append(var)
+                  stochcons.append(cons)
+
+      # the coefficient is set to 0 with probability 0.01, otherwise the core
+      # coefficient is kept and the entry is not written
+      return StochasticEntries(stochvars, stochcons, Sparse(0.01, Constant(0)))
+
+   def getObjStochasticEntries(self):
+      '''
+      returns the recovery objective coefficients that are changed with
+      probability 0.1
+      '''
+      secondstagevars = [var for var in self.stages.variables(1)
+            if var.startswith('Recovery')]
+
+      # the new objective coefficient is (X + 1)*100 where X is Poisson
+      return StochasticEntries(secondstagevars, "obj", Sparse(0.1, Poisson()),
+            transform = lambda values: (values + 1)*100)
 
 
 
@@ -103,36 +86,22 @@ class SSLPInstance(Instance):
          outfile.write("     %s     %s     STAGE-%d\n"%(stagevarstart[i],
             stageconsstart[i], i + 1))
 
-   def writeRhsStochasticFile(self, outfile, nscenarios):
+   def getRhsStochasticEntries(self):
       '''
-      writes the scenarios with RHS stochasticity
+      returns the second stage RHS, which are sampled as 0 or 1
       '''
       # storing the first stage RHS to compute the standard deviationi
-      #pdb.set_trace()
-      stage = 0
-      stagerhs = []
-      secondstagecons = []
-      for cons in self.constraints:
-         if cons == self.periods[1][2]:
-            stage += 1
-
-         if stage == 0:
-            stagerhs.append(self.rhs[cons])
-         else:
-            secondstagecons.append(cons)
+      stagerhs = [self.rhs[cons] for cons in self.stages.constraints(0)]
+      secondstagecons = self.stages.constraints(1)
 
       # computing the standard deviation
       stagestd = np.std(stagerhs)*2
 
-      # writing the scenarios to the STO file
-      weight = 1.0/float(nscenarios)
-      for i in range(nscenarios):
-         outfile.write(" SC SCEN%d      ROOT         %g        %s\n"%(i + 1, weight, self.periods[1][0]))
-         for cons in secondstagecons:
-            # computing the RHS of the constraint from a normal distribution
-            #randrhs = int(np.random.normal(self.rhs[cons], stagestd))
-            randrhs = round(np.random.random_sample())
-            outfile.write("    RHS      %s               %g\n"%(cons, randrhs))
+      # computing the RHS of the constraint from a rounded uniform distribution.
+      # A normal distribution can be used instead by replacing the distribution
+      # with Normal(self.rhs[cons], stagestd)
+      return StochasticEntries("RHS", secondstagecons, Uniform(),
+            transform = np.round)
 
 
 class NoswotInstance(Instance):
@@ -167,35 +136,14 @@ class NoswotInstance(Instance):
          outfile.write("     %s     %s     STAGE-%d\n"%(stagevarstart[i],
             stageconsstart[i], i + 1))
 
-   def writeRhsStochasticFile(self, outfile, nscenarios):
+   def getRhsStochasticEntries(self):
       '''
-      writes the scenarios with RHS stochasticity
+      returns the second stage RHS. Currently no RHS is stochastic, so only the
+      scenario headers are written
       '''
-      # storing the first stage RHS to compute the standard deviationi
-      stage = 0
-      stagerhs = []
-      secondstagecons = []
-      for cons in self.constraints:
-         if cons == self.periods[1][2]:
-            stage += 1
-
-         if stage == 0:
-            stagerhs.append(self.rhs[cons])
-         else:
-            secondstagecons.append(cons)
-
-      # computing the standard deviation
-      stagestd = np.std(stagerhs)*2
-
-      # writing the scenarios to the STO file
-      weight = 1.0/float(nscenarios)
-      for i in range(nscenarios):
-         outfile.write(" SC SCEN%d      ROOT         %g        %s\n"%(i + 1, weight, self.periods[1][0]))
-         #for cons in secondstagecons:
-            ## computing the RHS of the constraint from a normal distribution
-            ##randrhs = int(np.random.normal(self.rhs[cons], stagestd))
-            #randrhs = round(np.random.random_sample())
-            #outfile.write("    RHS      %s               %g\n"%(cons, randrhs))
+      # the distribution of the second stage RHS has not been defined, so the
+      # scenarios contain no entries
+      return StochasticEntries([], [], Uniform())
 
 
 class SnipInstance(Instance):
@@ -229,3 +177,45 @@ class SnipInstance(Instance):
       for i in range(len(stageconsstart)):
          outfile.write("     %s     %s     STAGE-%d\n"%(stagevarstart[i],
             stageconsstart[i], i + 1))
+
+
+class AutoStageInstance(Instance):
+   '''
+   SMPS output functions for core files without a known stage structure. The
+   stages are detected from the structure of the coefficient matrix, see
+   detectStages
+   '''
+
+   def writeTimFile(self):
+      '''
+      detects the stages and writes the TIM file if a decomposition is found.
+      The periods of a TIM file are ranges of the core file, so the TIM file
+      is only written if the first stage comes first in the core file.
+      Otherwise, the proposed constraint and variable orders are written to
+      <timfile>.order.json instead, and the core file must be reordered before
+      the stages can be written.
+      '''
+      self.decomposition = detectStages(self)
+      writeDecompositionReport(self.decomposition)
+      if not self.decomposition.found:
+         print("   ERROR: The stages of %s could not be detected, so no TIM file "\
+               "is written"%self.corfile)
+         return
+
+      if not self.decomposition.isOrdered():
+         orderfile = "%s.order.json"%os.path.splitext(
+               stripCompression(self.timfile))[0]
+         self.decomposition.writeOrder(orderfile)
+         print("   ERROR: The first stage is not at the start of the core file "\
+               "%s, so no TIM file is written. The constraint and variable "\
+               "order of the stages is written to %s"%(self.corfile, orderfile))
+         return
+
+      Instance.writeTimFile(self)
+
+   def writeStageFile(self, outfile):
+      '''
+      writes the detected stages to the stages file
+      '''
+      for period in self.decomposition.periods():
+         outfile.write("     %s     %s     %s\n"%tuple(period))
@@ -0,0 +1,262 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import os
+import bz2
+import queue
+import threading
+import gzip
+import lzma
+try:
+   import zstandard
+except ImportError:
+   zstandard = None
+
+# the extensions of the compressed files
+GZIP_EXTENSION = ".gz"
+BZIP2_EXTENSION = ".bz2"
+XZ_EXTENSION = ".xz"
+ZSTD_EXTENSION = ".zst"
+COMPRESSION_EXTENSIONS = [GZIP_EXTENSION, BZIP2_EXTENSION, XZ_EXTENSION,
+      ZSTD_EXTENSION]
+
+# the compression level of each codec. The levels trade a slightly larger file
+# for a much faster compression than the maximum level.
+COMPRESSION_LEVELS = {GZIP_EXTENSION: 6, BZIP2_EXTENSION: 9, XZ_EXTENSION: 3,
+      ZSTD_EXTENSION: 3}
+
+# the number of compression threads for the codecs that support threads. -1
+# uses all cores, 0 compresses in the calling thread.
+COMPRESSION_THREADS = -1
+
+# the number of chunks of text in the queue of an overlapped file and the
+# number of characters in each chunk. The text that is waiting to be written
+# is bounded by their product.
+WRITE_QUEUE_DEPTH = 8
+WRITE_CHUNK = 1 << 22
+
+def compression(filename):
+   '''
+   returns the compression extension of a file name, or None if the file is
+   not compressed
+   '''
+   for extension in COMPRESSION_EXTENSIONS:
+      if filename.endswith(extension):
+         return extension
+
+   return None
+
+def stripCompression(filename):
+   '''
+   returns the file name without the compression extension
+   '''
+   extension = compression(filename)
+   if extension is None:
+      return filename
+
+   return filename[:-len(extension)]
+
+def findFile(filename):
+   '''
+   returns the name of an existing file that is either the given file or the
+   given file with a compression extension, or None if no such file exists
+   '''
+   if os.path.isfile(filename):
+      return filename
+
+   for extension in COMPRESSION_EXTENSIONS:
+      if os.path.isfile(filename + extension):
+         return filename + extension
+
+   return None
+
+def smpsFileName(stofile):
+   '''
+   returns the name of the SMPS file for a STO file. The compression and file
+   extension of the STO file are replaced by .smps, so a directory or
+   instance name that contains a dot is kept.
+   '''
+   return "%s.smps"%(os.path.splitext(stripCompression(stofile))[0])
+
+def openFile(filename, mode = "r", level = None, threads = None,
+      overlapped = False):
+   '''
+   opens a file that is compressed according to its extension. The compressed
+   files are read and written as streams, so a file is never held in memory.
+
+   Parameters
+   ----------
+   filename : string
+      the name of the file
+   mode : string. Default "r"
+      the mode of the file, "r", "w", "a", "rb", "wb" or "ab"
+   level : int. Default None
+      the compression level. If None, then COMPRESSION_LEVELS is used
+   threads : int. Default None
+      the number of compression threads, only used by zstd. If None, then
+      COMPRESSION_THREADS is used
+   overlapped : bool. Default False
+      if True and the file is written, then the file is returned as an
+      OverlappedFile, so the writing, compression and fsync of the file run
+      in a writer thread
+
+   Returns
+   -------
+   file object
+      the opened file
+   '''
+   if overlapped and mode[0] in "wa":
+      return OverlappedFile(filename, openFile(filename, mode, level, threads))
+
+   extension = compression(filename)
+   if extension is None:
+      return open(filename, mode)
+
+   binary = "b" in mode
+   compressedmode = mode if binary else mode + "t"
+   writing = mode[0] in "wa"
+   if level is None:
+      level = COMPRESSION_LEVELS[extension]
+
+   if extension == GZIP_EXTENSION:
+      if writing:
+         return gzip.open(filename, compressedmode, compresslevel = level)
+      return gzip.open(filename, compressedmode)
+   elif extension == BZIP2_EXTENSION:
+      if writing:
+         return bz2.open(filename, compressedmode, compresslevel = level)
+      return bz2.open(filename, compressedmode)
+   elif extension == XZ_EXTENSION:
+      if writing:
+         return lzma.open(filename, compressedmode, preset = level)
+      return lzma.open(filename, compressedmode)
+
+   assert zstandard is not None, "the zstandard package is required for <%s>"%filename
+   if threads is None:
+      threads = COMPRESSION_THREADS
+   if writing:
+      return zstandard.open(filename, compressedmode,
+            cctx = zstandard.ZstdCompressor(level = level, threads = threads))
+   return zstandard.open(filename, compressedmode)
+
+class OverlappedFile:
+   '''
+   a file that is written by a writer thread. The text is collected in
+   chunks of WRITE_CHUNK characters that are put into a bounded queue, and
+   the writer thread drains the queue to the file. So the generation of the
+   text overlaps with the writing and the compression, which release the
+   GIL, and the text that is waiting to be written is bounded by the queue
+   depth. When the file is closed, the writer thread closes the file and
+   syncs it to the disk.
+
+   An error of the writer thread is raised by the next write or by close.
+
+   Parameters
+   ----------
+   filename : string
+      the name of the file
+   outfile : file object
+      the opened file, see openFile
+   queuedepth : int. Default WRITE_QUEUE_DEPTH
+      the number of chunks in the queue
+   sync : bool. Default True
+      if True, then the file is synced to the disk by fsync after it is closed
+   '''
+
+   def __init__(self, filename, outfile, queuedepth = WRITE_QUEUE_DEPTH,
+         sync = True):
+      self.filename = filename
+      self.outfile = outfile
+      self.sync = sync
+      self.queue = queue.Queue(maxsize = queuedepth)
+      self.buffer = []
+      self.buffered = 0
+      self.error = None
+      self.closed = False
+      self.thread = threading.Thread(target = self._drain, daemon = True)
+      self.thread.start()
+
+   def _drain(self):
+      '''
+      writes the chunks of the queue to the file until the chunk None. After
+      an error the queue is still drained, so that a put does not block.
+      '''
+      while True:
+         chunk = self.queue.get()
+         if chunk is None:
+            break
+         if self.error is None:
+            try:
+               self.outfile.write(chunk)
+            except BaseException as error:
+               self.error = error
+
+      try:
+         self.outfile.close()
+         if self.sync and self.error is None:
+            descriptor = os.open(self.filename, os.O_RDONLY)
+            try:
+               os.fsync(descriptor)
+            finally:
+               os.close(descriptor)
+      except BaseException as error:
+         if self.error is None:
+            self.error = error
+
+   def _raiseError(self):
+      '''
+      raises the error of the writer thread in the calling thread
+      '''
+      if self.error is not None:
+         raise IOError("writing %s failed"%self.filename) from self.error
+
+   def write(self, text):
+      '''
+      buffers text and puts the buffer into the queue if it is full
+      '''
+      self._raiseError()
+      self.buffer.append(text)
+      self.buffered += len(text)
+      if self.buffered >= WRITE_CHUNK:
+         self.flush()
+
+      return len(text)
+
+   def flush(self):
+      '''
+      puts the buffered text into the queue. The text is written by the
+      writer thread, so it is not on the disk when flush returns.
+      '''
+      if self.buffer:
+         self.queue.put(self.buffer[0][:0].join(self.buffer))
+         self.buffer = []
+         self.buffered = 0
+
+   def close(self):
+      '''
+      writes the remaining text, waits for the writer thread to close and sync
+      the file and raises its error
+      '''
+      if self.closed:
+         return
+
+      self.closed = True
+      self.flush()
+      self.queue.put(None)
+      self.thread.join()
+      self._raiseError()
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, exctype, excvalue, traceback):
+      if exctype is None:
+         self.close()
+      else:
+         # the error of the calling thread is raised, not that of the writer
+         try:
+            self.close()
+         except IOError:
+            pass
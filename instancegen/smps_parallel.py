@@ -0,0 +1,153 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import io
+import multiprocessing
+import numpy as np
+from .smps_sampling import blockScenarios
+from .smps_profile import profiler
+from .smps_pipeline import Delta
+
+# the maximum number of scenarios in each block. Each block is generated with
+# its own random number generator, so the output does not depend on the number
+# of workers.
+SCENARIO_BLOCK = 1000
+
+# the instance, entries and transforms of a worker process
+_workerinstance = None
+_workerentries = None
+_workertransforms = None
+_workersampler = None
+
+def blockGenerator(seed, block):
+   '''
+   returns the random number generator for a block of scenarios. The
+   generator is seeded by the child of SeedSequence(seed) that is spawned for
+   the block.
+
+   Parameters
+   ----------
+   seed : int
+      the seed of the scenario set
+   block : int
+      the index of the scenario block
+   '''
+   return np.random.default_rng(np.random.SeedSequence(seed, spawn_key = (block,)))
+
+def blockSize(entries):
+   '''
+   returns the number of scenarios in each block. The blocks are smaller than
+   SCENARIO_BLOCK if there are many entries, so that the text of a block is
+   bounded.
+   '''
+   return min(SCENARIO_BLOCK, blockScenarios(entries))
+
+def writeScenarioBlock(instance, entries, nscenarios, seed, block,
+      transforms = None, sampler = None, first = 0, blockoffset = 0):
+   '''
+   returns the STO text for a block of scenarios. The blocks start at the
+   scenario first and the generator of a block is spawned for its index plus
+   blockoffset. If a sampler is given, then the values only depend on the
+   scenario index and the block generator is not used.
+   '''
+   size = blockSize(entries)
+   start = first + block*size
+   count = min(size, nscenarios - start)
+   outfile = io.StringIO()
+   instance.writeSampledScenarios(outfile, nscenarios, entries,
+         rng = blockGenerator(seed, blockoffset + block), first = start,
+         count = count, transforms = transforms, sampler = sampler)
+
+   return outfile.getvalue()
+
+def _initWorker(instance, stochtype, transforms, sampler):
+   '''
+   initialises a worker process with the instance, its stochastic entries, the
+   transforms and the sampler
+   '''
+   global _workerinstance, _workerentries, _workertransforms, _workersampler
+   _workerinstance = instance
+   _workerentries = instance.getStochasticEntries(stochtype)
+   _workertransforms = transforms
+   _workersampler = sampler
+
+def _writeWorkerBlock(args):
+   '''
+   returns the STO text for a block of scenarios in a worker process and the
+   counts of the Delta stages, which are added to the stages of the calling
+   process
+   '''
+   nscenarios, seed, block, first, blockoffset = args
+   text = writeScenarioBlock(_workerinstance, _workerentries, nscenarios, seed,
+         block, _workertransforms, _workersampler, first, blockoffset)
+
+   return text, [transform.takeCounts() if isinstance(transform, Delta) else None
+         for transform in (_workertransforms or [])]
+
+def writeParallelScenarios(instance, outfile, nscenarios, stochtype, nworkers,
+      seed, transforms = None, sampler = None, first = 0, blockoffset = 0):
+   '''
+   writes the scenarios by generating blocks of scenarios over a pool of
+   worker processes. The blocks are written in the scenario order, so
+   the output is identical for any number of workers.
+
+   Parameters
+   ----------
+   instance : Instance
+      the instance for which the scenarios are generated
+   outfile : file object
+      the STO file
+   nscenarios : int
+      the number of scenarios
+   stochtype : string
+      the stochasticity type
+   nworkers : int
+      the number of worker processes. If 1, then the blocks are generated in
+      the calling process
+   seed : int
+      the seed of the scenario set
+   transforms : list of functions. Default None
+      the transform stages that are applied to each block
+   sampler : sampler. Default None
+      the sampler of the uniform values, see makeSampler
+   first : int. Default 0
+      the index of the first scenario that is written. The scenarios before
+      first are written by an earlier call, e.g. when a file is appended
+   blockoffset : int. Default 0
+      the index of the generator of the first block. An appended file
+      continues with the generators after the blocks of the earlier call
+
+   Returns
+   -------
+   int
+      the number of blocks that were written
+   '''
+   entries = instance.getStochasticEntries(stochtype)
+   size = blockSize(entries)
+   nblocks = (nscenarios - first + size - 1)//size
+   if nworkers <= 1:
+      for block in range(nblocks):
+         outfile.write(writeScenarioBlock(instance, entries, nscenarios, seed,
+            block, transforms, sampler, first, blockoffset))
+      return nblocks
+
+   # the blocks are submitted in windows, so that the number of blocks held
+   # in memory is bounded when writing is slower than generating
+   window = 4*nworkers
+   with multiprocessing.Pool(nworkers, _initWorker,
+         (instance, stochtype, transforms, sampler)) as pool:
+      for start in range(0, nblocks, window):
+         args = [(nscenarios, seed, block, first, blockoffset)
+               for block in range(start, min(start + window, nblocks))]
+         for text, counts in pool.imap(_writeWorkerBlock, args):
+            outfile.write(text)
+            for transform, count in zip(transforms or [], counts):
+               if count is not None:
+                  transform.addCounts(count)
+
+   # the counters of the workers are not collected, only the scenarios
+   profiler.count("scenarios", nscenarios - first)
+
+   return nblocks
@@ -0,0 +1,395 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import re
+from itertools import filterfalse, repeat
+import numpy as np
+from .smps_coeffs import CoefficientMatrix
+from .smps_profile import profiler
+from .smps_io import openFile
+
+# the number of bytes that are read from the file at once
+READ_BLOCK = 1 << 22
+
+ROWS     = "ROWS"
+COLUMNS  = "COLUMNS"
+RHS      = "RHS"
+RANGES   = "RANGES"
+BOUNDS   = "BOUNDS"
+OBJSENSE = "OBJSENSE"
+
+# the end of the line before a section header, i.e. a line that does not start
+# with white space
+SECTION_START = re.compile(rb"\n(?=\S)")
+
+def splitFields(body):
+   '''
+   splits the lines of a section into fields. All fields are split at once and
+   the lines of the fields are found from the positions of the line breaks.
+
+   Parameters
+   ----------
+   body : bytes
+      the complete lines of a section
+
+   Returns
+   -------
+   numpy.ndarray, numpy.ndarray, numpy.ndarray
+      the fields as an object array of strings, the index of the first field
+      of each non-empty line and the number of fields of each non-empty line
+   '''
+   fields = body.decode().split()
+
+   # the fields start after a white space byte, i.e. a byte up to 32
+   data = np.frombuffer(body, dtype = np.uint8)
+   space = data <= 32
+   fieldstart = np.flatnonzero(space[:-1] > space[1:]) + 1
+   if not space[0]:
+      fieldstart = np.concatenate(([0], fieldstart))
+   assert len(fieldstart) == len(fields), "the fields of the section could not be split"
+
+   # the number of fields before each line break gives the fields of each line
+   linebreaks = np.searchsorted(fieldstart, np.flatnonzero(data == 10))
+   linebreaks = np.concatenate(([0], linebreaks, [len(fields)]))
+   nfields = np.diff(linebreaks)
+   first = linebreaks[:-1][nfields > 0]
+   nfields = nfields[nfields > 0]
+
+   return np.array(fields, dtype = object), first, nfields
+
+def parseValues(fields):
+   '''
+   returns the values of an object array of strings as a float array
+   '''
+   return np.fromiter(map(float, fields.tolist()), dtype = np.float64,
+         count = len(fields))
+
+def fieldPairs(fields, first, nfields):
+   '''
+   returns the (name, value) pairs of the lines with at least three fields. The
+   second pair, given by the fourth and fifth field, is only read if the line
+   has five fields.
+
+   Returns
+   -------
+   numpy.ndarray, numpy.ndarray, numpy.ndarray
+      the names, the values and the line of each pair in the order of the lines
+   '''
+   second = nfields == 5
+   index = np.empty((len(first), 2), dtype = np.int64)
+   index[:, 0] = first + 1
+   index[:, 1] = first + 3
+   present = np.ones((len(first), 2), dtype = bool)
+   present[:, 1] = second
+   index = index[present]
+
+   return fields[index], parseValues(fields[index + 1]),\
+         np.repeat(np.arange(len(first)), second + 1)
+
+class CorParser:
+   '''
+   a parser for the sections of a COR file that are stored by the Instance.
+   The file is read in large blocks and the lines of each section in a block
+   are split into fields at once. The names and values of the fields are then
+   stored in bulk.
+
+   Parameters
+   ----------
+   compact : bool. Default False
+      if True, then the coefficients are stored in a CoefficientMatrix,
+      otherwise in a dictionary keyed by (var, cons)
+
+   Attributes
+   ----------
+   rowtypes : dict
+      maps each row name, including the objective, to its type N, E, L or G
+   integers : list of strings
+      the variables between the INTORG and INTEND markers
+   bounds : list of tuples
+      the type, variable and value of each bound. The value is None for the
+      bounds without a value, e.g. FR or BV
+   ranges : dict
+      maps a constraint name to its range
+   objsense : string
+      the objective sense of the OBJSENSE section, or None
+   '''
+
+   def __init__(self, compact = False):
+      self.compact = compact
+      self.section = None
+      self.constraints = []
+      self.variables = []
+      self.rhs = {}
+      self.coeffs = {}
+      self.rowtypes = {}
+      self.integers = []
+      self.bounds = []
+      self.ranges = {}
+      self.objsense = None
+      self.nlines = 0
+
+      # whether the columns are between the INTORG and INTEND markers
+      self.integer = False
+
+      # the name tables and the blocks of the triplet arrays of the compact
+      # coefficients
+      self.colnames = []
+      self.colindex = {}
+      self.rownames = []
+      self.rowindex = {}
+      self.cols = []
+      self.rows = []
+      self.vals = []
+
+   def parse(self, infile):
+      '''
+      parses the binary file object and returns the constraints, variables, rhs
+      and coeffs of the core file
+      '''
+      carry = b""
+      while True:
+         block = infile.read(READ_BLOCK)
+         if not block:
+            if carry:
+               self.nlines += 1
+               self.parseBlock(carry)
+            break
+
+         block = carry + block
+         end = block.rfind(b"\n") + 1
+         carry = block[end:]
+         self.nlines += block.count(b"\n")
+         self.parseBlock(block[:end])
+
+      if self.compact:
+         coeffs = CoefficientMatrix.fromArrays(self.colnames, self.rownames,
+               np.concatenate(self.cols) if self.cols else [],
+               np.concatenate(self.rows) if self.rows else [],
+               np.concatenate(self.vals) if self.vals else [],
+               self.colindex, self.rowindex)
+      else:
+         coeffs = self.coeffs
+
+      return self.constraints, self.variables, self.rhs, coeffs
+
+   def parseBlock(self, block):
+      '''
+      parses a block of complete lines. The block is split at the section
+      headers and the lines of each section are parsed at once.
+      '''
+      headers = [match.end() for match in SECTION_START.finditer(block)]
+      if block[:1] and not block[:1].isspace():
+         headers.insert(0, 0)
+
+      position = 0
+      for header in headers:
+         self.parseSection(block[position:header])
+         position = block.find(b"\n", header)
+         if position < 0:
+            position = len(block)
+         self.parseHeader(block[header:position].decode())
+      self.parseSection(block[position:])
+
+   def parseHeader(self, line):
+      '''
+      sets the section of a header line
+      '''
+      if line.startswith(ROWS):
+         self.section = ROWS
+      elif line.startswith(COLUMNS):
+         self.section = COLUMNS
+      elif line.startswith(RHS):
+         self.section = RHS
+      elif line.startswith(RANGES):
+         self.section = RANGES
+      elif line.startswith(BOUNDS):
+         self.section = BOUNDS
+      elif line.startswith(OBJSENSE):
+         self.section = OBJSENSE
+         linelist = line.split()
+         if len(linelist) > 1:
+            self.objsense = linelist[1]
+      else:
+         self.section = None
+
+   def parseSection(self, body):
+      '''
+      parses the lines of the current section
+      '''
+      if self.section is None or not body or body.isspace():
+         return
+
+      fields, first, nfields = splitFields(body)
+      if self.section == COLUMNS:
+         self.parseColumns(fields, first, nfields, b"MARKER" in body)
+      elif self.section == ROWS:
+         self.parseRows(fields, first, nfields)
+      elif self.section == RHS:
+         self.parseRhs(fields, first, nfields)
+      elif self.section == RANGES:
+         self.parseRanges(fields, first, nfields)
+      elif self.section == BOUNDS:
+         self.parseBounds(fields, first, nfields)
+      elif self.section == OBJSENSE:
+         self.objsense = fields[first[-1]]
+
+   def parseRows(self, fields, first, nfields):
+      '''
+      parses the fields of the rows
+      '''
+      first = first[nfields >= 2]
+      types = fields[first]
+      names = fields[first + 1].tolist()
+      self.constraints.extend(fields[first[types != 'N'] + 1].tolist())
+      self.rowtypes.update(zip(names, types.tolist()))
+
+      # all rows, including the objective, are part of the matrix
+      if self.compact:
+         rowindex = self.rowindex
+         rownames = self.rownames
+         start = len(rownames)
+         rownames.extend(filterfalse(rowindex.__contains__, dict.fromkeys(names)))
+         rowindex.update(zip(rownames[start:], range(start, len(rownames))))
+
+   def parseColumns(self, fields, first, nfields, markers):
+      '''
+      parses the fields of the columns into the coefficient dictionary or, in
+      compact mode, into the triplet arrays. The marker lines are only searched
+      if markers is True.
+      '''
+      # the markers are not stored, only the integer variables between them
+      nlines = len(first)
+      marker = np.zeros(nlines, dtype = bool)
+      named = nfields >= 3
+      if markers:
+         markerfield = fields[first[named] + 1]
+         marker[named] = (markerfield == "'MARKER'") | (markerfield == "MARKER")
+      markerlines = np.flatnonzero(marker)
+      integer = np.full(nlines, self.integer)
+      if len(markerlines) > 0:
+         intorg = np.array(["INTORG" in field
+            for field in fields[first[markerlines] + 2].tolist()])
+         previous = np.searchsorted(markerlines, np.arange(nlines)) - 1
+         integer[previous >= 0] = intorg[previous[previous >= 0]]
+         self.integer = bool(intorg[-1])
+
+      data = named & ~marker
+      first = first[data]
+      nfields = nfields[data]
+      integer = integer[data]
+      if len(first) == 0:
+         return
+
+      # a new variable starts at each change of the name in the first field
+      lastvar = self.variables[-1] if self.variables else None
+      names = fields[first]
+      newvar = np.empty(len(first), dtype = bool)
+      newvar[0] = names[0] != lastvar
+      newvar[1:] = names[1:] != names[:-1]
+      newvars = names[newvar].tolist()
+      self.variables.extend(newvars)
+      self.integers.extend(names[newvar & integer].tolist())
+
+      rownames, values, lines = fieldPairs(fields, first, nfields)
+      if self.compact:
+         colindex = self.colindex
+         colnames = self.colnames
+         start = len(colnames)
+         colnames.extend(filterfalse(colindex.__contains__, dict.fromkeys(newvars)))
+         colindex.update(zip(colnames[start:], range(start, len(colnames))))
+
+         colids = np.empty(len(newvars) + 1, dtype = np.int32)
+         colids[0] = colindex[lastvar] if lastvar is not None else -1
+         colids[1:] = np.fromiter(map(colindex.__getitem__, newvars),
+               dtype = np.int32, count = len(newvars))
+         cols = colids[np.cumsum(newvar)]
+
+         self.cols.append(cols[lines])
+         self.rows.append(self.rowIds(rownames.tolist()))
+         self.vals.append(values)
+      else:
+         self.coeffs.update(zip(zip(names[lines].tolist(), rownames.tolist()),
+               values.tolist()))
+
+   def parseRhs(self, fields, first, nfields):
+      '''
+      parses the fields of the right hand sides
+      '''
+      # the line will have five fields if there are two RHS
+      named = nfields >= 3
+      names, values, _ = fieldPairs(fields, first[named], nfields[named])
+      self.rhs.update(zip(names.tolist(), values.tolist()))
+
+   def parseRanges(self, fields, first, nfields):
+      '''
+      parses the fields of the ranges
+      '''
+      named = nfields >= 3
+      names, values, _ = fieldPairs(fields, first[named], nfields[named])
+      self.ranges.update(zip(names.tolist(), values.tolist()))
+
+   def parseBounds(self, fields, first, nfields):
+      '''
+      parses the fields of the bounds
+      '''
+      named = nfields >= 3
+      first = first[named]
+      valued = nfields[named] > 3
+      values = np.full(len(first), None, dtype = object)
+      values[valued] = parseValues(fields[first[valued] + 3]).tolist()
+      self.bounds.extend(zip(fields[first].tolist(),
+            fields[first + 2].tolist(), values.tolist()))
+
+   def rowIds(self, names):
+      '''
+      returns the row indices of a list of row names. The rows that are not
+      declared in the ROWS section are added to the row names.
+      '''
+      rowindex = self.rowindex
+      rows = np.fromiter(map(rowindex.get, names, repeat(-1)), dtype = np.int32,
+            count = len(names))
+      for i in np.flatnonzero(rows < 0).tolist():
+         row = rowindex.get(names[i])
+         rows[i] = row if row is not None else self.addRow(names[i])
+
+      return rows
+
+   def addRow(self, cons):
+      '''
+      adds a row that is not declared in the ROWS section to the row names
+      '''
+      self.rowindex[cons] = len(self.rownames)
+      self.rownames.append(cons)
+
+      return self.rowindex[cons]
+
+def parseCorFile(filename, compact = False, parser = None):
+   '''
+   parses a COR file
+
+   Parameters
+   ----------
+   filename : string
+      the name of the COR file
+   compact : bool. Default False
+      if True, then the coefficients are returned as a CoefficientMatrix,
+      otherwise as a dictionary keyed by (var, cons)
+   parser : CorParser. Default None
+      the parser of the file. The row types, integer variables, bounds and
+      ranges are attributes of the parser. If None, then a new parser is used
+
+   Returns
+   -------
+   list, list, dict, dict or CoefficientMatrix
+      the constraints, variables, rhs and coeffs of the core file
+   '''
+   if parser is None:
+      parser = CorParser(compact)
+   with openFile(filename, "rb") as infile:
+      core = parser.parse(infile)
+
+   profiler.count("corlines", parser.nlines)
+
+   return core
@@ -0,0 +1,177 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import numpy as np
+
+class ScenarioBlock:
+   '''
+   a block of consecutive scenarios that share the same stochastic entries.
+   The blocks are passed from a scenario source through the transform stages
+   to the sink that writes the STO file.
+
+   Parameters
+   ----------
+   names : list of strings
+      the scenario names
+   parents : list of strings or string
+      the parent of each scenario. A single string is used for all scenarios
+   probabilities : numpy.ndarray or float
+      the probability of each scenario. A single float is used for all
+      scenarios
+   period : list of strings or string
+      the period in which each scenario branches from its parent. A single
+      string is used for all scenarios
+   entries : StochasticEntries
+      the declaration of the random entries
+   values : numpy.ndarray
+      the (nscenarios x nentries) array of values. The entries that are not
+      part of a scenario are NaN
+   '''
+   __slots__ = ("names", "parents", "probabilities", "period", "entries",
+         "values")
+
+   def __init__(self, names, parents, probabilities, period, entries, values):
+      self.names = names
+      self.parents = parents
+      self.probabilities = probabilities
+      self.period = period
+      self.entries = entries
+      self.values = values
+
+   def __len__(self):
+      return len(self.names)
+
+class Scale:
+   '''
+   a transform stage that computes factor*value + offset
+   '''
+
+   def __init__(self, factor, offset = 0.0):
+      self.factor = factor
+      self.offset = offset
+
+   def __call__(self, block):
+      block.values = block.values*self.factor + self.offset
+      return block
+
+class Clip:
+   '''
+   a transform stage that clips the values to [lower, upper]. The NaN values
+   are preserved.
+   '''
+
+   def __init__(self, lower = None, upper = None):
+      self.lower = lower
+      self.upper = upper
+
+   def __call__(self, block):
+      block.values = np.clip(block.values, self.lower, self.upper)
+      return block
+
+class Round:
+   '''
+   a transform stage that rounds the values to the given number of decimals
+   '''
+
+   def __init__(self, decimals = 0):
+      self.decimals = decimals
+
+   def __call__(self, block):
+      block.values = np.round(block.values, self.decimals)
+      return block
+
+class Delta:
+   '''
+   a transform stage that removes the entries that are equal to their core
+   value, so that only the entries that differ from the core are written. The
+   removed entries are set to NaN.
+
+   Parameters
+   ----------
+   corevalues : numpy.ndarray
+      the core value of each stochastic entry
+   tolerance : float. Default 0.0
+      an entry is removed if it differs from the core value by at most the
+      tolerance
+
+   Attributes
+   ----------
+   nvalues : int
+      the number of entries that were passed to the stage
+   nwritten : int
+      the number of entries that were kept
+   '''
+
+   def __init__(self, corevalues, tolerance = 0.0):
+      self.corevalues = np.asarray(corevalues, dtype = np.float64)
+      self.tolerance = tolerance
+      self.nvalues = 0
+      self.nwritten = 0
+
+   def __call__(self, block):
+      values = block.values
+      assert values.shape[1] == len(self.corevalues)
+      present = ~np.isnan(values)
+      keep = present & (np.abs(values - self.corevalues) > self.tolerance)
+      self.nvalues += int(np.count_nonzero(present))
+      self.nwritten += int(np.count_nonzero(keep))
+
+      block.values = np.where(keep, values, np.nan)
+      return block
+
+   @property
+   def ratio(self):
+      '''the ratio of the passed entries to the written entries'''
+      return self.nvalues/max(self.nwritten, 1)
+
+   def takeCounts(self):
+      '''
+      returns the counts of the entries and resets them. This is used to
+      collect the counts from the worker processes.
+      '''
+      counts = (self.nvalues, self.nwritten)
+      self.nvalues = 0
+      self.nwritten = 0
+      return counts
+
+   def addCounts(self, counts):
+      '''
+      adds the counts that were taken from another stage
+      '''
+      self.nvalues += counts[0]
+      self.nwritten += counts[1]
+
+def applyTransforms(blocks, transforms = None):
+   '''
+   a generator that applies the transform stages in order to each block
+
+   Parameters
+   ----------
+   blocks : iterable of ScenarioBlock
+      the scenario source
+   transforms : list of functions. Default None
+      the transform stages. Each stage takes and returns a ScenarioBlock
+   '''
+   for block in blocks:
+      if transforms:
+         for transform in transforms:
+            block = transform(block)
+      yield block
+
+def writeScenarioBlocks(blocks, writer):
+   '''
+   the sink of the pipeline that writes each block with a StoWriter
+
+   Parameters
+   ----------
+   blocks : iterable of ScenarioBlock
+      the scenario blocks
+   writer : StoWriter
+      the writer of the STO file
+   '''
+   for block in blocks:
+      writer.writeSampledBlock(block.names, block.parents, block.probabilities,
+            block.period, block.entries, block.values)
+   writer.flush()
@@ -0,0 +1,186 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import os
+import sys
+import json
+import time
+import atexit
+
+# the environment variable that enables the profiling. The value is the output
+# of the profile, see enableProfiling
+PROFILE_ENV = "GENSTOCH_PROFILE"
+
+# the extensions of the cProfile output files
+PSTATS_EXTENSIONS = (".prof", ".pstats")
+
+class _NullPhase:
+   '''
+   the phase that is returned when the profiling is disabled
+   '''
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, exctype, value, traceback):
+      return False
+
+_NULL_PHASE = _NullPhase()
+
+class _Phase:
+   '''
+   a timed phase of the profiler
+   '''
+
+   __slots__ = ("phases", "name", "start")
+
+   def __init__(self, phases, name):
+      self.phases = phases
+      self.name = name
+
+   def __enter__(self):
+      self.start = time.perf_counter()
+      return self
+
+   def __exit__(self, exctype, value, traceback):
+      elapsed = time.perf_counter() - self.start
+      phase = self.phases.get(self.name)
+      if phase is None:
+         self.phases[self.name] = [1, elapsed]
+      else:
+         phase[0] += 1
+         phase[1] += elapsed
+      return False
+
+class Profiler:
+   '''
+   collects the time of the phases and the counters of an instance generation.
+   If the profiler is disabled, then a phase is a shared empty context manager
+   and a counter update is a single attribute test.
+
+   Attributes
+   ----------
+   enabled : bool
+      whether the phases and counters are collected
+   phases : dict
+      maps a phase name to the [calls, seconds] of the phase
+   counters : dict
+      maps a counter name to its value
+   '''
+
+   def __init__(self):
+      self.enabled = False
+      self.phases = {}
+      self.counters = {}
+      self.start = time.perf_counter()
+
+   def reset(self):
+      '''
+      clears the phases and counters
+      '''
+      self.phases = {}
+      self.counters = {}
+      self.start = time.perf_counter()
+
+   def phase(self, name):
+      '''
+      returns a context manager that times a phase, e.g.
+
+         with profiler.phase("readCorFile"):
+            ...
+      '''
+      if not self.enabled:
+         return _NULL_PHASE
+
+      return _Phase(self.phases, name)
+
+   def count(self, name, value = 1):
+      '''
+      adds a value to a counter
+      '''
+      if self.enabled:
+         self.counters[name] = self.counters.get(name, 0) + value
+
+   def toDict(self):
+      '''
+      returns the phases and counters as a dictionary
+      '''
+      return {"wall": time.perf_counter() - self.start,
+            "phases": {name: {"calls": calls, "seconds": seconds}
+               for name, (calls, seconds) in self.phases.items()},
+            "counters": dict(self.counters)}
+
+   def writeLog(self, filename):
+      '''
+      writes the phases and counters to a JSON file
+      '''
+      with open(filename, "w") as outfile:
+         json.dump(self.toDict(), outfile, indent = 2)
+
+   def printSummary(self, outfile = None):
+      '''
+      prints the phases and counters
+      '''
+      if outfile is None:
+         outfile = sys.stderr
+
+      outfile.write("%-30s %8s %12s\n"%("phase", "calls", "seconds"))
+      for name, (calls, seconds) in self.phases.items():
+         outfile.write("%-30s %8d %12.4f\n"%(name, calls, seconds))
+      outfile.write("%-30s %21s\n"%("counter", "value"))
+      for name, value in self.counters.items():
+         outfile.write("%-30s %21d\n"%(name, value))
+
+# the profiler of the instance generation
+profiler = Profiler()
+
+def enableProfiling(output = None):
+   '''
+   enables the profiler. The profile is written when the program exits.
+
+   Parameters
+   ----------
+   output : string. Default None
+      if None or "1", then a summary is printed to stderr. If the name ends
+      with .prof or .pstats, then the program is also profiled with cProfile
+      and the statistics are dumped to the file for pstats. Otherwise, the
+      phases and counters are written as JSON to the file.
+   '''
+   if profiler.enabled:
+      return
+
+   profiler.enabled = True
+   profiler.reset()
+
+   cprofile = None
+   if output is not None and output.endswith(PSTATS_EXTENSIONS):
+      import cProfile
+      cprofile = cProfile.Profile()
+      cprofile.enable()
+
+   def finish():
+      # the workers of a process pool do not write the profile
+      if os.getpid() != pid:
+         return
+
+      if cprofile is not None:
+         cprofile.disable()
+         cprofile.dump_stats(output)
+         profiler.printSummary()
+      elif output is None or output == "1":
+         profiler.printSummary()
+      else:
+         profiler.writeLog(output)
+
+   pid = os.getpid()
+   atexit.register(finish)
+
+def enableProfilingFromEnvironment():
+   '''
+   enables the profiler if the environment variable GENSTOCH_PROFILE is set
+   '''
+   output = os.environ.get(PROFILE_ENV)
+   if output:
+      enableProfiling(output)
@@ -0,0 +1,419 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import tempfile
+import numpy as np
+
+# the approximate number of distances that are computed at once. This bounds
+# the memory of the distance computations.
+REDUCTION_CHUNK = 1 << 22
+
+# the number of candidate scenarios of the fast forward selection
+FORWARD_CANDIDATES = 1000
+
+REDUCTION_FORWARD = "forward"
+REDUCTION_KMEANS = "kmeans"
+REDUCTION_METHODS = [REDUCTION_FORWARD, REDUCTION_KMEANS]
+
+class ScenarioMatrix:
+   '''
+   the scenarios of a ScenarioStore as a matrix with a row for each scenario
+   and a column for each (column, row) entry that appears in any scenario. The
+   rows are built from the entries of the store when they are indexed, so only
+   the rows of a chunk of scenarios are dense in memory.
+
+   Attributes
+   ----------
+   columns, rows : list of strings
+      the column names and row names of the entries
+   shape : tuple
+      the number of scenarios and the number of entries
+   dtype : numpy.dtype
+      the type of the rows
+   '''
+
+   def __init__(self, store, defaults = None, dtype = np.float32):
+      assert store.entrystart is not None
+      nrows = max(len(store.rownames), 1)
+      keys = store.entrycols.astype(np.int64)*nrows + store.entryrows
+      uniquekeys, entryindex = np.unique(keys, return_inverse = True)
+
+      self.columns = [store.colnames[key]
+            for key in (uniquekeys//nrows).tolist()]
+      self.rows = [store.rownames[key] for key in (uniquekeys%nrows).tolist()]
+      self.shape = (len(store), len(uniquekeys))
+      self.dtype = np.dtype(dtype)
+      self.entrystart = store.entrystart
+      self.entryindex = entryindex.reshape(-1)
+      self.entryvals = store.entryvals
+      if defaults is None:
+         self.defaults = np.zeros(len(uniquekeys), dtype = dtype)
+      else:
+         self.defaults = np.asarray(defaults(self.columns, self.rows),
+               dtype = dtype)
+
+   def __len__(self):
+      return self.shape[0]
+
+   def __getitem__(self, index):
+      '''
+      returns the dense rows of a slice or an array of scenario indices, or the
+      dense row of a single scenario
+      '''
+      if isinstance(index, slice):
+         start, stop, step = index.indices(len(self))
+         indices = np.arange(start, stop, step)
+      else:
+         indices = np.asarray(index, dtype = np.int64)
+         if indices.ndim == 0:
+            return self[indices.reshape(1)][0]
+
+      block = np.empty((len(indices), self.shape[1]), dtype = self.dtype)
+      block[:] = self.defaults
+
+      # the positions of the entries of the scenarios in the store
+      starts = self.entrystart[indices]
+      counts = self.entrystart[indices + 1] - starts
+      offsets = np.cumsum(counts) - counts
+      positions = np.repeat(starts - offsets, counts) + \
+            np.arange(int(counts.sum()))
+      block[np.repeat(np.arange(len(indices)), counts),
+            self.entryindex[positions]] = self.entryvals[positions]
+
+      return block
+
+def scenarioMatrix(store, defaults = None, dtype = np.float32):
+   '''
+   returns the scenarios of a ScenarioStore as a matrix with a row for each
+   scenario and a column for each (column, row) entry that appears in any
+   scenario. The matrix is a ScenarioMatrix, which builds the dense rows of a
+   chunk of scenarios when it is indexed.
+
+   Parameters
+   ----------
+   store : ScenarioStore
+      the scenarios, the entries must be loaded
+   defaults : function. Default None
+      a function that is called with the lists of column and row names of the
+      entries and returns the values of the entries that are not given in a
+      scenario, e.g. the core values from coreValues. If None, then a missing
+      entry is 0
+   dtype : numpy.dtype. Default numpy.float32
+      the type of the matrix
+
+   Returns
+   -------
+   list, list, ScenarioMatrix
+      the column names and row names of the entries and the
+      (nscenarios x nentries) matrix
+   '''
+   matrix = ScenarioMatrix(store, defaults, dtype)
+
+   return matrix.columns, matrix.rows, matrix
+
+def coreValues(instance):
+   '''
+   returns a function for scenarioMatrix that gives the core values of the
+   entries of an instance. A column that is not a variable of the core is a
+   right hand side.
+   '''
+   def defaults(columns, rows):
+      matrix = instance.getCoefficientMatrix()
+      values = np.zeros(len(columns), dtype = np.float64)
+      for i, (column, row) in enumerate(zip(columns, rows)):
+         if column in matrix.colindex:
+            values[i] = matrix.get((column, row), 0.0)
+         else:
+            values[i] = instance.rhs.get(row, 0.0)
+      return values
+
+   return defaults
+
+def chunkSize(ncolumns):
+   '''
+   returns the number of rows of a chunk of a distance matrix with ncolumns
+   '''
+   return max(1, REDUCTION_CHUNK//max(ncolumns, 1))
+
+def squaredDistances(matrix, norms, centers, centernorms):
+   '''
+   returns the squared Euclidean distances between the rows of matrix and the
+   rows of centers. The norms are the squared row norms.
+   '''
+   distances = matrix @ centers.T
+   distances *= -2
+   distances += norms[:, None]
+   distances += centernorms[None, :]
+   np.maximum(distances, 0, out = distances)
+
+   return distances
+
+def rowNorms(matrix):
+   '''
+   returns the squared norm of each row of the matrix, computed in chunks
+   '''
+   norms = np.empty(len(matrix), dtype = matrix.dtype)
+   size = chunkSize(matrix.shape[1])
+   for start in range(0, len(matrix), size):
+      block = matrix[start:start + size]
+      norms[start:start + size] = np.einsum("ij,ij->i", block, block)
+
+   return norms
+
+def distanceMatrix(nscenarios, ncandidates, dtype):
+   '''
+   returns an uninitialised (nscenarios x ncandidates) matrix of distances. A
+   matrix with more than REDUCTION_CHUNK elements is spooled to a temporary
+   file, so that it is paged in by chunks rather than held in memory.
+   '''
+   if nscenarios*ncandidates <= REDUCTION_CHUNK:
+      return np.empty((nscenarios, ncandidates), dtype = dtype)
+
+   return np.memmap(tempfile.TemporaryFile(), dtype = dtype, mode = "w+",
+         shape = (nscenarios, ncandidates))
+
+def forwardSelection(matrix, probabilities, nselect,
+      ncandidates = FORWARD_CANDIDATES, rng = None):
+   '''
+   selects scenarios by an approximation of the fast forward selection of
+   Heitsch and Roemisch. In each iteration, the candidate that reduces the
+   probability weighted distance of all scenarios to their nearest selected
+   scenario the most is selected. The probability of each scenario is then
+   given to its nearest selected scenario.
+
+   If there are more than ncandidates scenarios, then only a random sample of
+   ncandidates scenarios are candidates, so the selected scenarios are not
+   those of the exact fast forward selection, which tries every scenario. The
+   distances of all scenarios are still measured, so the time grows linearly
+   with the number of scenarios. The rows of the matrix and the distances to
+   the candidates are computed in chunks of scenarios, and a large distance
+   matrix is spooled to a temporary file, see distanceMatrix.
+
+   Parameters
+   ----------
+   matrix : ScenarioMatrix or numpy.ndarray
+      the (nscenarios x nentries) scenario matrix
+   probabilities : numpy.ndarray
+      the probability of each scenario
+   nselect : int
+      the number of selected scenarios
+   ncandidates : int. Default FORWARD_CANDIDATES
+      the maximum number of candidate scenarios
+   rng : numpy.random.Generator. Default None
+      the generator of the candidate sample. If None, then the generator is
+      seeded with 0
+
+   Returns
+   -------
+   numpy.ndarray, numpy.ndarray
+      the indices of the selected scenarios and their new probabilities
+   '''
+   nscenarios = len(matrix)
+   nselect = min(nselect, nscenarios)
+   if rng is None:
+      rng = np.random.default_rng(0)
+
+   if nscenarios <= ncandidates:
+      candidates = np.arange(nscenarios)
+   else:
+      candidates = np.sort(rng.choice(nscenarios, max(ncandidates, nselect),
+         replace = False))
+
+   # the distances between the scenarios and the candidates
+   norms = rowNorms(matrix)
+   centers = matrix[candidates]
+   centernorms = norms[candidates]
+   distances = distanceMatrix(nscenarios, len(candidates), matrix.dtype)
+   size = min(chunkSize(len(candidates)), chunkSize(matrix.shape[1]))
+   for start in range(0, nscenarios, size):
+      end = min(start + size, nscenarios)
+      distances[start:end] = np.sqrt(squaredDistances(matrix[start:end],
+         norms[start:end], centers, centernorms))
+
+   weights = probabilities.astype(matrix.dtype)
+   nearest = np.full(nscenarios, np.inf, dtype = matrix.dtype)
+   available = np.ones(len(candidates), dtype = bool)
+   selected = []
+   for iteration in range(nselect):
+      # the weighted distance of the scenarios after selecting each candidate
+      objective = np.zeros(len(candidates), dtype = np.float64)
+      for start in range(0, nscenarios, size):
+         end = min(start + size, nscenarios)
+         objective += weights[start:end] @ np.minimum(
+               nearest[start:end, None], distances[start:end])
+
+      objective[~available] = np.inf
+      best = int(np.argmin(objective))
+      available[best] = False
+      selected.append(best)
+      for start in range(0, nscenarios, size):
+         end = min(start + size, nscenarios)
+         np.minimum(nearest[start:end], distances[start:end, best],
+               out = nearest[start:end])
+
+   # redistributing the probability to the nearest selected scenario
+   selected = np.array(selected, dtype = np.int64)
+   assignment = np.empty(nscenarios, dtype = np.int64)
+   for start in range(0, nscenarios, size):
+      end = min(start + size, nscenarios)
+      assignment[start:end] = np.argmin(distances[start:end][:, selected], axis = 1)
+
+   newprobabilities = np.bincount(assignment, weights = probabilities,
+         minlength = len(selected))
+
+   return candidates[selected], newprobabilities
+
+def kmeansReduction(matrix, probabilities, nclusters, maxiter = 50,
+      tolerance = 1e-4, rng = None):
+   '''
+   clusters the scenarios by the probability weighted k-means algorithm. The
+   centers are initialised by k-means++ and the assignments are computed in
+   chunks. Each cluster is represented by the scenario that is nearest to its
+   center, so the representative scenarios keep the entries of the original
+   scenarios, and the probability of the cluster.
+
+   Parameters
+   ----------
+   matrix : ScenarioMatrix or numpy.ndarray
+      the (nscenarios x nentries) scenario matrix
+   probabilities : numpy.ndarray
+      the probability of each scenario
+   nclusters : int
+      the number of clusters
+   maxiter : int. Default 50
+      the maximum number of iterations
+   tolerance : float. Default 1e-4
+      the iterations stop when the weighted distance improves by less than
+      this relative amount
+   rng : numpy.random.Generator. Default None
+      the generator of the initial centers. If None, then the generator is
+      seeded with 0
+
+   Returns
+   -------
+   numpy.ndarray, numpy.ndarray
+      the indices of the representative scenarios and their probabilities.
+      Empty clusters are removed, so there may be fewer than nclusters
+   '''
+   nscenarios = len(matrix)
+   nclusters = min(nclusters, nscenarios)
+   if rng is None:
+      rng = np.random.default_rng(0)
+
+   norms = rowNorms(matrix)
+   weights = probabilities/probabilities.sum()
+
+   # k-means++, each center is drawn proportional to the weighted squared
+   # distance to the nearest center
+   centers = np.empty((nclusters, matrix.shape[1]), dtype = matrix.dtype)
+   centers[0] = matrix[rng.choice(nscenarios, p = weights)]
+   nearest = np.full(nscenarios, np.inf, dtype = np.float64)
+   size = chunkSize(matrix.shape[1])
+   for k in range(1, nclusters):
+      center = centers[k - 1:k]
+      centernorm = np.einsum("ij,ij->i", center, center)
+      for start in range(0, nscenarios, size):
+         end = min(start + size, nscenarios)
+         np.minimum(nearest[start:end], squaredDistances(matrix[start:end],
+            norms[start:end], center, centernorm)[:, 0], out = nearest[start:end])
+
+      scores = weights*nearest
+      if scores.sum() <= 0:
+         centers = centers[:k]
+         break
+      centers[k] = matrix[rng.choice(nscenarios, p = scores/scores.sum())]
+
+   # Lloyd iterations with the assignments computed in chunks
+   nclusters = len(centers)
+   size = min(chunkSize(nclusters), chunkSize(matrix.shape[1]))
+   labels = np.empty(nscenarios, dtype = np.int64)
+   mindistances = np.empty(nscenarios, dtype = np.float64)
+   previous = np.inf
+   for iteration in range(maxiter):
+      centernorms = np.einsum("ij,ij->i", centers, centers)
+      sums = np.zeros(centers.shape, dtype = np.float64)
+      for start in range(0, nscenarios, size):
+         end = min(start + size, nscenarios)
+         distances = squaredDistances(matrix[start:end], norms[start:end],
+               centers, centernorms)
+         labels[start:end] = np.argmin(distances, axis = 1)
+         mindistances[start:end] = distances[np.arange(end - start),
+               labels[start:end]]
+
+         # the weighted sum of the scenarios of each cluster
+         members = np.zeros((end - start, nclusters), dtype = matrix.dtype)
+         members[np.arange(end - start), labels[start:end]] = weights[start:end]
+         sums += members.T @ matrix[start:end]
+
+      clusterweights = np.bincount(labels, weights = weights, minlength = nclusters)
+      nonempty = clusterweights > 0
+      centers[nonempty] = sums[nonempty]/clusterweights[nonempty, None]
+
+      objective = float(weights @ mindistances)
+      if previous - objective <= tolerance*objective:
+         break
+      previous = objective
+
+   # the representative of each cluster is the scenario nearest to its center
+   centernorms = np.einsum("ij,ij->i", centers, centers)
+   for start in range(0, nscenarios, size):
+      end = min(start + size, nscenarios)
+      distances = squaredDistances(matrix[start:end], norms[start:end],
+            centers, centernorms)
+      labels[start:end] = np.argmin(distances, axis = 1)
+      mindistances[start:end] = distances[np.arange(end - start),
+            labels[start:end]]
+
+   order = np.lexsort((mindistances, labels))
+   first = np.ones(nscenarios, dtype = bool)
+   first[1:] = labels[order][1:] != labels[order][:-1]
+   representatives = order[first]
+
+   clusterprobabilities = np.bincount(labels, weights = probabilities,
+         minlength = nclusters)
+
+   return representatives, clusterprobabilities[labels[representatives]]
+
+def reduceScenarios(store, nscenarios, method = REDUCTION_FORWARD,
+      defaults = None, rng = None, **options):
+   '''
+   reduces the scenarios of a ScenarioStore to nscenarios representative
+   scenarios with adjusted probabilities
+
+   Parameters
+   ----------
+   store : ScenarioStore
+      the scenarios, the entries must be loaded
+   nscenarios : int
+      the number of representative scenarios
+   method : string. Default REDUCTION_FORWARD
+      the reduction method, REDUCTION_FORWARD or REDUCTION_KMEANS
+   defaults : function. Default None
+      the values of the entries that are not given in a scenario, see
+      scenarioMatrix
+   rng : numpy.random.Generator. Default None
+      the random number generator of the reduction method
+   options : dict
+      the options of forwardSelection or kmeansReduction
+
+   Returns
+   -------
+   ScenarioStore
+      the representative scenarios in the order of the original scenarios
+   '''
+   assert method in REDUCTION_METHODS
+   columns, rows, matrix = scenarioMatrix(store, defaults)
+   probabilities = np.asarray(store.probabilities, dtype = np.float64)
+
+   if method == REDUCTION_FORWARD:
+      indices, newprobabilities = forwardSelection(matrix, probabilities,
+            nscenarios, rng = rng, **options)
+   else:
+      indices, newprobabilities = kmeansReduction(matrix, probabilities,
+            nscenarios, rng = rng, **options)
+
+   order = np.argsort(indices)
+
+   return store.selectScenarios(indices[order], newprobabilities[order])
@@ -0,0 +1,86 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import os
+import json
+import numpy as np
+
+# the extension of the file next to an STO file that stores the state from
+# which the scenarios are continued
+RESUME_EXTENSION = ".resume.json"
+
+# the version of the resume file format
+RESUME_VERSION = 1
+
+def resumeFileName(stofile):
+   '''
+   returns the name of the resume file of an STO file
+   '''
+   return stofile + RESUME_EXTENSION
+
+def getRandomState():
+   '''
+   returns the state of the global random number generator as a list that can
+   be stored as JSON
+   '''
+   name, keys, position, hasgauss, gauss = np.random.get_state()
+   return [name, keys.tolist(), int(position), int(hasgauss), float(gauss)]
+
+def setRandomState(state):
+   '''
+   restores the state of the global random number generator from a list that
+   was returned by getRandomState
+   '''
+   name, keys, position, hasgauss, gauss = state
+   np.random.set_state((name, np.array(keys, dtype = np.uint32), position,
+      hasgauss, gauss))
+
+def writeResumeState(stofile, state):
+   '''
+   writes the resume file of an STO file. The size of the STO file is stored
+   with the state, so that a file that was changed after it was written is
+   not continued.
+
+   Parameters
+   ----------
+   stofile : string
+      the name of the STO file
+   state : dict
+      the state from which the scenarios are continued. The keys are
+      stochtype, scheme, seed, delta, nscenarios, randomstate, blockseed and
+      nextblock
+   '''
+   state = dict(state, version = RESUME_VERSION,
+         stobytes = os.path.getsize(stofile))
+   with open(resumeFileName(stofile), "w") as outfile:
+      json.dump(state, outfile)
+
+def readResumeState(stofile):
+   '''
+   reads the resume file of an STO file
+
+   Parameters
+   ----------
+   stofile : string
+      the name of the STO file
+
+   Returns
+   -------
+   dict
+      the state from which the scenarios are continued, see writeResumeState
+   '''
+   filename = resumeFileName(stofile)
+   assert os.path.isfile(filename), "the STO file %s can not be appended, "\
+         "because it has no resume file %s"%(stofile, filename)
+
+   with open(filename, "r") as infile:
+      state = json.load(infile)
+
+   assert state["version"] == RESUME_VERSION, "the resume file %s has the "\
+         "unsupported version %s"%(filename, state["version"])
+   assert state["stobytes"] == os.path.getsize(stofile), "the STO file %s "\
+         "has changed since the resume file %s was written"%(stofile, filename)
+
+   return state
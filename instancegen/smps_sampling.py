@@ -0,0 +1,548 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import math
+import zlib
+import numpy as np
+from .smps_profile import profiler
+
+# the approximate number of values that are drawn in a single call to the
+# random number generator. This bounds the memory of a block of scenarios.
+SAMPLE_BLOCK = 1 << 18
+
+class Distribution:
+   '''
+   the base class for the distributions of the stochastic entries
+   '''
+
+   def draw(self, rng, size):
+      '''
+      draws an array of the given size from the distribution
+
+      Parameters
+      ----------
+      rng : numpy.random.RandomState, numpy.random.Generator or numpy.random
+         the random number generator
+      size : int or tuple of ints
+         the shape of the returned array
+      '''
+      raise NotImplementedError
+
+   def ppf(self, u):
+      '''
+      returns the inverse of the cumulative distribution function of the
+      uniform values u in [0, 1). This is used by the sampling schemes that
+      generate uniform values, see makeSampler.
+      '''
+      raise NotImplementedError
+
+class Uniform(Distribution):
+   '''
+   the uniform distribution on [low, high)
+   '''
+
+   def __init__(self, low = 0.0, high = 1.0):
+      self.low = low
+      self.high = high
+
+   def draw(self, rng, size):
+      if hasattr(rng, "random_sample"):
+         values = rng.random_sample(size)
+      else:
+         values = rng.random(size)
+
+      if self.low != 0.0 or self.high != 1.0:
+         values = self.low + (self.high - self.low)*values
+
+      return values
+
+   def ppf(self, u):
+      return self.low + (self.high - self.low)*u
+
+class Normal(Distribution):
+   '''
+   the normal distribution with the given mean and standard deviation
+   '''
+
+   def __init__(self, mean = 0.0, std = 1.0):
+      self.mean = mean
+      self.std = std
+
+   def draw(self, rng, size):
+      return rng.normal(self.mean, self.std, size)
+
+   def ppf(self, u):
+      return self.mean + self.std*normalPpf(u)
+
+class Binomial(Distribution):
+   '''
+   the binomial distribution with n trials and success probability p
+   '''
+
+   def __init__(self, n, p):
+      self.n = n
+      self.p = p
+
+   def draw(self, rng, size):
+      return rng.binomial(self.n, self.p, size)
+
+   def ppf(self, u):
+      if self.p <= 0.0:
+         return np.zeros(np.shape(u))
+      if self.p >= 1.0:
+         return np.full(np.shape(u), float(self.n))
+
+      logpmf = [math.lgamma(self.n + 1) - math.lgamma(k + 1)
+            - math.lgamma(self.n - k + 1) + k*math.log(self.p)
+            + (self.n - k)*math.log1p(-self.p) for k in range(self.n + 1)]
+
+      return discretePpf(np.exp(logpmf), u)
+
+class Poisson(Distribution):
+   '''
+   the Poisson distribution with rate lam
+   '''
+
+   def __init__(self, lam = 1.0):
+      self.lam = lam
+
+   def draw(self, rng, size):
+      return rng.poisson(self.lam, size)
+
+   def ppf(self, u):
+      # the support is truncated far in the tail
+      kmax = int(self.lam + 12*math.sqrt(self.lam) + 20)
+      logpmf = [k*math.log(self.lam) - self.lam - math.lgamma(k + 1)
+            for k in range(kmax + 1)]
+
+      return discretePpf(np.exp(logpmf), u)
+
+class Constant(Distribution):
+   '''
+   a constant value. No random numbers are drawn.
+   '''
+
+   def __init__(self, value):
+      self.value = value
+
+   def draw(self, rng, size):
+      return np.full(size, self.value, dtype = np.float64)
+
+   def ppf(self, u):
+      return np.full(np.shape(u), self.value, dtype = np.float64)
+
+class Sparse(Distribution):
+   '''
+   an entry that appears in a scenario with the given probability. If the entry
+   appears, then the value is drawn from the given distribution, otherwise the
+   value is NaN and the entry is not written.
+   '''
+
+   def __init__(self, probability, distribution):
+      self.probability = probability
+      self.distribution = distribution
+
+   def draw(self, rng, size):
+      mask = rng.binomial(1, self.probability, size) == 1
+      values = np.full(size, np.nan)
+      nvalues = int(np.count_nonzero(mask))
+      if nvalues > 0:
+         values[mask] = self.distribution.draw(rng, nvalues)
+
+      return values
+
+   def ppf(self, u):
+      # the entry appears if u < probability. Then, u/probability is uniform on
+      # [0, 1) and is used for the value of the entry
+      mask = u < self.probability
+      values = np.full(np.shape(u), np.nan)
+      if np.any(mask):
+         values[mask] = self.distribution.ppf(u[mask]/self.probability)
+
+      return values
+
+# the coefficients of the rational approximations of the inverse normal
+# distribution function by P. J. Acklam. The relative error is below 1.15e-9.
+_NORMAL_A = (-3.969683028665376e+01, 2.209460984245205e+02, -2.759285104469687e+02,
+      1.383577518672690e+02, -3.066479806614716e+01, 2.506628277459239e+00)
+_NORMAL_B = (-5.447609879822406e+01, 1.615858368580409e+02, -1.556989798598866e+02,
+      6.680131188771972e+01, -1.328068155288572e+01)
+_NORMAL_C = (-7.784894002430293e-03, -3.223964580411365e-01, -2.400758277161838e+00,
+      -2.549732539343734e+00, 4.374664141464968e+00, 2.938163982698783e+00)
+_NORMAL_D = (7.784695709041462e-03, 3.224671290700398e-01, 2.445134137142996e+00,
+      3.754408661907416e+00)
+_NORMAL_LOW = 0.02425
+
+def normalPpf(u):
+   '''
+   returns the inverse of the standard normal distribution function
+   '''
+   u = np.clip(np.asarray(u, dtype = np.float64), np.finfo(np.float64).tiny,
+         1.0 - np.finfo(np.float64).epsneg)
+   a, b, c, d = _NORMAL_A, _NORMAL_B, _NORMAL_C, _NORMAL_D
+   values = np.empty(u.shape)
+
+   # the central region
+   central = (u >= _NORMAL_LOW) & (u <= 1.0 - _NORMAL_LOW)
+   q = u[central] - 0.5
+   r = q*q
+   values[central] = (((((a[0]*r + a[1])*r + a[2])*r + a[3])*r + a[4])*r + a[5])*q\
+         /(((((b[0]*r + b[1])*r + b[2])*r + b[3])*r + b[4])*r + 1.0)
+
+   # the tails, the upper tail is the negated lower tail of 1 - u
+   tail = ~central
+   q = np.sqrt(-2.0*np.log(np.minimum(u[tail], 1.0 - u[tail])))
+   x = (((((c[0]*q + c[1])*q + c[2])*q + c[3])*q + c[4])*q + c[5])\
+         /((((d[0]*q + d[1])*q + d[2])*q + d[3])*q + 1.0)
+   values[tail] = np.where(u[tail] < 0.5, x, -x)
+
+   return values
+
+def discretePpf(pmf, u):
+   '''
+   returns the inverse of the distribution function of a discrete
+   distribution on 0, 1, ..., len(pmf) - 1
+   '''
+   cdf = np.cumsum(pmf)
+   cdf /= cdf[-1]
+   values = np.searchsorted(cdf, u, side = "right")
+
+   return np.minimum(values, len(pmf) - 1).astype(np.float64)
+
+class StochasticEntries:
+   '''
+   the declaration of the random entries of a scenario. Each entry is a
+   (column, row) pair of the STO file, i.e. ("RHS", consname) for RHS
+   stochasticity, (varname, consname) for coefficient stochasticity and
+   (varname, "obj") for objective stochasticity. All entries are drawn from
+   the same distribution.
+
+   Parameters
+   ----------
+   columns : list of strings or string
+      the column names of the entries. A single string is used for all entries
+   rows : list of strings or string
+      the row names of the entries. A single string is used for all entries
+   distribution : Distribution
+      the distribution of the entry values
+   transform : function. Default None
+      a function that is applied to each block of sampled values, e.g.
+      np.round. NaN values must be preserved by the function.
+   '''
+
+   def __init__(self, columns, rows, distribution, transform = None):
+      if isinstance(columns, str) and isinstance(rows, str):
+         columns = [columns]
+         rows = [rows]
+      elif isinstance(columns, str):
+         columns = [columns]*len(rows)
+      elif isinstance(rows, str):
+         rows = [rows]*len(columns)
+
+      assert len(columns) == len(rows)
+      self.columns = list(columns)
+      self.rows = list(rows)
+      self.distribution = distribution
+      self.transform = transform
+
+   def __len__(self):
+      return len(self.columns)
+
+   def select(self, indices):
+      '''
+      returns the StochasticEntries of the entries with the given indices. The
+      distribution and transform are shared with this declaration.
+      '''
+      return StochasticEntries([self.columns[i] for i in indices],
+            [self.rows[i] for i in indices], self.distribution, self.transform)
+
+   def sample(self, rng, nscenarios):
+      '''
+      returns a (nscenarios x nentries) array of sampled values. The entries
+      that are not part of a scenario are NaN.
+      '''
+      values = np.asarray(self.distribution.draw(rng, (nscenarios, len(self))),
+            dtype = np.float64)
+      if self.transform is not None:
+         values = self.transform(values)
+
+      return values
+
+   def fromUniform(self, u):
+      '''
+      returns the values for a (nscenarios x nentries) array of uniform values
+      by the inverse distribution function. The entries that are not part of
+      a scenario are NaN.
+      '''
+      values = np.asarray(self.distribution.ppf(u), dtype = np.float64)
+      if self.transform is not None:
+         values = self.transform(values)
+
+      return values
+
+SAMPLING_MC = "mc"
+SAMPLING_CRN = "crn"
+SAMPLING_ANTITHETIC = "antithetic"
+SAMPLING_LHS = "lhs"
+SAMPLING_SOBOL = "sobol"
+SAMPLING_SCHEMES = [SAMPLING_MC, SAMPLING_CRN, SAMPLING_ANTITHETIC, SAMPLING_LHS,
+      SAMPLING_SOBOL]
+
+# the largest uniform value, so that the inverse distribution functions are
+# finite
+_UNIFORM_MAX = 1.0 - np.finfo(np.float64).epsneg
+
+class StreamSampler:
+   '''
+   a sampler with an independent random number stream for each stochastic
+   entry (common random numbers). The stream of an entry is seeded from the
+   seed and the column and row names, so the value of an entry in a scenario
+   only depends on the seed, the entry and the index of the scenario. The
+   scenarios of a smaller scenario set are then the first scenarios of a
+   larger set and an entry keeps its stream if other entries are added.
+
+   Parameters
+   ----------
+   entries : StochasticEntries
+      the declaration of the random entries
+   seed : int. Default 0
+      the seed of the streams
+   '''
+
+   def __init__(self, entries, seed = 0):
+      self.keys = [(zlib.crc32(column.encode()), zlib.crc32(row.encode()))
+            for column, row in zip(entries.columns, entries.rows)]
+      self.seed = seed
+      self._generators = None
+      self._position = 0
+
+   def _stream(self, key):
+      return np.random.Generator(np.random.PCG64(
+         np.random.SeedSequence(self.seed, spawn_key = key)))
+
+   def uniforms(self, first, count):
+      '''
+      returns the (count x nentries) uniform values of the scenarios first to
+      first + count - 1
+      '''
+      # the streams are kept between calls and advanced to the first scenario.
+      # Each uniform value uses a single step of the stream.
+      if self._generators is None or first < self._position:
+         self._generators = [self._stream(key) for key in self.keys]
+         self._position = 0
+      if first > self._position:
+         for generator in self._generators:
+            generator.bit_generator.advance(first - self._position)
+
+      values = np.empty((count, len(self.keys)))
+      for j, generator in enumerate(self._generators):
+         values[:, j] = generator.random(count)
+      self._position = first + count
+
+      return values
+
+class AntitheticSampler:
+   '''
+   a sampler of antithetic pairs. The scenarios 2k and 2k + 1 use the uniform
+   values u and 1 - u, where u is drawn from the entry streams of a
+   StreamSampler.
+   '''
+
+   def __init__(self, entries, seed = 0):
+      self.streams = StreamSampler(entries, seed)
+
+   def uniforms(self, first, count):
+      firstpair = first//2
+      lastpair = (first + count - 1)//2
+      base = self.streams.uniforms(firstpair, lastpair - firstpair + 1)
+
+      scenarios = np.arange(first, first + count)
+      values = base[scenarios//2 - firstpair]
+      odd = scenarios%2 == 1
+      values[odd] = np.minimum(1.0 - values[odd], _UNIFORM_MAX)
+
+      return values
+
+# the number of rounds of the Feistel network of the strata permutations
+LHS_ROUNDS = 4
+
+def _mixBits(values):
+   '''
+   returns the splitmix64 finaliser of an array of 64 bit integers, which
+   is the round function of the strata permutations
+   '''
+   values = values ^ (values >> np.uint64(30))
+   values *= np.uint64(0xbf58476d1ce4e5b9)
+   values ^= values >> np.uint64(27)
+   values *= np.uint64(0x94d049bb133111eb)
+   values ^= values >> np.uint64(31)
+
+   return values
+
+class LatinHypercubeSampler:
+   '''
+   a Latin hypercube sampler. Each entry takes a value from each of the
+   nscenarios equally probable strata, with a random permutation of the strata
+   for each entry and a uniform position within the stratum drawn from the
+   entry stream.
+
+   The permutation of an entry is a Feistel network keyed from the seed and
+   the entry names, restricted to the nscenarios strata by cycle walking. The
+   strata of a block of scenarios are computed from the scenario indices, so
+   the memory is that of the block and not nscenarios for each entry.
+   '''
+
+   def __init__(self, entries, nscenarios, seed = 0):
+      self.streams = StreamSampler(entries, seed)
+      self.nscenarios = nscenarios
+      self.roundkeys = np.array([np.random.SeedSequence(seed,
+         spawn_key = (zlib.crc32(b"lhs"),) + key).generate_state(LHS_ROUNDS,
+            dtype = np.uint64) for key in self.streams.keys],
+         dtype = np.uint64).reshape(len(self.streams.keys), LHS_ROUNDS)
+
+      # the Feistel network permutes the values of bits bits, which are at most
+      # twice the strata, so fewer than two rounds of cycle walking are
+      # expected. The halves differ by one bit if bits is odd.
+      bits = int(nscenarios - 1).bit_length()
+      self.lowbits = bits//2
+      self.highbits = bits - self.lowbits
+
+   def _feistel(self, values, roundkeys):
+      lowmask = np.uint64((1 << self.lowbits) - 1)
+      highmask = np.uint64((1 << self.highbits) - 1)
+      high = values >> np.uint64(self.lowbits)
+      low = values & lowmask
+      for r in range(LHS_ROUNDS):
+         if r%2 == 0:
+            high = high ^ (_mixBits(low ^ roundkeys[..., r]) & highmask)
+         else:
+            low = low ^ (_mixBits(high ^ roundkeys[..., r]) & lowmask)
+
+      return (high << np.uint64(self.lowbits)) | low
+
+   def strata(self, first, count):
+      '''
+      returns the (count x nentries) strata of the scenarios first to
+      first + count - 1
+      '''
+      scenarios = np.arange(first, first + count, dtype = np.uint64)
+      strata = self._feistel(scenarios[:, None], self.roundkeys)
+
+      # the values outside of the strata are permuted again until they are
+      # strata, which keeps each permutation a bijection
+      walking = np.nonzero(strata >= np.uint64(self.nscenarios))
+      while len(walking[0]) > 0:
+         values = self._feistel(strata[walking], self.roundkeys[walking[1]])
+         strata[walking] = values
+         outside = values >= np.uint64(self.nscenarios)
+         walking = (walking[0][outside], walking[1][outside])
+
+      return strata
+
+   def uniforms(self, first, count):
+      values = self.streams.uniforms(first, count)
+      values += self.strata(first, count)
+      values /= self.nscenarios
+
+      return np.minimum(values, _UNIFORM_MAX)
+
+class SobolSampler:
+   '''
+   a scrambled Sobol sequence sampler. This requires scipy, see
+   requirements-optional.txt. The balance properties of the sequence hold for
+   a number of scenarios that is a power of 2.
+   '''
+
+   def __init__(self, entries, seed = 0):
+      try:
+         from scipy.stats import qmc
+      except ImportError:
+         raise ImportError("the Sobol sampling requires the scipy package, "\
+               "see requirements-optional.txt")
+
+      self.engine = qmc.Sobol(d = len(entries), scramble = True,
+            seed = np.random.default_rng(seed))
+      self._position = 0
+
+   def uniforms(self, first, count):
+      if first != self._position:
+         self.engine.reset()
+         self.engine.fast_forward(first)
+      self._position = first + count
+
+      return np.minimum(self.engine.random(count), _UNIFORM_MAX)
+
+def makeSampler(scheme, entries, nscenarios, seed = 0):
+   '''
+   returns the sampler of the uniform values for a sampling scheme
+
+   Parameters
+   ----------
+   scheme : string
+      the sampling scheme. SAMPLING_MC returns None, the scenarios are then
+      drawn from the random number generator
+   entries : StochasticEntries
+      the declaration of the random entries
+   nscenarios : int
+      the number of scenarios
+   seed : int. Default 0
+      the seed of the sampler
+   '''
+   assert scheme in SAMPLING_SCHEMES
+   if scheme == SAMPLING_CRN:
+      return StreamSampler(entries, seed)
+   elif scheme == SAMPLING_ANTITHETIC:
+      return AntitheticSampler(entries, seed)
+   elif scheme == SAMPLING_LHS:
+      return LatinHypercubeSampler(entries, nscenarios, seed)
+   elif scheme == SAMPLING_SOBOL:
+      return SobolSampler(entries, seed)
+
+   return None
+
+def blockScenarios(entries, blocksize = SAMPLE_BLOCK):
+   '''
+   returns the number of scenarios in a block with about blocksize values
+   '''
+   return max(1, blocksize//max(1, len(entries)))
+
+def sampleScenarios(entries, nscenarios, rng = np.random, blocksize = SAMPLE_BLOCK,
+      sampler = None, first = 0):
+   '''
+   a generator that samples the scenarios in blocks. Each block contains as
+   many scenarios as fit into blocksize values.
+
+   Parameters
+   ----------
+   entries : StochasticEntries
+      the declaration of the random entries
+   nscenarios : int
+      the number of scenarios that are sampled
+   rng : random number generator. Default np.random
+      the random number generator
+   blocksize : int. Default SAMPLE_BLOCK
+      the approximate number of values drawn for each block
+   sampler : sampler. Default None
+      the sampler of the uniform values, see makeSampler. If None, then the
+      values are drawn from rng
+   first : int. Default 0
+      the index of the first scenario in the scenario set, this is used by the
+      sampler
+
+   Yields
+   ------
+   int, numpy.ndarray
+      the index of the first scenario in the block and the
+      (nblockscenarios x nentries) array of sampled values
+   '''
+   nblockscenarios = blockScenarios(entries, blocksize)
+   for start in range(0, nscenarios, nblockscenarios):
+      count = min(nblockscenarios, nscenarios - start)
+      with profiler.phase("sampleScenarios"):
+         if sampler is None:
+            values = entries.sample(rng, count)
+         else:
+            values = entries.fromUniform(sampler.uniforms(first + start, count))
+      yield start, values
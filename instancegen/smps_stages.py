@@ -0,0 +1,115 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import numpy as np
+
+class StageIndex:
+   '''
+   the partition of the constraints and variables of a core file into the
+   stages given by the periods of the TIM file. The constraints and variables
+   of a stage are a contiguous range in the core file, starting at the
+   constraint and variable named in the period.
+
+   Parameters
+   ----------
+   constraints : list of strings
+      the constraint names in the order of the core file
+   variables : list of strings
+      the variable names in the order of the core file
+   periods : list of lists
+      the periods from the TIM file. Each entry is [stagename, varname, consname]
+
+   Attributes
+   ----------
+   names : list of strings
+      the stage names
+   rowstart : numpy.ndarray
+      the index of the first constraint of each stage. The last entry is the
+      number of constraints
+   colstart : numpy.ndarray
+      the index of the first variable of each stage. The last entry is the
+      number of variables
+   rowindex : dict
+      maps a constraint name to its index
+   colindex : dict
+      maps a variable name to its index
+   '''
+
+   def __init__(self, constraints, variables, periods):
+      self._constraints = constraints
+      self._variables = variables
+      self.names = [period[0] for period in periods]
+      self.rowindex = {cons: i for i, cons in enumerate(constraints)}
+      self.colindex = {var: i for i, var in enumerate(variables)}
+
+      # the first stage starts at the beginning of the core file, so the
+      # names given in the first period are not needed
+      rowstart = [0]
+      colstart = [0]
+      for period in periods[1:]:
+         assert period[2] in self.rowindex, \
+               "the constraint <%s> of the period <%s> is not in the core file"\
+               %(period[2], period[0])
+         assert period[1] in self.colindex, \
+               "the variable <%s> of the period <%s> is not in the core file"\
+               %(period[1], period[0])
+         rowstart.append(self.rowindex[period[2]])
+         colstart.append(self.colindex[period[1]])
+      rowstart.append(len(constraints))
+      colstart.append(len(variables))
+
+      self.rowstart = np.array(rowstart, dtype = np.int64)
+      self.colstart = np.array(colstart, dtype = np.int64)
+      assert np.all(np.diff(self.rowstart) >= 0), "the stage constraints are not in order"
+      assert np.all(np.diff(self.colstart) >= 0), "the stage variables are not in order"
+
+   @property
+   def nstages(self):
+      '''the number of stages'''
+      return len(self.names)
+
+   @property
+   def rowstages(self):
+      '''an array with the stage of each constraint'''
+      return np.repeat(np.arange(self.nstages), np.diff(self.rowstart))
+
+   @property
+   def colstages(self):
+      '''an array with the stage of each variable'''
+      return np.repeat(np.arange(self.nstages), np.diff(self.colstart))
+
+   def constraints(self, stage):
+      '''
+      returns the list of constraint names in the stage
+      '''
+      return self._constraints[self.rowstart[stage]:self.rowstart[stage + 1]]
+
+   def variables(self, stage):
+      '''
+      returns the list of variable names in the stage
+      '''
+      return self._variables[self.colstart[stage]:self.colstart[stage + 1]]
+
+   def rowStage(self, cons):
+      '''
+      returns the stage of a constraint, or None if the constraint is not in
+      the core file
+      '''
+      index = self.rowindex.get(cons)
+      if index is None:
+         return None
+
+      return int(np.searchsorted(self.rowstart, index, side = "right")) - 1
+
+   def colStage(self, var):
+      '''
+      returns the stage of a variable, or None if the variable is not in the
+      core file
+      '''
+      index = self.colindex.get(var)
+      if index is None:
+         return None
+
+      return int(np.searchsorted(self.colstart, index, side = "right")) - 1
@@ -0,0 +1,895 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+from array import array
+import hashlib
+import mmap
+import re
+import numpy as np
+from .smps_io import openFile, compression
+
+# the number of characters that are buffered before writing to the file
+WRITE_BUFFER = 1 << 22
+
+# the number of bytes that are read from the STO file at once
+READ_BLOCK = 1 << 22
+
+# the number of bytes of a mapped STO file that are scanned at once for the
+# scenario offsets
+SCAN_BLOCK = 1 << 26
+
+# the parent name of the scenarios that branch from the root
+ROOT = "ROOT"
+
+# the names of the right hand side column in the STO file
+VALIDATION_RHS_NAMES = ["RHS", "RIGHT", "RHS1"]
+
+# the tolerance of the sum of the scenario probabilities. The probabilities
+# are written with six significant digits, so the sum is not exact.
+PROBABILITY_TOLERANCE = 1e-5
+
+# the format of the scenario header line. The arguments are the scenario name,
+# the parent scenario, the probability and the period
+SCENARIO_HEADER = " SC %s      %s         %g        %s\n"
+
+# the format of the start of an entry line. The arguments are the column and
+# row name, the value is appended with "%g\n"
+ENTRY_PREFIX = "    %s      %s               "
+
+# the pattern of a scenario header line, without the line end
+SCENARIO_LINE = re.compile(r"^ SC .*$", re.MULTILINE)
+
+# the format of the scenario probabilities of a resumable STO file. The field
+# has a fixed width that holds any probability formatted by %g, so the
+# probabilities are replaced in place when scenarios are appended
+PROBABILITY_FIELD = "%-12g"
+
+# the pattern of the probability of a scenario header line of an STO file
+# that is mapped as bytes
+SCENARIO_PROBABILITY = re.compile(rb"^ SC +\S+ +\S+ +(\S+)", re.MULTILINE)
+
+class StoWriter:
+   '''
+   a buffered writer for the scenarios of an STO file. The scenarios are
+   handed to the writer as names and values, and the formatted text is
+   written to the file in large chunks.
+
+   Parameters
+   ----------
+   outfile : file object
+      the STO file
+   scenarioheader : string. Default SCENARIO_HEADER
+      the format of the scenario header line
+   buffersize : int. Default WRITE_BUFFER
+      the number of characters that are buffered before writing
+   '''
+
+   def __init__(self, outfile, scenarioheader = SCENARIO_HEADER,
+         buffersize = WRITE_BUFFER):
+      self.outfile = outfile
+      self.scenarioheader = scenarioheader
+      self.buffersize = buffersize
+      self.buffer = []
+      self.buffered = 0
+      self.nscenarios = 0
+      self.nentries = 0
+
+      # the entry prefixes of the last StochasticEntries that was written
+      self._entries = None
+      self._prefixes = None
+
+   def write(self, text):
+      '''
+      buffers text and writes the buffer if it is full
+      '''
+      self.buffer.append(text)
+      self.buffered += len(text)
+      if self.buffered >= self.buffersize:
+         self.flush()
+
+   def flush(self):
+      '''
+      writes the buffered text to the file
+      '''
+      if self.buffer:
+         self.outfile.write("".join(self.buffer))
+         self.buffer = []
+         self.buffered = 0
+
+   def writeHeader(self):
+      '''
+      writes the header of the STO file
+      '''
+      self.write("STOCH\n")
+      self.write("SCENARIOS     DISCRETE\n")
+
+   def writeEnd(self):
+      '''
+      writes the end of the STO file and flushes the buffer
+      '''
+      self.write("ENDATA")
+      self.flush()
+
+   def writeScenario(self, name, parent, probability, period, columns, rows,
+         values):
+      '''
+      writes a single scenario
+
+      Parameters
+      ----------
+      name : string
+         the scenario name
+      parent : string
+         the name of the parent scenario, ROOT for the root
+      probability : float
+         the probability of the scenario
+      period : string
+         the period in which the scenario branches from the parent
+      columns : list of strings
+         the column names of the entries
+      rows : list of strings
+         the row names of the entries
+      values : list of floats
+         the values of the entries
+      '''
+      lines = [self.scenarioheader%(name, parent, probability, period)]
+      lines.extend([(ENTRY_PREFIX + "%g\n")%(column, row, value)
+         for column, row, value in zip(columns, rows, values)])
+      self.write("".join(lines))
+      self.nscenarios += 1
+      self.nentries += len(lines) - 1
+
+   def writeSampledBlock(self, names, parents, probabilities, period, entries,
+         values):
+      '''
+      writes a block of sampled scenarios. The values that are NaN are not
+      written. Each distinct value is formatted once for the whole block.
+
+      Parameters
+      ----------
+      names : list of strings
+         the scenario names
+      parents : list of strings or string
+         the name of the parent of each scenario. A single string is used for
+         all scenarios
+      probabilities : list of floats or float
+         the probability of each scenario. A single float is used for all
+         scenarios
+      period : list of strings or string
+         the period in which each scenario branches from its parent. A single
+         string is used for all scenarios
+      entries : StochasticEntries
+         the declaration of the random entries
+      values : numpy.ndarray
+         the (nscenarios x nentries) array of sampled values
+      '''
+      prefixes = self.getPrefixes(entries)
+
+      valid = ~np.isnan(values)
+      scenidx, entryidx = np.nonzero(valid)
+      uniquevals, inverse = np.unique(values[scenidx, entryidx],
+            return_inverse = True)
+      valuestrs = ["%g\n"%value for value in uniquevals.tolist()]
+      entrylines = [prefixes[j] + valuestrs[k]
+            for j, k in zip(entryidx.tolist(), inverse.ravel().tolist())]
+
+      # the entry lines are in scenario order, so the lines of each scenario
+      # are the range between the cumulative counts
+      ends = np.cumsum(np.count_nonzero(valid, axis = 1)).tolist()
+      if isinstance(parents, str):
+         parents = [parents]*len(names)
+      periods = [period]*len(names) if isinstance(period, str) else period
+      if np.ndim(probabilities) == 0:
+         probabilities = [probabilities]*len(names)
+      else:
+         probabilities = np.asarray(probabilities).tolist()
+
+      start = 0
+      lines = []
+      for name, parent, probability, period, end in zip(names, parents,
+            probabilities, periods, ends):
+         lines.append(self.scenarioheader%(name, parent, probability, period))
+         lines.extend(entrylines[start:end])
+         start = end
+
+      self.write("".join(lines))
+      self.nscenarios += len(names)
+      self.nentries += len(entrylines)
+
+   def getPrefixes(self, entries):
+      '''
+      returns the formatted prefixes of the entry lines. The prefixes are
+      cached for the last entries that were written.
+      '''
+      if entries is not self._entries:
+         self._entries = entries
+         self._prefixes = [ENTRY_PREFIX%(column, row)
+               for column, row in zip(entries.columns, entries.rows)]
+
+      return self._prefixes
+
+class ScenarioStore:
+   '''
+   a columnar store for the scenarios of an STO file. The scenario data is
+   held in flat arrays and the names of the columns, rows and periods are
+   integer encoded.
+
+   Attributes
+   ----------
+   filename : string
+      the name of the STO file
+   names : list of strings
+      the scenario names
+   parents : numpy.ndarray
+      the index of the parent of each scenario, -1 for the root
+   probabilities : numpy.ndarray
+      the probability of each scenario
+   periods : numpy.ndarray
+      the index into periodnames of the period of each scenario
+   offsets : numpy.ndarray
+      the byte offset of the SC line of each scenario in the file. The last
+      entry is the offset of the end of the scenarios
+   entrystart : numpy.ndarray
+      the index of the first entry of each scenario. The last entry is the
+      number of entries. None if the entries were not loaded
+   entrycols : numpy.ndarray
+      the index into colnames of the column of each entry
+   entryrows : numpy.ndarray
+      the index into rownames of the row of each entry
+   entryvals : numpy.ndarray
+      the value of each entry
+   periodnames, colnames, rownames : list of strings
+      the name tables
+   '''
+
+   def __init__(self, filename = None):
+      self.filename = filename
+      self.names = []
+      self.parents = np.zeros(0, dtype = np.int32)
+      self.probabilities = np.zeros(0, dtype = np.float64)
+      self.periods = np.zeros(0, dtype = np.int32)
+      self.offsets = np.zeros(1, dtype = np.int64)
+      self.entrystart = None
+      self.entrycols = None
+      self.entryrows = None
+      self.entryvals = None
+      self.periodnames = []
+      self.colnames = []
+      self.rownames = []
+
+   def __len__(self):
+      return len(self.names)
+
+   @property
+   def nentries(self):
+      '''the number of entries, or None if the entries were not loaded'''
+      if self.entrystart is None:
+         return None
+
+      return int(self.entrystart[-1])
+
+   def getScenario(self, index):
+      '''
+      returns a scenario from the store
+
+      Returns
+      -------
+      tuple
+         the name, the parent name, the probability, the period, the list of
+         column names, the list of row names and the array of values
+      '''
+      if self.entrystart is None:
+         return self.readScenario(index)
+
+      start = self.entrystart[index]
+      end = self.entrystart[index + 1]
+      colnames = self.colnames
+      rownames = self.rownames
+      parent = self.parents[index]
+      return (self.names[index], self.names[parent] if parent >= 0 else ROOT,
+            float(self.probabilities[index]),
+            self.periodnames[self.periods[index]],
+            [colnames[col] for col in self.entrycols[start:end].tolist()],
+            [rownames[row] for row in self.entryrows[start:end].tolist()],
+            self.entryvals[start:end])
+
+   def readScenario(self, index):
+      '''
+      reads a scenario from the file using the byte offset index. Only the
+      lines of the scenario are read. The offsets of a compressed file refer
+      to the uncompressed bytes, so the file is decompressed up to the
+      scenario.
+
+      Returns
+      -------
+      tuple
+         the name, the parent name, the probability, the period, the list of
+         column names, the list of row names and the array of values
+      '''
+      assert self.filename is not None
+      with openFile(self.filename, "rb") as infile:
+         infile.seek(self.offsets[index])
+         text = infile.read(self.offsets[index + 1] - self.offsets[index])
+
+      return parseScenarioText(text)
+
+   def selectScenarios(self, indices, probabilities = None):
+      '''
+      returns a new store with a subset of the scenarios. The entries must be
+      loaded and the selected scenarios must have the root as parent.
+
+      Parameters
+      ----------
+      indices : numpy.ndarray
+         the indices of the selected scenarios
+      probabilities : numpy.ndarray. Default None
+         the probabilities of the selected scenarios. If None, then the
+         probabilities are kept
+
+      Returns
+      -------
+      ScenarioStore
+         the store of the selected scenarios. The store is not associated with
+         a file
+      '''
+      assert self.entrystart is not None
+      indices = np.asarray(indices, dtype = np.int64)
+      assert np.all(self.parents[indices] < 0)
+
+      starts = self.entrystart[indices]
+      counts = self.entrystart[indices + 1] - starts
+      entrystart = np.zeros(len(indices) + 1, dtype = np.int64)
+      np.cumsum(counts, out = entrystart[1:])
+
+      # the positions of the entries of the selected scenarios
+      positions = np.repeat(starts - entrystart[:-1], counts)\
+            + np.arange(entrystart[-1], dtype = np.int64)
+
+      store = ScenarioStore()
+      store.names = [self.names[index] for index in indices.tolist()]
+      store.parents = np.full(len(indices), -1, dtype = np.int32)
+      if probabilities is None:
+         store.probabilities = self.probabilities[indices]
+      else:
+         store.probabilities = np.asarray(probabilities, dtype = np.float64)
+      store.periods = self.periods[indices]
+      store.offsets = np.zeros(len(indices) + 1, dtype = np.int64)
+      store.entrystart = entrystart
+      store.entrycols = self.entrycols[positions]
+      store.entryrows = self.entryrows[positions]
+      store.entryvals = self.entryvals[positions]
+      store.periodnames = self.periodnames
+      store.colnames = self.colnames
+      store.rownames = self.rownames
+
+      return store
+
+   def writeStoFile(self, filename, scenarioheader = SCENARIO_HEADER):
+      '''
+      writes the scenarios of the store to an STO file
+      '''
+      with openFile(filename, "w") as outfile:
+         writer = StoWriter(outfile, scenarioheader)
+         writer.writeHeader()
+         for index in range(len(self)):
+            writer.writeScenario(*self.getScenario(index))
+         writer.writeEnd()
+
+def parseScenarioText(text):
+   '''
+   parses the text of a single scenario, starting with its SC line
+
+   Returns
+   -------
+   tuple
+      the name, the parent name, the probability, the period, the list of
+      column names, the list of row names and the array of values
+   '''
+   lines = text.split(b"\n")
+   header = lines[0].split()
+   columns = []
+   rows = []
+   values = []
+   for line in lines[1:]:
+      linelist = line.split()
+      if len(linelist) < 3:
+         continue
+      columns.append(linelist[0].decode())
+      rows.append(linelist[1].decode())
+      values.append(float(linelist[2]))
+      if len(linelist) == 5:
+         columns.append(linelist[0].decode())
+         rows.append(linelist[3].decode())
+         values.append(float(linelist[4]))
+
+   return (header[1].decode(), header[2].decode(), float(header[3]),
+         header[4].decode(), columns, rows, np.array(values, dtype = np.float64))
+
+class MappedStoFile:
+   '''
+   a memory-mapped STO file that parses scenarios on demand. The byte offsets
+   of the SC lines are found on the first access by scanning the mapped file
+   with NumPy, and only the bytes of the requested scenarios are parsed. A
+   compressed STO file can not be mapped, it is read by readStoFile.
+
+   Parameters
+   ----------
+   filename : string
+      the name of the STO file
+   '''
+
+   def __init__(self, filename):
+      assert compression(filename) is None, \
+            "a compressed STO file <%s> can not be memory-mapped"%filename
+      self.filename = filename
+      self._file = open(filename, "rb")
+      self._map = mmap.mmap(self._file.fileno(), 0, access = mmap.ACCESS_READ)
+      self._offsets = None
+
+   def __enter__(self):
+      return self
+
+   def __exit__(self, exctype, excvalue, traceback):
+      self.close()
+
+   def close(self):
+      '''
+      closes the mapping and the file
+      '''
+      if self._map is not None:
+         self._map.close()
+         self._file.close()
+         self._map = None
+
+   @property
+   def offsets(self):
+      '''
+      the byte offset of the SC line of each scenario. The last entry is the
+      offset of the end of the scenarios.
+      '''
+      if self._offsets is None:
+         self._offsets = self._scanOffsets()
+
+      return self._offsets
+
+   def _scanOffsets(self):
+      '''
+      returns the array of the byte offsets of the scenarios
+      '''
+      mapped = self._map
+      size = len(mapped)
+      pattern = np.frombuffer(b" SC ", dtype = np.uint8)
+      offsets = []
+      for start in range(0, size, SCAN_BLOCK):
+         # the block overlaps the next block by the pattern length, so that
+         # each SC line is found in exactly one block
+         count = min(SCAN_BLOCK + len(pattern), size - start)
+         data = np.frombuffer(mapped, dtype = np.uint8, count = count,
+               offset = start)
+         newlines = np.flatnonzero(data[:min(SCAN_BLOCK, count)] == ord("\n"))
+         newlines = newlines[newlines + len(pattern) < count]
+         match = np.ones(len(newlines), dtype = bool)
+         for i, byte in enumerate(pattern):
+            match &= data[newlines + 1 + i] == byte
+         offsets.append(newlines[match] + start + 1)
+         del data
+
+      offsets = np.concatenate(offsets) if offsets else np.zeros(0, dtype = np.int64)
+
+      # the scenarios end at the first line after the last scenario that does
+      # not start with a space
+      end = size
+      if len(offsets) > 0:
+         position = mapped.find(b"\n", int(offsets[-1]))
+         while 0 <= position < size - 1:
+            if mapped[position + 1:position + 2] != b" ":
+               end = position + 1
+               break
+            position = mapped.find(b"\n", position + 1)
+
+      return np.append(offsets, end).astype(np.int64)
+
+   def __len__(self):
+      return len(self.offsets) - 1
+
+   def __getitem__(self, index):
+      return self.getScenario(index)
+
+   def getScenario(self, index):
+      '''
+      parses a single scenario from the mapped file
+
+      Returns
+      -------
+      tuple
+         the name, the parent name, the probability, the period, the list of
+         column names, the list of row names and the array of values
+      '''
+      offsets = self.offsets
+      if index < 0:
+         index += len(offsets) - 1
+      return parseScenarioText(self._map[offsets[index]:offsets[index + 1]])
+
+   def getHeader(self, index):
+      '''
+      parses only the SC line of a scenario
+
+      Returns
+      -------
+      tuple
+         the name, the parent name, the probability and the period
+      '''
+      start = int(self.offsets[index])
+      end = self._map.find(b"\n", start)
+      if end < 0:
+         end = len(self._map)
+      header = self._map[start:end].split()
+
+      return (header[1].decode(), header[2].decode(), float(header[3]),
+            header[4].decode())
+
+class StoParser:
+   '''
+   a parser for the SCENARIOS DISCRETE section of an STO file. The file is read
+   in large blocks of bytes, so that the byte offset of each scenario is
+   known.
+
+   Parameters
+   ----------
+   loadentries : bool. Default True
+      if False, then only the scenario headers and the offset index are
+      stored. This bounds the memory by the number of scenarios.
+   '''
+
+   def __init__(self, loadentries = True):
+      self.loadentries = loadentries
+      self.section = None
+      self.position = 0
+      self.end = None
+
+      self.names = []
+      self.parentnames = []
+      self.probabilities = array('d')
+      self.periods = array('i')
+      self.offsets = array('q')
+      self.entrystart = array('q')
+      self.entrycols = array('i')
+      self.entryrows = array('i')
+      self.entryvals = array('d')
+      self.periodindex = {}
+      self.colindex = {}
+      self.rowindex = {}
+
+   def parse(self, infile, filename = None):
+      '''
+      parses the file object, which must be opened in binary mode, and returns
+      the ScenarioStore
+      '''
+      carry = b""
+      while True:
+         block = infile.read(READ_BLOCK)
+         if not block:
+            if carry:
+               self.parseLines([carry], False)
+            break
+
+         lines = (carry + block).split(b"\n")
+         carry = lines.pop()
+         self.parseLines(lines, True)
+
+      # the scenarios end at the first section after SCENARIOS or at the end of
+      # the file
+      self.offsets.append(self.end if self.end is not None else self.position)
+      self.entrystart.append(len(self.entryvals))
+
+      store = ScenarioStore(filename)
+      nameindex = {name: i for i, name in enumerate(self.names)}
+      store.names = self.names
+      store.parents = np.array([nameindex.get(parent, -1)
+         for parent in self.parentnames], dtype = np.int32)
+      store.probabilities = np.frombuffer(self.probabilities, dtype = np.float64)
+      store.periods = np.frombuffer(self.periods, dtype = np.int32)
+      store.offsets = np.frombuffer(self.offsets, dtype = np.int64)
+      store.periodnames = list(self.periodindex.keys())
+      if self.loadentries:
+         store.entrystart = np.frombuffer(self.entrystart, dtype = np.int64)
+         store.entrycols = np.frombuffer(self.entrycols, dtype = np.int32)
+         store.entryrows = np.frombuffer(self.entryrows, dtype = np.int32)
+         store.entryvals = np.frombuffer(self.entryvals, dtype = np.float64)
+         store.colnames = list(self.colindex.keys())
+         store.rownames = list(self.rowindex.keys())
+
+      return store
+
+   def parseLines(self, lines, newlines):
+      '''
+      parses a list of complete lines. The newlines flag states whether each
+      line was terminated by a newline.
+      '''
+      colindex = self.colindex
+      rowindex = self.rowindex
+      entrycols = self.entrycols
+      entryrows = self.entryrows
+      entryvals = self.entryvals
+      loadentries = self.loadentries
+      position = self.position
+      extra = 1 if newlines else 0
+      for line in lines:
+         linestart = position
+         position += len(line) + extra
+
+         if line[:1] != b" ":
+            if line.startswith(b"SCENARIOS"):
+               if b"DISCRETE" not in line:
+                  print("   ERROR: only DISCRETE scenarios can be read")
+               self.section = b"SCENARIOS"
+            else:
+               if self.section == b"SCENARIOS" and self.end is None:
+                  self.end = linestart
+               self.section = None
+            continue
+
+         if self.section != b"SCENARIOS":
+            continue
+
+         linelist = line.split()
+         if not linelist:
+            continue
+
+         if linelist[0] == b"SC":
+            self.offsets.append(linestart)
+            self.entrystart.append(len(entryvals))
+            self.names.append(linelist[1].decode())
+            self.parentnames.append(linelist[2].decode())
+            self.probabilities.append(float(linelist[3]))
+            period = linelist[4].decode()
+            self.periods.append(self.periodindex.setdefault(period,
+               len(self.periodindex)))
+         elif loadentries:
+            col = colindex.setdefault(linelist[0].decode(), len(colindex))
+            entrycols.append(col)
+            entryrows.append(rowindex.setdefault(linelist[1].decode(), len(rowindex)))
+            entryvals.append(float(linelist[2]))
+            if len(linelist) == 5:
+               entrycols.append(col)
+               entryrows.append(rowindex.setdefault(linelist[3].decode(), len(rowindex)))
+               entryvals.append(float(linelist[4]))
+
+      self.position = position
+
+def iterateScenarios(filename):
+   '''
+   a generator that reads the scenarios of an STO file one at a time, so that
+   only a single scenario is held in memory
+
+   Parameters
+   ----------
+   filename : string
+      the name of the STO file
+
+   Yields
+   ------
+   tuple
+      the name, the parent name, the probability, the period, the list of
+      column names, the list of row names and the list of values of a scenario
+   '''
+   scenario = None
+   insection = False
+   with openFile(filename, "r") as infile:
+      for line in infile:
+         if line[:1] != " ":
+            insection = line.startswith("SCENARIOS")
+            continue
+
+         if not insection:
+            continue
+
+         linelist = line.split()
+         if not linelist:
+            continue
+
+         if linelist[0] == "SC":
+            if scenario is not None:
+               yield scenario
+            scenario = (linelist[1], linelist[2], float(linelist[3]),
+                  linelist[4], [], [], [])
+         else:
+            columns, rows, values = scenario[4:]
+            columns.append(linelist[0])
+            rows.append(linelist[1])
+            values.append(float(linelist[2]))
+            if len(linelist) == 5:
+               columns.append(linelist[0])
+               rows.append(linelist[3])
+               values.append(float(linelist[4]))
+
+   if scenario is not None:
+      yield scenario
+
+def copyScenarios(infile, outfile, probability, scenarioheader = SCENARIO_HEADER):
+   '''
+   copies the header and the scenarios of an STO file without the ENDATA line.
+   The probability of each scenario header line is replaced, all other lines
+   are copied unchanged. The file is copied in blocks and only the header
+   lines are reformatted.
+
+   Parameters
+   ----------
+   infile : file object
+      the STO file that is copied, opened in text mode
+   outfile : file object
+      the file the scenarios are copied to
+   probability : float
+      the new probability of every scenario
+   scenarioheader : string. Default SCENARIO_HEADER
+      the format of the scenario header line that was used to write the file
+
+   Returns
+   -------
+   int
+      the number of scenarios that were copied
+   '''
+   nscenarios = 0
+   lineformat = scenarioheader.rstrip("\n")
+
+   def rewriteHeader(match):
+      nonlocal nscenarios
+      nscenarios += 1
+      linelist = match.group(0).split()
+      return lineformat%(linelist[1], linelist[2], probability, linelist[4])
+
+   # the last line of each block is held back, so that the ENDATA line is not
+   # copied and no header line is split between two blocks
+   tail = ""
+   while True:
+      text = infile.read(READ_BLOCK)
+      if not text: break
+
+      text = tail + text
+      end = text.rfind("\n", 0, len(text) - 1) + 1
+      tail = text[end:]
+      outfile.write(SCENARIO_LINE.sub(rewriteHeader, text[:end]))
+
+   if tail.strip() != "ENDATA":
+      outfile.write(SCENARIO_LINE.sub(rewriteHeader, tail))
+
+   return nscenarios
+
+def fixedProbabilityHeader(scenarioheader):
+   '''
+   returns the format of the scenario header line with the probability in a
+   fixed width field, see PROBABILITY_FIELD, or None if the format has no %g
+   probability
+   '''
+   if "%g" not in scenarioheader:
+      return None
+
+   return scenarioheader.replace("%g", PROBABILITY_FIELD, 1)
+
+def reopenStoFile(filename, probability):
+   '''
+   replaces the probability of every scenario of an uncompressed STO file in
+   place and removes the ENDATA line, so that scenarios can be appended to the
+   file. The probabilities must have been written in fixed width fields, see
+   fixedProbabilityHeader. The file is mapped and only the bytes of the
+   probabilities are written, so the existing scenarios are not copied.
+
+   Parameters
+   ----------
+   filename : string
+      the name of the STO file
+   probability : float
+      the new probability of every scenario
+
+   Returns
+   -------
+   int
+      the number of scenarios of the file
+   '''
+   field = (PROBABILITY_FIELD%probability).encode()
+   assert len(field) == len(PROBABILITY_FIELD%0.5), "the probability %g does "\
+         "not fit the probability field"%probability
+
+   nscenarios = 0
+   with open(filename, "r+b") as stofile:
+      with mmap.mmap(stofile.fileno(), 0) as mapped:
+         for match in SCENARIO_PROBABILITY.finditer(mapped):
+            mapped[match.start(1):match.start(1) + len(field)] = field
+            nscenarios += 1
+
+         end = mapped.rfind(b"ENDATA")
+         assert end >= 0, "the STO file %s has no ENDATA line"%filename
+         mapped.flush()
+
+      stofile.truncate(end)
+
+   return nscenarios
+
+def scenarioDigest(period, columns, rows, values):
+   '''
+   returns the hash of the content of a scenario, i.e. its period and its
+   entries sorted by column and row, so that the order of the entries does
+   not matter
+   '''
+   content = "\n".join(["%s %s %r"%entry
+         for entry in sorted(zip(columns, rows, values))])
+   return hashlib.blake2b(("%s\n%s"%(period, content)).encode(),
+         digest_size = 16).digest()
+
+def mergeDuplicateScenarios(filename, outfilename,
+      scenarioheader = SCENARIO_HEADER):
+   '''
+   writes the scenarios of an STO file with the identical scenarios merged
+   into the first of them, which has the sum of their probabilities. The file
+   is read twice: the first pass hashes the content of each scenario, see
+   scenarioDigest, and the second pass writes the first scenario of each
+   content. So only the hashes of the distinct scenarios are held in memory.
+
+   A scenario tree is not merged, because the scenarios that are merged may be
+   the parents of other scenarios.
+
+   Parameters
+   ----------
+   filename : string
+      the name of the STO file
+   outfilename : string
+      the name of the STO file with the merged scenarios
+   scenarioheader : string. Default SCENARIO_HEADER
+      the format of the scenario header line
+
+   Returns
+   -------
+   tuple
+      the number of scenarios that were read and the number of distinct
+      scenarios, or None if the file is a scenario tree. The file is only
+      written if there are duplicates
+   '''
+   # the first scenario and the summed probability of each content
+   firstscenario = {}
+   probabilities = {}
+   nscenarios = 0
+   for index, scenario in enumerate(iterateScenarios(filename)):
+      name, parent, probability, period, columns, rows, values = scenario
+      if parent != ROOT:
+         return None
+
+      first = firstscenario.setdefault(scenarioDigest(period, columns, rows,
+         values), index)
+      probabilities[first] = probabilities.get(first, 0.0) + probability
+      nscenarios += 1
+
+   if len(probabilities) == nscenarios:
+      return nscenarios, nscenarios
+
+   with openFile(outfilename, "w") as outfile:
+      writer = StoWriter(outfile, scenarioheader)
+      writer.writeHeader()
+      for index, scenario in enumerate(iterateScenarios(filename)):
+         if index in probabilities:
+            name, parent, probability, period, columns, rows, values = scenario
+            writer.writeScenario(name, parent, probabilities[index], period,
+                  columns, rows, values)
+      writer.writeEnd()
+
+   return nscenarios, len(probabilities)
+
+def readStoFile(filename, loadentries = True):
+   '''
+   reads the scenarios of an STO file with SCENARIOS DISCRETE
+
+   Parameters
+   ----------
+   filename : string
+      the name of the STO file
+   loadentries : bool. Default True
+      if False, then only the scenario headers and the offset index are read
+
+   Returns
+   -------
+   ScenarioStore
+      the scenarios of the STO file
+   '''
+   with openFile(filename, "rb") as infile:
+      return StoParser(loadentries).parse(infile, filename)
@@ -0,0 +1,291 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import numpy as np
+from .smps_sampling import blockScenarios, makeSampler, SAMPLING_MC
+from .smps_pipeline import ScenarioBlock
+from .smps_sto import ROOT
+
+def indexType(n):
+   '''
+   returns the smallest integer type for the indices of n nodes
+   '''
+   return np.int32 if n <= np.iinfo(np.int32).max else np.int64
+
+class ScenarioTree:
+   '''
+   a scenario tree that is stored as an array of parent indices for each
+   stage. The nodes of a stage are ordered by their parents, so the
+   descendants of a node are a contiguous range of the nodes of each later
+   stage. The leaves, i.e. the nodes of the last stage, are the scenarios.
+
+   Parameters
+   ----------
+   parents : list of numpy.ndarray
+      the parent indices of the nodes of each stage after the first. The
+      entry k of parents[s - 1] is the index in stage s - 1 of the parent of
+      node k in stage s. The first stage has the single root node
+   probabilities : list of numpy.ndarray. Default None
+      the probability of each node given its parent for each stage after the
+      first. If None, then the children of a node are equally probable
+
+   Attributes
+   ----------
+   parents : list of numpy.ndarray
+      the parent indices of the nodes of each stage, -1 for the root
+   probabilities : list of numpy.ndarray
+      the conditional probability of the nodes of each stage
+   firstleaf : list of numpy.ndarray
+      the index of the first leaf below each node of each stage
+   '''
+
+   def __init__(self, parents, probabilities = None):
+      self.parents = [np.full(1, -1, dtype = np.int32)]
+      self.probabilities = [np.ones(1)]
+      for stage, stageparents in enumerate(parents):
+         stageparents = np.asarray(stageparents)
+         nparents = len(self.parents[-1])
+         assert len(stageparents) > 0 and np.all(np.diff(stageparents) >= 0), \
+               "the nodes of stage %d are not ordered by their parents"%(stage + 1)
+         assert stageparents[0] == 0 and stageparents[-1] == nparents - 1 and \
+               np.all(np.diff(stageparents) <= 1), \
+               "a node of stage %d has no children"%stage
+
+         nchildren = np.bincount(stageparents, minlength = nparents)
+         if probabilities is None:
+            stageprobs = 1.0/nchildren[stageparents]
+         else:
+            stageprobs = np.asarray(probabilities[stage], dtype = np.float64)
+            assert np.allclose(np.bincount(stageparents, weights = stageprobs,
+               minlength = nparents), 1.0), "the probabilities of the "\
+                     "children of a node of stage %d do not sum to 1"%stage
+
+         self.parents.append(stageparents)
+         self.probabilities.append(stageprobs)
+
+      # the leaves below each node are counted from the last stage upwards
+      leafcounts = [np.ones(len(self.parents[-1]), dtype = np.int64)]
+      for stageparents in self.parents[:0:-1]:
+         leafcounts.insert(0, np.bincount(stageparents,
+            weights = leafcounts[0]).astype(np.int64))
+      self.firstleaf = [np.concatenate(([0], np.cumsum(counts)[:-1]))
+            for counts in leafcounts]
+
+   @classmethod
+   def fromBranching(cls, branching):
+      '''
+      returns the tree in which each node of a stage has the same number of
+      children
+
+      Parameters
+      ----------
+      branching : list of int
+         the number of children of each node of the stages before the last
+      '''
+      parents = []
+      nnodes = 1
+      for nchildren in branching:
+         assert nchildren >= 1, "the branching factors must be at least 1"
+         parents.append(np.repeat(np.arange(nnodes,
+            dtype = indexType(nnodes*nchildren)), nchildren))
+         nnodes *= nchildren
+
+      return cls(parents)
+
+   @property
+   def nstages(self):
+      '''the number of stages'''
+      return len(self.parents)
+
+   @property
+   def nleaves(self):
+      '''the number of leaves, i.e. the number of scenarios'''
+      return len(self.parents[-1])
+
+   def nnodes(self, stage):
+      '''
+      returns the number of nodes of a stage
+      '''
+      return len(self.parents[stage])
+
+   def ancestors(self, leaves):
+      '''
+      returns the node of each stage on the path to each leaf
+
+      Returns
+      -------
+      list of numpy.ndarray
+         the index of the node of each stage for each leaf
+      '''
+      nodes = [np.asarray(leaves)]
+      for stageparents in self.parents[:0:-1]:
+         nodes.insert(0, stageparents[nodes[0]])
+
+      return nodes
+
+   def branchStages(self, leaves, nodes):
+      '''
+      returns the stage in which each leaf branches from the leaves before
+      it. This is the first stage after the root in which the leaf is the
+      first leaf below its node, so the nodes of this and all later stages
+      are first written with the leaf.
+      '''
+      branch = np.full(len(leaves), self.nstages - 1)
+      for stage in range(self.nstages - 2, 0, -1):
+         branch[self.firstleaf[stage][nodes[stage]] == leaves] = stage
+
+      return branch
+
+   def parentLeaves(self, leaves, nodes, branch):
+      '''
+      returns the leaf from which each leaf branches, -1 for the leaves that
+      branch in the first random stage. These leaves only share the root,
+      which is not random, so their parent is the root. The parent leaf of the
+      other leaves is the first leaf below the node of the stage before the
+      branch stage, so the leaves share the nodes up to that stage.
+      '''
+      parentleaves = np.full(len(leaves), -1, dtype = np.int64)
+      for stage in range(2, self.nstages):
+         branched = branch == stage
+         parentleaves[branched] = \
+               self.firstleaf[stage - 1][nodes[stage - 1][branched]]
+      parentleaves[parentleaves == leaves] = -1
+
+      return parentleaves
+
+   def leafProbabilities(self, nodes):
+      '''
+      returns the probability of each leaf, i.e. the product of the
+      conditional probabilities of the nodes on its path
+      '''
+      probabilities = np.ones(len(nodes[0]))
+      for stage in range(1, self.nstages):
+         probabilities *= self.probabilities[stage][nodes[stage]]
+
+      return probabilities
+
+def entryStages(entries, stages):
+   '''
+   returns the stage of each stochastic entry. The stage of an entry is the
+   later of the stages of its row and its column. The entries of the first
+   stage are moved to the second stage, because the root is not random.
+
+   Parameters
+   ----------
+   entries : StochasticEntries
+      the declaration of the random entries
+   stages : StageIndex
+      the stages of the core file
+   '''
+   entrystages = np.ones(len(entries), dtype = np.int64)
+   for i, (column, row) in enumerate(zip(entries.columns, entries.rows)):
+      rowstage = stages.rowStage(row)
+      colstage = stages.colStage(column)
+      entrystages[i] = max(rowstage or 0, colstage or 0, 1)
+
+   return entrystages
+
+class CoreFill:
+   '''
+   a transform stage for the blocks of a scenario tree that writes the core
+   value of the entries that are missing from a scenario with a parent. The
+   entries that a scenario does not list from its branch stage onwards are
+   taken from its parent in the STO file, but a missing sampled value, e.g.
+   of a Sparse distribution or the Delta stage, stands for the core value.
+   The stage must be the last transform.
+
+   Parameters
+   ----------
+   corevalues : numpy.ndarray
+      the core value of each stochastic entry
+   entrystages : numpy.ndarray
+      the stage of each entry, see entryStages
+   periods : list of strings
+      the period name of each stage
+   '''
+
+   def __init__(self, corevalues, entrystages, periods):
+      self.corevalues = np.asarray(corevalues, dtype = np.float64)
+      self.entrystages = np.asarray(entrystages)
+      self.stageindex = {period: stage for stage, period in enumerate(periods)}
+
+   def __call__(self, block):
+      branch = np.array([self.stageindex[period] for period in block.period])
+      inherits = np.array([parent != ROOT for parent in block.parents])
+      fill = inherits[:, None] & (self.entrystages[None, :] >= branch[:, None])\
+            & np.isnan(block.values)
+      block.values = np.where(fill, self.corevalues[None, :], block.values)
+      return block
+
+def treeScenarioBlocks(tree, entries, entrystages, periods, rng = np.random,
+      scheme = SAMPLING_MC, seed = 0, blocksize = None):
+   '''
+   a generator that is the source of the scenario pipeline for a scenario
+   tree. The leaves are yielded in blocks of scenarios. Each scenario has the
+   leaf from which it branches as its parent and only holds the entries of
+   the nodes from its branch stage onwards, so the entries of a node are
+   written once for all scenarios below it.
+
+   Parameters
+   ----------
+   tree : ScenarioTree
+      the scenario tree
+   entries : StochasticEntries
+      the declaration of the random entries
+   entrystages : numpy.ndarray
+      the stage of each entry, see entryStages
+   periods : list of strings
+      the period name of each stage
+   rng : random number generator. Default np.random
+      the random number generator of SAMPLING_MC
+   scheme : string. Default SAMPLING_MC
+      the sampling scheme. The samplers of the other schemes are indexed by
+      the node of each stage, so the values of a node only depend on the seed
+      and the index of the node
+   seed : int. Default 0
+      the seed of the samplers
+   blocksize : int. Default None
+      the number of scenarios in each block. If None, then the blocks hold
+      about SAMPLE_BLOCK values
+   '''
+   assert len(periods) >= tree.nstages
+   stageindices = [np.flatnonzero(entrystages == stage)
+         for stage in range(tree.nstages)]
+   stageentries = [entries.select(indices) if len(indices) > 0 else None
+         for indices in stageindices]
+   samplers = [makeSampler(scheme, stageentries[stage], tree.nnodes(stage), seed)
+         if stageentries[stage] is not None else None
+         for stage in range(tree.nstages)]
+
+   if blocksize is None:
+      blocksize = blockScenarios(entries)
+   for first in range(0, tree.nleaves, blocksize):
+      leaves = np.arange(first, min(first + blocksize, tree.nleaves))
+      nodes = tree.ancestors(leaves)
+      branch = tree.branchStages(leaves, nodes)
+      parentleaves = tree.parentLeaves(leaves, nodes, branch)
+
+      # the nodes that are first written in this block are the nodes of the
+      # scenarios that branch in or before their stage. These are consecutive
+      # nodes, one for each such scenario.
+      values = np.full((len(leaves), len(entries)), np.nan)
+      for stage in range(1, tree.nstages):
+         rows = np.flatnonzero(branch <= stage)
+         if stageentries[stage] is None or len(rows) == 0:
+            continue
+
+         firstnode = int(nodes[stage][rows[0]])
+         if samplers[stage] is None:
+            stagevalues = stageentries[stage].sample(rng, len(rows))
+         else:
+            stagevalues = stageentries[stage].fromUniform(
+                  samplers[stage].uniforms(firstnode, len(rows)))
+         values[np.ix_(rows, stageindices[stage])] = stagevalues
+
+      names = ["SCEN%d"%(leaf + 1) for leaf in leaves.tolist()]
+      parents = [ROOT if parent < 0 else "SCEN%d"%(parent + 1)
+            for parent in parentleaves.tolist()]
+      yield ScenarioBlock(names, parents, tree.leafProbabilities(nodes),
+            [periods[stage] for stage in branch.tolist()], entries, values)
@@ -0,0 +1,191 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import json
+import numpy as np
+from .smps_profile import profiler
+from .smps_sto import readStoFile, VALIDATION_RHS_NAMES, PROBABILITY_TOLERANCE
+
+# the number of examples of each error in the report
+VALIDATION_EXAMPLES = 10
+
+def nameIndices(names, index):
+   '''
+   returns the index of each name of a name table in a core name index, -1 for
+   the names that are not in the core. The name tables of the STO file only
+   hold the distinct names, so the entries are mapped by indexing the result.
+   '''
+   return np.array([index.get(name, -1) for name in names], dtype = np.int64)
+
+def errorExamples(mask, *columns):
+   '''
+   returns the number of errors and the first VALIDATION_EXAMPLES of them
+
+   Parameters
+   ----------
+   mask : numpy.ndarray
+      the errors
+   columns : tuples of a list of strings and a numpy.ndarray
+      the name table and the index into the table of each element of the mask
+      for each column of the examples
+   '''
+   positions = np.flatnonzero(mask)
+   examples = [[table[indices[position]] for table, indices in columns]
+         for position in positions[:VALIDATION_EXAMPLES].tolist()]
+
+   return {"count": int(len(positions)), "examples": examples}
+
+def validateStoFile(instance, store = None, rhsnames = VALIDATION_RHS_NAMES):
+   '''
+   validates the scenarios of an STO file against the core and TIM files of an
+   instance. The names of the STO file are integer encoded by the StoParser,
+   so each name table is mapped to the core once and the checks are vectorised
+   over the entries.
+
+   The report contains the entries with a column or row that is not in the
+   core file, the scenarios with a period that is not in the TIM file, the
+   entries of a stage before the period of their scenario, the sum of the
+   probabilities, the scenario names that are repeated and the entries that
+   are repeated in a scenario.
+
+   Parameters
+   ----------
+   instance : Instance
+      the instance with the core file and, optionally, the TIM file read
+   store : ScenarioStore. Default None
+      the scenarios. If None, then the scenarios of the instance are used, or
+      the STO file of the instance is read
+   rhsnames : list of strings. Default VALIDATION_RHS_NAMES
+      the names of the right hand side column
+
+   Returns
+   -------
+   dict
+      the report, which can be written as JSON
+   '''
+   if store is None:
+      store = instance.scenarios
+   if store is None or store.entrystart is None:
+      assert instance.stofile is not None
+      with profiler.phase("readStoFile"):
+         store = readStoFile(instance.stofile)
+
+   with profiler.phase("validateStoFile"):
+      nscenarios = len(store)
+      staged = len(instance.periods) > 0
+
+      # the stage of each core row and column. The free rows, e.g. the
+      # objective, and the right hand side have no stage, i.e. -1. The
+      # unknown names are -2, so that they are not reported twice
+      rowindex = {cons: i for i, cons in enumerate(instance.constraints)}
+      freerows = [row for row, rowtype in instance.rowtypes.items()
+            if rowtype == "N"]
+      freerows += [row for row in instance.getCoefficientMatrix().rownames
+            if row not in rowindex]
+      rowindex.update({row: len(instance.constraints) for row in freerows})
+      colindex = {var: i for i, var in enumerate(instance.variables)}
+      colindex.update({name: len(instance.variables) for name in rhsnames})
+      if staged:
+         rowstages = np.append(instance.stages.rowstages, [-1, -2])
+         colstages = np.append(instance.stages.colstages, [-1, -2])
+      else:
+         rowstages = np.append(np.zeros(len(instance.constraints),
+            dtype = np.int64), [-1, -2])
+         colstages = np.append(np.zeros(len(instance.variables),
+            dtype = np.int64), [-1, -2])
+
+      entryrows = nameIndices(store.rownames, rowindex)[store.entryrows]
+      entrycols = nameIndices(store.colnames, colindex)[store.entrycols]
+      unknownrows = entryrows < 0
+      unknowncols = entrycols < 0
+      scenarios = np.repeat(np.arange(nscenarios), np.diff(store.entrystart))
+      names = store.names
+
+      report = {"stofile": store.filename,
+            "scenarios": nscenarios,
+            "entries": store.nentries}
+      report["unknowncolumns"] = errorExamples(unknowncols, (names, scenarios),
+            (store.colnames, store.entrycols))
+      report["unknownrows"] = errorExamples(unknownrows, (names, scenarios),
+            (store.rownames, store.entryrows))
+
+      # the stage of an entry is the later of the stages of its row and
+      # column and must not be before the period of its scenario
+      if staged:
+         periodstages = nameIndices(store.periodnames,
+               {name: stage for stage, name in enumerate(instance.stages.names)})
+         scenariostages = periodstages[store.periods]
+         report["unknownperiods"] = errorExamples(scenariostages < 0,
+               (names, np.arange(nscenarios)), (store.periodnames, store.periods))
+
+         entrystages = np.maximum(rowstages[entryrows], colstages[entrycols])
+         earlier = ~unknownrows & ~unknowncols & \
+               (entrystages < scenariostages[scenarios])
+         report["stages"] = errorExamples(earlier, (names, scenarios),
+               (store.colnames, store.entrycols),
+               (store.rownames, store.entryrows))
+
+      total = float(np.sum(store.probabilities))
+      report["probabilities"] = {"sum": total,
+            "negative": int(np.count_nonzero(store.probabilities < 0)),
+            "valid": bool(abs(total - 1.0) <= PROBABILITY_TOLERANCE and
+               np.all(store.probabilities >= 0))}
+
+      uniquenames, namecounts = np.unique(np.array(names, dtype = object),
+            return_counts = True)
+      repeated = namecounts > 1
+      report["duplicatescenarios"] = {"count": int(np.count_nonzero(repeated)),
+            "examples": uniquenames[repeated][:VALIDATION_EXAMPLES].tolist()}
+
+      # the entries of a scenario are sorted by scenario, column and row, so a
+      # repeated entry follows its first occurrence
+      order = np.lexsort((store.entryrows, store.entrycols, scenarios))
+      repeats = np.zeros(len(order), dtype = bool)
+      repeats[1:] = (np.diff(scenarios[order]) == 0) & \
+            (np.diff(store.entrycols[order]) == 0) & \
+            (np.diff(store.entryrows[order]) == 0)
+      report["duplicateentries"] = errorExamples(repeats,
+            (names, scenarios[order]), (store.colnames, store.entrycols[order]),
+            (store.rownames, store.entryrows[order]))
+
+      report["valid"] = bool(all(report[key]["count"] == 0 for key in
+            ["unknowncolumns", "unknownrows", "unknownperiods", "stages",
+               "duplicatescenarios", "duplicateentries"] if key in report)
+               and report["probabilities"]["valid"])
+
+   return report
+
+def writeValidationReport(report, filename = None):
+   '''
+   prints the errors of a validation and, optionally, writes the report as
+   JSON
+   '''
+   print("%d scenarios, %d entries"%(report["scenarios"], report["entries"]))
+
+   messages = {"unknowncolumns": "entries have a column that is not in the "\
+            "core file",
+         "unknownrows": "entries have a row that is not in the core file",
+         "unknownperiods": "scenarios have a period that is not in the TIM file",
+         "stages": "entries are in a stage before the period of their scenario",
+         "duplicatescenarios": "scenario names are repeated",
+         "duplicateentries": "entries are repeated in their scenario"}
+   for key, message in messages.items():
+      if key in report and report[key]["count"] > 0:
+         examples = ["/".join(example) if isinstance(example, list) else example
+               for example in report[key]["examples"]]
+         print("   ERROR: %d %s, e.g. %s"%(report[key]["count"], message,
+            ", ".join(examples)))
+
+   probabilities = report["probabilities"]
+   if not probabilities["valid"]:
+      print("   ERROR: the probabilities sum to %.8g and %d are negative"\
+            %(probabilities["sum"], probabilities["negative"]))
+
+   if report["valid"]:
+      print("The STO file is valid")
+
+   if filename is not None:
+      with open(filename, "w") as outfile:
+         json.dump(report, outfile, indent = 2)
@@ -0,0 +1,51 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import sys
+import time
+import argparse
+import instancegen as ig
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(
+         description = "computes the statistics and the stage structure of a "\
+               "core file and, optionally, its TIM file")
+   parser.add_argument("corfile",
+         help = "the core file")
+   parser.add_argument("timfile", nargs = "?", default = None,
+         help = "the TIM file. Without a TIM file, all rows and columns are in "\
+               "a single stage")
+   parser.add_argument("--output", default = None,
+         help = "writes the report as JSON to the given file")
+   parser.add_argument("--cache", action = "store_true",
+         help = "reads the core file from its binary cache")
+   args = parser.parse_args()
+
+   print("Arguments:", sys.argv)
+
+   corfile = ig.findFile(args.corfile)
+   if corfile is None:
+      print("   ERROR: The core file %s does not exist"%args.corfile)
+      exit(1)
+
+   timfile = None
+   if args.timfile is not None:
+      timfile = ig.findFile(args.timfile)
+      if timfile is None:
+         print("   ERROR: The TIM file %s does not exist"%args.timfile)
+         exit(1)
+
+   start = time.perf_counter()
+   instance = ig.Instance(corfile, timfile, compact = True)
+   instance.readInstance(readCor = True, readTim = timfile is not None,
+         cache = args.cache)
+   readtime = time.perf_counter() - start
+
+   start = time.perf_counter()
+   report = ig.analyseInstance(instance)
+   print("Read the instance in %.2fs and analysed it in %.2fs"%(readtime,
+      time.perf_counter() - start))
+
+   ig.writeAnalysisReport(report, args.output)
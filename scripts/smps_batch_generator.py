@@ -0,0 +1,58 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import sys
+import os.path
+import argparse
+import instancegen as ig
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(
+         description = "generates the STO and SMPS files for all instances, "\
+               "scenario counts and stochasticity types of a manifest")
+   parser.add_argument("manifest",
+         help = "a JSON list of objects with the keys class, instance, "\
+               "scenarios and types")
+   parser.add_argument("--workers", type = int, default = 1,
+         help = "the number of worker processes (default 1)")
+   parser.add_argument("--outdir", default = None,
+         help = "the directory of the output files (default next to the core files)")
+   parser.add_argument("--cache", action = "store_true",
+         help = "reads the core files from their binary cache")
+   parser.add_argument("--report", default = None,
+         help = "writes the time and bytes of each output file to a JSON file")
+   parser.add_argument("--delta", action = "store_true",
+         help = "only writes the scenario entries that differ from the core files")
+   parser.add_argument("--compress", choices = ["gz", "bz2", "xz", "zst"],
+         default = None,
+         help = "compresses the STO files with the given codec")
+   parser.add_argument("--profile", nargs = "?", const = "1", default = None,
+         help = "reports the time of each phase and the counters of the main "\
+               "process. If a file name is given, then the report is written as "\
+               "JSON, or as a cProfile dump if the name ends with .prof")
+   args = parser.parse_args()
+
+   if args.profile is not None:
+      ig.enableProfiling(args.profile)
+
+   print("Arguments:", sys.argv)
+
+   jobs = ig.readManifest(args.manifest)
+
+   # verifying the inputs of all jobs before generating any file
+   valid = True
+   for instanceclass, instancename, numscenarios, stochtype in jobs:
+      valid = ig.validInputs(instanceclass, instancename, ["cor", "tim"],
+            numscenarios, stochtype) and valid
+   if not valid:
+      exit(1)
+
+   compress = None
+   if args.compress is not None:
+      compress = "." + args.compress
+   results = ig.runBatch(jobs, ig.instances, args.workers, args.outdir,
+         args.cache, compress, args.delta)
+
+   ig.writeBatchReport(results, args.report)
@@ -0,0 +1,66 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import sys
+import os.path
+import glob
+import tempfile
+import instancegen as ig
+import instancegen.smps_benchmark as benchmark
+
+def readByLine(corfile):
+   instance = ig.Instance(corfile)
+   instance.readCorFileByLine()
+   return instance
+
+def readBlocks(corfile, compact = False):
+   instance = ig.Instance(corfile, compact = compact)
+   instance.readCorFile()
+   return instance
+
+def sameInstance(instance, other):
+   return instance.constraints == other.constraints\
+         and instance.variables == other.variables\
+         and instance.rhs == other.rhs\
+         and instance.coeffs == dict(other.coeffs.items())
+
+if __name__ == "__main__":
+   # printing the help message
+   if len(sys.argv) == 2 and sys.argv[1] == "--help":
+      print("Usage: %s [scale-factors] [core-files]"%sys.argv[0])
+      print("  scale-factors : comma separated scale factors for the synthetic cores (default 1,10,100)")
+      print("  core-files    : the core files that are read (default examples/*.cor)")
+      exit(1)
+
+   factors = [1, 10, 100]
+   if len(sys.argv) >= 2:
+      factors = [int(factor) for factor in sys.argv[1].split(",")]
+
+   corfiles = sys.argv[2:]
+   if len(corfiles) == 0:
+      corfiles = sorted(glob.glob(os.path.join("examples", "*.cor")))
+
+   print("%-30s %6s %10s %10s %10s %10s %8s %6s"%("instance", "scale", "nonzeros",
+      "byline(s)", "dict(s)", "compact(s)", "speedup", "equal"))
+   with tempfile.TemporaryDirectory() as tmpdir:
+      for corfile in corfiles:
+         for factor in factors:
+            scaledfile = corfile
+            if factor > 1:
+               scaledfile = os.path.join(tmpdir, "scaled.cor")
+               benchmark.writeScaledCorFile(corfile, scaledfile, factor)
+
+            repeat = 3 if factor < 100 else 1
+            linetime, lineinstance = benchmark.timeCall(lambda: readByLine(scaledfile), repeat)
+            dicttime, dictinstance = benchmark.timeCall(lambda: readBlocks(scaledfile), repeat)
+            compacttime, compactinstance = benchmark.timeCall(
+                  lambda: readBlocks(scaledfile, True), repeat)
+
+            equal = sameInstance(lineinstance, dictinstance)\
+                  and sameInstance(lineinstance, compactinstance)
+
+            print("%-30s %6d %10d %10.3f %10.3f %10.3f %8.2f %6s"%(
+               os.path.basename(corfile), factor, len(lineinstance.coeffs),
+               linetime, dicttime, compacttime, linetime/dicttime, equal))
@@ -0,0 +1,69 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import sys
+import os.path
+import argparse
+import instancegen as ig
+import instancegen.smps_benchmark as benchmark
+
+# the benchmarked instances as (instance class, core file, TIM file)
+EXAMPLES = [
+      ("sslp", "sslp_5_25_50.cor", "sslp_5_25_50.tim"),
+      ("noswot", "noswot.cor", None),
+      ("snip", "snip3-inst0-budget30.cor", None),
+      ("rrtailassign", None, "qf_rrtailassign_0.tim")]
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(
+         description = "times reading the core and TIM files and writing the "\
+               "TIM and STO files of the examples and of synthetic cores with "\
+               "multiple copies of each example")
+   parser.add_argument("--examples", default = "examples",
+         help = "the directory of the example files (default examples)")
+   parser.add_argument("--scales", default = "1,10,100,1000",
+         help = "comma separated scale factors of the synthetic cores "\
+               "(default 1,10,100,1000)")
+   parser.add_argument("--scenarios", type = int, default = 100,
+         help = "the number of scenarios of the STO files (default 100)")
+   parser.add_argument("--repeat", type = int, default = 1,
+         help = "the number of calls of each phase, the shortest time is "\
+               "reported (default 1)")
+   parser.add_argument("--output", default = None,
+         help = "writes the results to a JSON file")
+   parser.add_argument("--label", default = None,
+         help = "a label of the run that is stored in the JSON file, e.g. the "\
+               "version")
+   parser.add_argument("--compare", default = None,
+         help = "a previous JSON file. The phases that are slower than in the "\
+               "previous run are reported")
+   parser.add_argument("--tolerance", type = float, default = 0.1,
+         help = "the relative slowdown that is reported by --compare "\
+               "(default 0.1)")
+   args = parser.parse_args()
+
+   print("Arguments:", sys.argv)
+
+   cases = []
+   for classname, corfile, timfile in EXAMPLES:
+      if corfile is not None:
+         corfile = os.path.join(args.examples, corfile)
+      if timfile is not None:
+         timfile = os.path.join(args.examples, timfile)
+      cases.append((classname, ig.instances[classname], corfile, timfile))
+
+   scales = [int(scale) for scale in args.scales.split(",")]
+
+   print("%-30s %6s %-20s %10s %10s %s"%("instance", "scale", "phase",
+      "seconds", "peak(MB)", "rate"))
+   results = benchmark.runBenchmarks(cases, scales, args.scenarios, ig.STOCH_TYPES,
+         args.repeat)
+
+   if args.output is not None:
+      benchmark.writeBenchmarkReport(results, args.output, args.label)
+
+   if args.compare is not None:
+      nslower = benchmark.compareBenchmarkReport(results, args.compare, args.tolerance)
+      print("%d phases are slower than in %s"%(nslower, args.compare))
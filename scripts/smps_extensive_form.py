@@ -0,0 +1,42 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import sys
+import time
+import argparse
+import instancegen as ig
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(
+         description = "writes the extensive form (deterministic equivalent) of "\
+               "a two-stage instance in SMPS format as an MPS file")
+   parser.add_argument("corfile",
+         help = "the core file")
+   parser.add_argument("timfile",
+         help = "the TIM file")
+   parser.add_argument("stofile",
+         help = "the STO file")
+   parser.add_argument("mpsfile",
+         help = "the MPS file. It is compressed if the name ends with .gz, .bz2, "\
+               ".xz or .zst")
+   parser.add_argument("--cache", action = "store_true",
+         help = "reads the core file from its binary cache")
+   args = parser.parse_args()
+
+   print("Arguments:", sys.argv)
+
+   files = [ig.findFile(filename) for filename in [args.corfile, args.timfile,
+      args.stofile]]
+   for filename, found in zip([args.corfile, args.timfile, args.stofile], files):
+      if found is None:
+         print("   ERROR: The file %s does not exist"%filename)
+         exit(1)
+
+   instance = ig.Instance(*files, compact = True)
+   instance.readInstance(readCor = True, readTim = True, cache = args.cache)
+
+   start = time.perf_counter()
+   instance.writeExtensiveForm(args.mpsfile)
+   print("Wrote the extensive form in %.2fs"%(time.perf_counter() - start))
@@ -5,29 +5,81 @@ The MIT License (MIT)
 """
 import sys
 import os.path
+import argparse
+import numpy as np
 import instancegen as ig
 
 if __name__ == "__main__":
-   # printing the help message
-   if (len(sys.argv) == 2 and sys.argv[1] == "--help")\
-         or len(sys.argv) < 4 or len(sys.argv) == 1:
-      print("Usage: %s instance-class instance-name numscenarios [type]"%sys.argv[0])
-      print("  instance-class : the instance class. Available classes (%s)"%", ".join(map(str, ig.instances.keys())))
-      print("  instance-name  : the name of the instance (without extension)")
-      print("  numscenarios   : the number of scenarios to generate")
-      print("  type           : the type of stochasticity. Available types (%s) (default %s)"\
-                  %(", ".join(map(str, ig.STOCH_TYPES)), str(ig.STOCH_TYPES[0])))
-      exit(1)
+   parser = argparse.ArgumentParser(
+         description = "generates the STO and SMPS files for an instance")
+   parser.add_argument("instanceclass", metavar = "instance-class",
+         help = "the instance class. Available classes (%s)"\
+               %", ".join(map(str, ig.instances.keys())))
+   parser.add_argument("instancename", metavar = "instance-name",
+         help = "the name of the instance (without extension)")
+   parser.add_argument("numscenarios",
+         help = "the number of scenarios to generate")
+   parser.add_argument("stochtype", metavar = "type", nargs = "?",
+         default = ig.STOCH_RHS,
+         help = "the type of stochasticity. Available types (%s) (default %s)"\
+               %(", ".join(map(str, ig.STOCH_TYPES)), str(ig.STOCH_TYPES[0])))
+   parser.add_argument("--workers", type = int, default = None,
+         help = "generates the scenarios in blocks over the given number of "\
+               "processes. The output does not depend on the number of workers")
+   parser.add_argument("--cache", action = "store_true",
+         help = "reads the core file from a binary cache next to the core "\
+               "file. The cache is rebuilt if the core file has changed")
+   parser.add_argument("--scheme", choices = ig.SAMPLING_SCHEMES,
+         default = ig.SAMPLING_MC,
+         help = "the sampling scheme: Monte Carlo from np.random (mc), common "\
+               "random numbers with a stream for each entry (crn), antithetic "\
+               "pairs (antithetic), Latin hypercube (lhs) or scrambled Sobol "\
+               "(sobol, requires scipy) (default %s)"%ig.SAMPLING_MC)
+   parser.add_argument("--seed", type = int, default = 0,
+         help = "the seed of the sampling schemes other than mc (default 0)")
+   parser.add_argument("--delta", action = "store_true",
+         help = "only writes the scenario entries that differ from the core "\
+               "file and prints the compression ratio")
+   parser.add_argument("--tree", default = None, metavar = "B1,B2,...",
+         help = "generates a scenario tree over all stages of the TIM file with "\
+               "the given number of branches for each stage after the first. "\
+               "The number of scenarios must be the product of the branches. "\
+               "It can not be used with --workers, --resumable, --append or "\
+               "--dedup")
+   parser.add_argument("--resumable", action = "store_true",
+         help = "writes the state of the random number generators to a resume "\
+               "file next to the STO file, so that the file can be extended "\
+               "with --append")
+   parser.add_argument("--append", type = int, default = None, metavar = "N",
+         help = "extends the resumable STO file <instance>_<N>.sto to the "\
+               "number of scenarios. The first N scenarios are copied and only "\
+               "the new scenarios are generated")
+   parser.add_argument("--dedup", action = "store_true",
+         help = "merges the identical scenarios into one scenario with the sum "\
+               "of their probabilities")
+   parser.add_argument("--overlapped", action = "store_true",
+         help = "writes and compresses the STO file in a writer thread while "\
+               "the scenarios are generated")
+   parser.add_argument("--compress", choices = ["gz", "bz2", "xz", "zst"],
+         default = None,
+         help = "compresses the STO file, which is named <instance>_<n>.sto.<compress>. "\
+               "zst requires the zstandard package and compresses with all cores")
+   parser.add_argument("--profile", nargs = "?", const = "1", default = None,
+         help = "reports the time of each phase and the counters. If a file "\
+               "name is given, then the report is written as JSON, or as a "\
+               "cProfile dump if the name ends with .prof")
+   args = parser.parse_args()
+
+   if args.profile is not None:
+      ig.enableProfiling(args.profile)
 
    print("Arguments:", sys.argv)
 
-   instanceclass = sys.argv[1]
-   instancename = sys.argv[2]
+   instanceclass = args.instanceclass
+   instancename = args.instancename
    extensions = ["cor", "tim"]
-   numscenarios = sys.argv[3]
-   stochtype = ig.STOCH_RHS
-   if len(sys.argv) == 5:
-      stochtype = sys.argv[4]
+   numscenarios = args.numscenarios
+   stochtype = args.stochtype
 
    # verifying the inputs for the script
    if not ig.validInputs(instanceclass, instancename, extensions, numscenarios,
@@ -35,15 +87,49 @@ if __name__ == "__main__":
       exit(1)
 
    # initialising the instance
+   # the core and TIM files may be compressed
+   stofile = "%s_%s.sto"%(instancename, numscenarios)
+   if args.compress is not None:
+      stofile = "%s.%s"%(stofile, args.compress)
    instance = ig.instances[instanceclass](
-         "%s.cor"%(instancename),"%s.tim"%(instancename),
-         "%s_%s.sto"%(instancename, numscenarios))
+         ig.findFile("%s.cor"%(instancename)),
+         ig.findFile("%s.tim"%(instancename)), stofile)
 
    # reading the instance core and time-stages files
-   instance.readInstance(readCor = True, readTim = True)
+   instance.readInstance(readCor = True, readTim = True, cache = args.cache)
 
    # writing the stochastic file
-   instance.writeStoFile(int(numscenarios), stochtype)
+   if args.tree is not None:
+      branching = [int(branches) for branches in args.tree.split(",")]
+      if int(np.prod(branching)) != int(numscenarios):
+         print("   ERROR: The number of scenarios %s is not the product of the "\
+               "branches %s"%(numscenarios, args.tree))
+         exit(1)
+      # the scenario tree is written serially and can not be appended or
+      # merged, because its scenarios are the parents of other scenarios
+      unsupported = [option for option, used in [("--workers",
+         args.workers is not None), ("--resumable", args.resumable),
+         ("--append", args.append is not None), ("--dedup", args.dedup)] if used]
+      if unsupported:
+         print("   ERROR: The options %s can not be used with --tree"\
+               %", ".join(unsupported))
+         exit(1)
+      instance.writeScenarioTree(branching, stochtype, delta = args.delta,
+            scheme = args.scheme, seed = args.seed, overlapped = args.overlapped)
+   elif args.append is not None:
+      # the type, scheme and seed of the appended file are in its resume file
+      appendfile = ig.findFile("%s_%d.sto"%(instancename, args.append))
+      if appendfile is None:
+         print("   ERROR: The STO file %s_%d.sto does not exist"\
+               %(instancename, args.append))
+         exit(1)
+      instance.appendStoFile(int(numscenarios), appendfile,
+            nworkers = args.workers, overlapped = args.overlapped)
+   else:
+      instance.writeStoFile(int(numscenarios), stochtype, nworkers = args.workers,
+            delta = args.delta, scheme = args.scheme, seed = args.seed,
+            resumable = args.resumable, overlapped = args.overlapped,
+            dedup = args.dedup)
 
    # writing the SMPS file (used by SCIP).
    instance.writeSmpsFile()
@@ -0,0 +1,57 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import sys
+import time
+import argparse
+import numpy as np
+import instancegen as ig
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(
+         description = "reduces the scenarios of an STO file to a number of "\
+               "representative scenarios with adjusted probabilities")
+   parser.add_argument("stofile",
+         help = "the STO file with the scenarios that are reduced")
+   parser.add_argument("numscenarios", type = int,
+         help = "the number of representative scenarios")
+   parser.add_argument("outfile",
+         help = "the STO file of the representative scenarios")
+   parser.add_argument("--method", choices = ig.REDUCTION_METHODS,
+         default = ig.REDUCTION_FORWARD,
+         help = "the reduction method, forward selection or k-means "\
+               "clustering (default %s)"%ig.REDUCTION_FORWARD)
+   parser.add_argument("--core", default = None,
+         help = "the core file. An entry that is missing from a scenario takes "\
+               "its core value, otherwise it is 0")
+   parser.add_argument("--candidates", type = int, default = ig.FORWARD_CANDIDATES,
+         help = "the maximum number of candidate scenarios of the forward "\
+               "selection. Larger sets are represented by a random sample of "\
+               "candidates (default %d)"%ig.FORWARD_CANDIDATES)
+   parser.add_argument("--seed", type = int, default = 0,
+         help = "the seed of the reduction (default 0)")
+   args = parser.parse_args()
+
+   print("Arguments:", sys.argv)
+
+   if args.numscenarios <= 0:
+      print("   ERROR: The number of scenarios must be greater than 0")
+      exit(1)
+
+   instance = ig.Instance(args.core, stofile = args.stofile)
+   if args.core is not None:
+      instance.readCorFile()
+   instance.readStoFile()
+
+   options = {"rng": np.random.default_rng(args.seed)}
+   if args.method == ig.REDUCTION_FORWARD:
+      options["ncandidates"] = args.candidates
+
+   start = time.perf_counter()
+   reduced = instance.reduceScenarios(args.numscenarios, args.method, **options)
+   print("Reduced %d scenarios to %d in %.2fs"%(len(instance.scenarios),
+      len(reduced), time.perf_counter() - start))
+
+   reduced.writeStoFile(args.outfile)
@@ -0,0 +1,50 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import sys
+import time
+import argparse
+import instancegen as ig
+
+if __name__ == "__main__":
+   parser = argparse.ArgumentParser(
+         description = "validates the scenarios of an STO file against its core "\
+               "and TIM files")
+   parser.add_argument("corfile",
+         help = "the core file")
+   parser.add_argument("timfile",
+         help = "the TIM file")
+   parser.add_argument("stofile",
+         help = "the STO file")
+   parser.add_argument("--output", default = None,
+         help = "writes the report as JSON to the given file")
+   parser.add_argument("--cache", action = "store_true",
+         help = "reads the core file from its binary cache")
+   args = parser.parse_args()
+
+   print("Arguments:", sys.argv)
+
+   filenames = []
+   for filename in [args.corfile, args.timfile, args.stofile]:
+      foundfile = ig.findFile(filename)
+      if foundfile is None:
+         print("   ERROR: The file %s does not exist"%filename)
+         exit(1)
+      filenames.append(foundfile)
+
+   start = time.perf_counter()
+   instance = ig.Instance(*filenames, compact = True)
+   instance.readInstance(readCor = True, readTim = True, readSto = True,
+         cache = args.cache)
+   readtime = time.perf_counter() - start
+
+   start = time.perf_counter()
+   report = ig.validateStoFile(instance)
+   print("Read the instance in %.2fs and validated it in %.2fs"%(readtime,
+      time.perf_counter() - start))
+
+   ig.writeValidationReport(report, args.output)
+   if not report["valid"]:
+      exit(1)
@@ -13,6 +13,7 @@ if __name__ == "__main__":
          or len(sys.argv) < 3 or len(sys.argv) == 1:
       print("Usage: %s instance-class instance-name"%sys.argv[0])
       print("  instance-class : the instance class. Available classes (%s)"%", ".join(map(str, ig.instances.keys())))
+      print("                   The class auto detects the stages from the structure of the core file")
       print("  instance-name  : the name of the instance (without extension)")
       exit(1)
 
@@ -28,7 +29,7 @@ if __name__ == "__main__":
 
    # initialises the instance given the instance class
    instance = ig.instances[instanceclass](
-         "%s.cor"%(instancename),"%s.tim"%(instancename))
+         ig.findFile("%s.cor"%(instancename)),"%s.tim"%(instancename))
 
    # reads the core file to store the constraint and variable names
    instance.readInstance(readCor = True)
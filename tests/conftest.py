@@ -0,0 +1,45 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import os
+import sys
+import pytest
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+EXAMPLES_DIR = os.path.join(ROOT_DIR, "examples")
+
+# a three-stage TIM file of sslp_5_25_50, the rows from c9 are in the third
+# stage
+SSLP_THREE_STAGES = """TIME   sslp3
+PERIODS	 LP
+     x_1  c1  STAGE-1
+     y_1_1 c2  STAGE-2
+     y_3_1 c9  STAGE-3
+ENDATA"""
+
+@pytest.fixture
+def sslp(tmp_path):
+   '''
+   returns a function that reads sslp_5_25_50 with the given STO file in
+   tmp_path, and optionally the three-stage TIM file and a derived instance
+   class
+   '''
+   import instancegen as ig
+
+   def makeInstance(stofile, threestages = False, instanceclass = None):
+      timfile = os.path.join(EXAMPLES_DIR, "sslp_5_25_50.tim")
+      if threestages:
+         timfile = str(tmp_path/"sslp3.tim")
+         with open(timfile, "w") as outfile:
+            outfile.write(SSLP_THREE_STAGES)
+      instanceclass = instanceclass or ig.instances["sslp"]
+      instance = instanceclass(os.path.join(EXAMPLES_DIR,
+         "sslp_5_25_50.cor"), timfile, str(tmp_path/stofile))
+      instance.readInstance(readCor = True, readTim = True)
+      return instance
+
+   return makeInstance
@@ -0,0 +1,69 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import pytest
+import instancegen as ig
+
+def readText(filename):
+   with open(filename) as infile:
+      return infile.read()
+
+def entryLines(filename):
+   '''
+   returns the lines of an STO file without the scenario header lines, which
+   hold the probabilities, and without the ENDATA line
+   '''
+   return [line for line in readText(filename).split("\n")
+         if line and not line.startswith((" SC ", "ENDATA"))]
+
+@pytest.mark.parametrize("scheme, nworkers", [(ig.SAMPLING_MC, None),
+   (ig.SAMPLING_MC, 2), (ig.SAMPLING_CRN, None)])
+def test_append_preserves_existing_scenarios(sslp, scheme, nworkers):
+   instance = sslp("appended.sto")
+   instance.writeStoFile(10, ig.STOCH_RHS, nworkers = nworkers,
+         scheme = scheme, resumable = True)
+   original = entryLines(instance.stofile)
+   instance.appendStoFile(25, nworkers = nworkers)
+
+   # the entries of the existing scenarios are unchanged, only their
+   # probabilities are replaced
+   lines = entryLines(instance.stofile)
+   assert lines[:len(original)] == original
+   assert len(lines) > len(original)
+
+   store = ig.readStoFile(instance.stofile)
+   assert len(store) == 25
+   assert len(set(store.names)) == 25
+   assert abs(store.probabilities.sum() - 1.0) <= ig.PROBABILITY_TOLERANCE
+
+def test_crn_append_equals_full_write(sslp):
+   appended = sslp("appended.sto")
+   appended.writeStoFile(10, ig.STOCH_RHS, scheme = ig.SAMPLING_CRN,
+         resumable = True)
+   appended.appendStoFile(25, nworkers = 2)
+
+   full = sslp("full.sto")
+   full.writeStoFile(25, ig.STOCH_RHS, scheme = ig.SAMPLING_CRN,
+         resumable = True)
+
+   assert readText(appended.stofile) == readText(full.stofile)
+
+@pytest.mark.parametrize("scheme", [ig.SAMPLING_MC, ig.SAMPLING_CRN])
+def test_output_does_not_depend_on_the_number_of_workers(sslp, scheme):
+   # the scenarios span several blocks, so that the blocks are split over
+   # the workers
+   nscenarios = 2*ig.smps_parallel.SCENARIO_BLOCK + 50
+   workers = [1, 2, 3]
+   if scheme != ig.SAMPLING_MC:
+      workers.append(None)
+
+   texts = []
+   for nworkers in workers:
+      instance = sslp("workers_%s.sto"%nworkers)
+      instance.writeStoFile(nscenarios, ig.STOCH_RHS, nworkers = nworkers,
+            scheme = scheme)
+      texts.append(readText(instance.stofile))
+
+   assert all(text == texts[0] for text in texts)
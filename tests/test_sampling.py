@@ -0,0 +1,52 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import numpy as np
+import instancegen as ig
+
+def scenarioEntries(store):
+   '''
+   returns the name, the columns, the rows and the values of each scenario
+   '''
+   scenarios = []
+   for index in range(len(store)):
+      name, _, _, _, columns, rows, values = store.getScenario(index)
+      scenarios.append((name, columns, rows, values.tolist()))
+
+   return scenarios
+
+def test_crn_smaller_set_is_prefix_of_larger_set(sslp):
+   small = sslp("small.sto")
+   small.writeStoFile(10, ig.STOCH_RHS, scheme = ig.SAMPLING_CRN, seed = 7)
+   large = sslp("large.sto")
+   large.writeStoFile(25, ig.STOCH_RHS, scheme = ig.SAMPLING_CRN, seed = 7)
+
+   smallscenarios = scenarioEntries(ig.readStoFile(small.stofile))
+   largescenarios = scenarioEntries(ig.readStoFile(large.stofile))
+   assert len(smallscenarios) == 10
+   assert smallscenarios == largescenarios[:10]
+
+def test_crn_entry_stream_does_not_depend_on_other_entries():
+   entries = ig.StochasticEntries("RHS", ["c1", "c2", "c3"], ig.Uniform())
+   subset = ig.StochasticEntries("RHS", ["c3", "c1"], ig.Uniform())
+
+   values = ig.StreamSampler(entries, seed = 3).uniforms(0, 20)
+   subvalues = ig.StreamSampler(subset, seed = 3).uniforms(0, 20)
+   assert np.array_equal(values[:, [2, 0]], subvalues)
+
+   # the scenarios of a later block continue the streams of the first block
+   sampler = ig.StreamSampler(entries, seed = 3)
+   blocks = np.vstack((sampler.uniforms(0, 8), sampler.uniforms(8, 12)))
+   assert np.array_equal(blocks, values)
+
+def test_lhs_strata_are_permutations():
+   nscenarios = 37
+   entries = ig.StochasticEntries("RHS", ["c%d"%i for i in range(5)],
+         ig.Uniform())
+   sampler = ig.LatinHypercubeSampler(entries, nscenarios, seed = 1)
+
+   strata = np.vstack((sampler.strata(0, 20), sampler.strata(20, 17)))
+   for column in strata.T:
+      assert sorted(column.tolist()) == list(range(nscenarios))
@@ -0,0 +1,54 @@
+"""
+The MIT License (MIT)
+
+@author: Stephen J. Maher
+"""
+import os
+import numpy as np
+import instancegen as ig
+
+class ThreeStageSSLP(ig.SSLPInstance):
+   '''
+   the sslp instance with the RHS of the second and third stage random
+   '''
+
+   def getRhsStochasticEntries(self):
+      constraints = self.stages.constraints(1) + self.stages.constraints(2)
+      return ig.StochasticEntries("RHS", constraints, ig.Uniform(),
+            transform = np.round)
+
+def test_two_stage_tree_is_not_larger_than_flat(sslp):
+   flat = sslp("flat.sto")
+   flat.writeStoFile(50, ig.STOCH_RHS, scheme = ig.SAMPLING_CRN, delta = True)
+   tree = sslp("tree.sto")
+   tree.writeScenarioTree([50], ig.STOCH_RHS, scheme = ig.SAMPLING_CRN,
+         delta = True)
+
+   assert os.path.getsize(tree.stofile) <= os.path.getsize(flat.stofile)
+   store = ig.readStoFile(tree.stofile)
+   assert np.all(store.parents == -1)
+
+def test_three_stage_tree_parents_and_inheritance(sslp):
+   instance = sslp("tree.sto", threestages = True,
+         instanceclass = ThreeStageSSLP)
+   instance.writeScenarioTree([3, 4], ig.STOCH_RHS, scheme = ig.SAMPLING_CRN)
+   store = ig.readStoFile(instance.stofile)
+   entries = instance.getStochasticEntries(ig.STOCH_RHS)
+   stages = instance.stages
+
+   assert len(store) == 12
+   for index in range(len(store)):
+      name, parent, probability, period, columns, rows, values = \
+            store.getScenario(index)
+      rowstages = [stages.rowStage(row) for row in rows]
+      if index%4 == 0:
+         # the first leaf below a second stage node branches from the root
+         # and holds the entries of all stages
+         assert parent == ig.ROOT and period == "STAGE-2"
+         assert len(rows) == len(entries)
+      else:
+         # the other leaves inherit the second stage from the first leaf
+         # below their node and only hold the third stage entries
+         assert parent == store.names[index - index%4]
+         assert period == "STAGE-3"
+         assert len(rows) > 0 and min(rowstages) == 2